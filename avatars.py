@@ -0,0 +1,342 @@
+import asyncio
+import io
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import and_, or_, select, update
+
+from database import AsyncSessionLocal
+from metrics import CLOUDINARY_UPLOAD_SECONDS
+from tracing import tracer
+from models import AvatarJob, User
+
+logger = logging.getLogger(__name__)
+
+MAX_AVATAR_BYTES = int(os.getenv("MAX_AVATAR_BYTES", 5 * 1024 * 1024))
+AVATAR_STORAGE = os.getenv("AVATAR_STORAGE", "cloudinary" if os.getenv("CLOUDINARY_CLOUD_NAME") else "local")
+AVATAR_LOCAL_DIR = os.getenv("AVATAR_LOCAL_DIR", "media")
+AVATAR_LOCAL_URL = os.getenv("AVATAR_LOCAL_URL", "/media")
+# Uploads wait here until their job is processed, so pending jobs survive a restart.
+AVATAR_UPLOAD_DIR = os.getenv("AVATAR_UPLOAD_DIR", "avatar_uploads")
+# A job left "processing" this long is assumed to belong to a worker that died.
+AVATAR_JOB_STALE_SECONDS = int(os.getenv("AVATAR_JOB_STALE_SECONDS", 300))
+# Larger images are rejected before they are decoded.
+MAX_AVATAR_PIXELS = 40_000_000
+
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    "thumbnail": (64, 64),
+    "medium": (256, 256),
+}
+_CHUNK_SIZE = 64 * 1024
+
+
+class AvatarStorage(ABC):
+    """
+    Interface of the places rendered avatar variants are stored.
+    """
+
+    @abstractmethod
+    def save(self, key: str, data: bytes) -> str:
+        """
+        Store a JPEG image.
+
+        Args:
+            key (str): Storage key without extension, e.g. ``avatars/1/7-thumbnail``.
+            data (bytes): The encoded image.
+
+        Returns:
+            str: Public URL of the stored image.
+        """
+
+
+class LocalAvatarStorage(AvatarStorage):
+    """
+    Stores avatars on the local filesystem, served by the app under ``base_url``.
+
+    Attributes:
+        root (str): Directory the files are written to.
+        base_url (str): URL prefix the directory is served at.
+    """
+
+    def __init__(self, root: str = AVATAR_LOCAL_DIR, base_url: str = AVATAR_LOCAL_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def save(self, key: str, data: bytes) -> str:
+        path = os.path.join(self.root, f"{key}.jpg")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file.
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return f"{self.base_url}/{key}.jpg"
+
+
+class CloudinaryAvatarStorage(AvatarStorage):
+    """
+    Stores avatars in Cloudinary using the globally configured account.
+    """
+
+    def save(self, key: str, data: bytes) -> str:
+        with CLOUDINARY_UPLOAD_SECONDS.time(), tracer.span("cloudinary.upload", public_id=key):
+            result = cloudinary.uploader.upload(io.BytesIO(data), public_id=key, overwrite=True,
+                                                resource_type="image")
+        return result["secure_url"]
+
+
+def get_storage(kind: str = AVATAR_STORAGE) -> AvatarStorage:
+    """
+    Create the storage backend selected by ``AVATAR_STORAGE``.
+
+    Args:
+        kind (str): "local" or "cloudinary".
+
+    Returns:
+        AvatarStorage: The storage backend.
+    """
+    if kind == "cloudinary":
+        return CloudinaryAvatarStorage()
+    return LocalAvatarStorage()
+
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_AVATAR_BYTES) -> BinaryIO:
+    """
+    Copy an upload into a temporary file owned by the caller, enforcing a size cap.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        max_bytes (int): Maximum accepted size.
+
+    Returns:
+        BinaryIO: Spooled temporary file positioned at the start.
+
+    Raises:
+        HTTPException: If the upload is larger than ``max_bytes``.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    size = 0
+    while chunk := await file.read(_CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            raise HTTPException(status_code=413, detail=f"Avatar is larger than {max_bytes} bytes")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def render_variants(source: BinaryIO) -> Dict[str, bytes]:
+    """
+    Render every avatar variant as a square, center-cropped JPEG.
+
+    Args:
+        source (BinaryIO): The uploaded image.
+
+    Returns:
+        Dict[str, bytes]: Encoded image by variant name.
+
+    Raises:
+        ValueError: If the upload is not a supported image.
+    """
+    try:
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_AVATAR_PIXELS:
+                raise ValueError("Image dimensions are too large")
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            variants = {}
+            for name, size in VARIANTS.items():
+                buffer = io.BytesIO()
+                ImageOps.fit(image, size, Image.LANCZOS).save(buffer, "JPEG", quality=85, optimize=True)
+                variants[name] = buffer.getvalue()
+            return variants
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Unsupported image: {e}")
+
+
+class AvatarPipeline:
+    """
+    Renders uploaded avatars in the background and stores their variants.
+
+    Uploads are kept in ``upload_dir`` until their job finishes. :meth:`start`
+    resumes the jobs a previous process left pending, and a job is claimed with
+    a conditional update, so it is processed once even when several workers
+    resume at the same time.
+
+    Attributes:
+        storage (AvatarStorage): Where the variants are stored.
+        on_user_changed (Optional[Callable[[str], Awaitable[None]]]): Awaited with the
+            user's email once their avatar URL changed, e.g. to invalidate cached principals.
+        upload_dir (str): Directory holding the uploads of unfinished jobs.
+        stale_after (int): Seconds after which a "processing" job may be taken over.
+    """
+
+    def __init__(self, storage: AvatarStorage, on_user_changed: Optional[Callable[[str], Awaitable[None]]] = None,
+                 session_factory=AsyncSessionLocal, upload_dir: str = AVATAR_UPLOAD_DIR,
+                 stale_after: int = AVATAR_JOB_STALE_SECONDS):
+        self.storage = storage
+        self.on_user_changed = on_user_changed
+        self.session_factory = session_factory
+        self.upload_dir = upload_dir
+        self.stale_after = stale_after
+        self._task = None
+
+    def upload_path(self, job_id: int) -> str:
+        """
+        Get the file holding the upload of a job.
+
+        Args:
+            job_id (int): The job ID.
+
+        Returns:
+            str: Path of the upload.
+        """
+        return os.path.join(self.upload_dir, str(job_id))
+
+    def _write_upload(self, job_id: int, source: BinaryIO) -> None:
+        try:
+            os.makedirs(self.upload_dir, exist_ok=True)
+            path = self.upload_path(job_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                while chunk := source.read(_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            source.close()
+
+    async def store_upload(self, job_id: int, source: BinaryIO) -> None:
+        """
+        Keep the upload of a new job until it is processed.
+
+        Args:
+            job_id (int): ID of the job.
+            source (BinaryIO): The spooled upload; closed by this method.
+        """
+        await run_in_threadpool(self._write_upload, job_id, source)
+
+    def _discard_upload(self, job_id: int) -> None:
+        try:
+            os.remove(self.upload_path(job_id))
+        except FileNotFoundError:
+            pass
+
+    def _render_and_store(self, job_id: int, user_id: int) -> Dict[str, str]:
+        with open(self.upload_path(job_id), "rb") as source:
+            variants = render_variants(source)
+        return {
+            name: self.storage.save(f"avatars/{user_id}/{job_id}-{name}", data)
+            for name, data in variants.items()
+        }
+
+    def _claimable(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        return or_(AvatarJob.status == "pending",
+                   and_(AvatarJob.status == "processing", AvatarJob.updated_at < cutoff))
+
+    async def process(self, job_id: int) -> None:
+        """
+        Process one job: render the variants, store them and update the user.
+
+        Decoding, resizing and storage uploads run in the threadpool without a
+        database session; the claim and the result are each written in their own
+        short transaction. Failures are recorded on the job instead of being
+        raised. A job that no longer exists, or that is done or being processed
+        elsewhere, is skipped.
+
+        Args:
+            job_id (int): ID of a job whose upload was stored with :meth:`store_upload`.
+        """
+        async with self.session_factory() as db:
+            claimed = await db.execute(
+                update(AvatarJob)
+                .where(AvatarJob.id == job_id, self._claimable())
+                .values(status="processing", updated_at=datetime.utcnow())
+            )
+            user_id = None
+            if claimed.rowcount == 1:
+                user_id = await db.scalar(select(AvatarJob.user_id).where(AvatarJob.id == job_id))
+            await db.commit()
+            if user_id is None:
+                if await db.get(AvatarJob, job_id) is None:
+                    await run_in_threadpool(self._discard_upload, job_id)
+                logger.info("Skipping avatar job %s: it is not pending", job_id)
+                return
+
+        try:
+            if not os.path.exists(self.upload_path(job_id)):
+                raise ValueError("The upload was lost before it was processed")
+            urls = await run_in_threadpool(self._render_and_store, job_id, user_id)
+        except Exception as e:
+            logger.warning("Avatar job %s failed: %s", job_id, e)
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(AvatarJob).where(AvatarJob.id == job_id).values(status="failed", error=str(e)[:1000])
+                )
+                await db.commit()
+            return
+        finally:
+            await run_in_threadpool(self._discard_upload, job_id)
+
+        async with self.session_factory() as db:
+            await db.execute(
+                update(AvatarJob).where(AvatarJob.id == job_id)
+                .values(status="done", thumbnail_url=urls["thumbnail"], medium_url=urls["medium"])
+            )
+            email = (await db.execute(
+                update(User).where(User.id == user_id).values(avatar_url=urls["medium"]).returning(User.email)
+            )).scalar_one()
+            await db.commit()
+        if self.on_user_changed is not None:
+            await self.on_user_changed(email)
+
+    async def resume(self) -> int:
+        """
+        Process the jobs left pending, or stuck processing, by earlier processes.
+
+        Returns:
+            int: Number of jobs attempted.
+        """
+        async with self.session_factory() as db:
+            job_ids: List[int] = (await db.execute(
+                select(AvatarJob.id).where(self._claimable()).order_by(AvatarJob.id)
+            )).scalars().all()
+        for job_id in job_ids:
+            await self.process(job_id)
+        return len(job_ids)
+
+    async def _resume(self):
+        try:
+            count = await self.resume()
+        except Exception:
+            logger.exception("Resuming avatar jobs failed")
+        else:
+            if count:
+                logger.info("Resumed %s avatar jobs", count)
+
+    def start(self) -> None:
+        """
+        Resume unfinished jobs in the background on the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._resume())
+
+    async def stop(self) -> None:
+        """
+        Stop resuming jobs; the remaining ones are resumed by the next start.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,241 @@
+from datetime import datetime
+from typing import Any, Dict, List, Tuple, Union
+
+from sqlalchemy import ColumnElement, case, delete, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models import Contact, ContactTombstone, User, birthday_day_of_year
+
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+ChangeSeq = Union[int, ColumnElement]
+
+
+def _bump_change_seq(owner_id: int, count: int):
+    # Keep updated_at: it tracks changes to the user, not to their contacts.
+    return (
+        update(User)
+        .where(User.id == owner_id)
+        .values(change_seq=User.change_seq + count, updated_at=User.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reserve_change_seq(db: AsyncSession, owner_id: int, count: int = 1) -> int:
+    """
+    Reserve the next ``count`` change sequence numbers of a user.
+
+    The counter row stays locked until the caller's transaction ends, so writes to
+    one user's contacts are numbered in commit order.
+
+    Args:
+        db (AsyncSession): The database session of the write.
+        owner_id (int): The user's ID.
+        count (int): Number of sequence numbers to reserve.
+
+    Returns:
+        int: The last reserved number; the range is ``last - count + 1 .. last``.
+    """
+    stmt = _bump_change_seq(owner_id, count)
+    if db.bind.dialect.update_returning:
+        return (await db.execute(stmt.returning(User.change_seq))).scalar_one()
+    await db.execute(stmt)
+    return (await db.execute(select(User.change_seq).where(User.id == owner_id))).scalar_one()
+
+
+async def change_seq_for_write(db: AsyncSession, owner_id: int, count: int = 1) -> ChangeSeq:
+    """
+    Get the last of the next ``count`` change sequence numbers for a write statement.
+
+    On PostgreSQL this is a scalar subquery over a data-modifying CTE, so the
+    counter is bumped by the statement that uses it and costs no extra round trip.
+    Other databases reserve the numbers with :func:`reserve_change_seq`.
+
+    Args:
+        db (AsyncSession): The database session of the write.
+        owner_id (int): The user's ID.
+        count (int): Number of sequence numbers to reserve.
+
+    Returns:
+        ChangeSeq: The last reserved number, or an SQL expression evaluating to it.
+    """
+    if db.bind.dialect.name == "postgresql":
+        reserved = _bump_change_seq(owner_id, count).returning(User.change_seq).cte("reserved_seq")
+        return select(reserved.c.change_seq).scalar_subquery()
+    return await reserve_change_seq(db, owner_id, count)
+
+
+def change_seq_by_id(contact_ids: List[int], last_seq: ChangeSeq, id_column=Contact.id) -> ChangeSeq:
+    """
+    Build a SQL expression giving each contact of a set-based write its own number.
+
+    Args:
+        contact_ids (List[int]): Distinct IDs of the contacts written by the statement.
+        last_seq (ChangeSeq): Last number reserved for them.
+        id_column: Column holding the contact ID in the statement.
+
+    Returns:
+        ChangeSeq: Expression evaluating to the contact's sequence number.
+    """
+    first_seq = last_seq - (len(contact_ids) - 1)
+    if len(contact_ids) == 1:
+        return first_seq
+    return first_seq + case({contact_id: i for i, contact_id in enumerate(contact_ids)}, value=id_column)
+
+
+def contact_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the derived columns that ``Contact`` validators only set on ORM writes.
+
+    Args:
+        values (Dict[str, Any]): Column values of an INSERT or UPDATE statement.
+
+    Returns:
+        Dict[str, Any]: The values, with ``birthday_doy`` if ``birthday`` is set.
+    """
+    if values.get("birthday") is not None:
+        values = dict(values, birthday_doy=birthday_day_of_year(values["birthday"]))
+    return values
+
+
+async def insert_contact(db: AsyncSession, owner_id: int, values: Dict[str, Any]) -> Contact:
+    """
+    Insert a contact with ``INSERT ... RETURNING`` where supported.
+
+    Args:
+        db (AsyncSession): The database session of the write.
+        owner_id (int): The owner's ID.
+        values (Dict[str, Any]): Contact fields.
+
+    Returns:
+        Contact: The inserted contact.
+    """
+    values = dict(contact_values(values), owner_id=owner_id, change_seq=await change_seq_for_write(db, owner_id))
+    if db.bind.dialect.insert_returning:
+        return (await db.execute(insert(Contact).values(**values).returning(Contact))).scalar_one()
+    contact = Contact(**values)
+    db.add(contact)
+    await db.flush()
+    return contact
+
+
+async def update_contacts(db: AsyncSession, owner_id: int, contact_ids: List[int],
+                          values: Dict[str, Any]) -> List[Contact]:
+    """
+    Apply the same values to a user's contacts with one UPDATE.
+
+    Every updated contact gets its own change sequence number. The updated rows are
+    read back with ``RETURNING`` where supported, otherwise with a SELECT.
+
+    Args:
+        db (AsyncSession): The database session of the write.
+        owner_id (int): The owner's ID; other users' contacts are never matched.
+        contact_ids (List[int]): Distinct IDs of the contacts to update.
+        values (Dict[str, Any]): Contact fields to set.
+
+    Returns:
+        List[Contact]: The updated contacts, ordered by ID.
+    """
+    last_seq = await change_seq_for_write(db, owner_id, len(contact_ids))
+    values = dict(contact_values(values), change_seq=change_seq_by_id(contact_ids, last_seq))
+    owned = (Contact.owner_id == owner_id, Contact.id.in_(contact_ids))
+    stmt = update(Contact).where(*owned).values(**values).execution_options(synchronize_session=False)
+    if db.bind.dialect.update_returning:
+        contacts = (await db.execute(stmt.returning(Contact))).scalars().all()
+    else:
+        await db.execute(stmt)
+        contacts = (await db.execute(select(Contact).where(*owned))).scalars().all()
+    return sorted(contacts, key=lambda contact: contact.id)
+
+
+async def delete_contacts(db: AsyncSession, owner_id: int, contact_ids: List[int]) -> List[Contact]:
+    """
+    Delete a user's contacts and leave a tombstone for each of them.
+
+    On PostgreSQL the counter bump, the DELETE and the tombstone INSERT run as one
+    statement. Elsewhere the DELETE returns the rows where supported and the
+    tombstones are written with one multi-row INSERT.
+
+    Args:
+        db (AsyncSession): The database session of the write.
+        owner_id (int): The owner's ID; other users' contacts are never matched.
+        contact_ids (List[int]): Distinct IDs of the contacts to delete.
+
+    Returns:
+        List[Contact]: The deleted contacts, ordered by ID.
+    """
+    owned = (Contact.owner_id == owner_id, Contact.id.in_(contact_ids))
+    deleted_at = datetime.utcnow()
+    if db.bind.dialect.name == "postgresql":
+        last_seq = await change_seq_for_write(db, owner_id, len(contact_ids))
+        gone = delete(Contact).where(*owned).returning(*Contact.__table__.c).cte("gone")
+        tombstones = insert(ContactTombstone).from_select(
+            ["owner_id", "contact_id", "change_seq", "deleted_at"],
+            select(gone.c.owner_id, gone.c.id, change_seq_by_id(contact_ids, last_seq, gone.c.id),
+                   literal(deleted_at)),
+        ).cte("tombstones")
+        deleted = aliased(Contact, gone)
+        return (await db.execute(select(deleted).add_cte(tombstones).order_by(deleted.id))).scalars().all()
+
+    # Reserve before deleting so the counter row is always locked before contact rows.
+    last_seq = await reserve_change_seq(db, owner_id, len(contact_ids))
+    stmt = delete(Contact).where(*owned).execution_options(synchronize_session=False)
+    if db.bind.dialect.delete_returning:
+        contacts = (await db.execute(stmt.returning(Contact))).scalars().all()
+    else:
+        contacts = (await db.execute(select(Contact).where(*owned).with_for_update())).scalars().all()
+        await db.execute(stmt)
+    contacts = sorted(contacts, key=lambda contact: contact.id)
+    if contacts:
+        first_seq = last_seq - len(contact_ids) + 1
+        seqs = {contact_id: first_seq + i for i, contact_id in enumerate(contact_ids)}
+        await db.execute(insert(ContactTombstone).values([
+            {"owner_id": owner_id, "contact_id": contact.id, "change_seq": seqs[contact.id], "deleted_at": deleted_at}
+            for contact in contacts
+        ]))
+    return contacts
+
+
+async def load_changes(db: AsyncSession, owner_id: int, since: int,
+                       limit: int) -> Tuple[List[Contact], List[ContactTombstone], int, bool]:
+    """
+    Load the changes to a user's contacts after a sequence number.
+
+    Upserts and tombstones are merged by sequence number and cut at ``limit``, so a
+    page never skips a change that a later page would start after.
+
+    Args:
+        db (AsyncSession): The database session.
+        owner_id (int): The user's ID.
+        since (int): Sequence number the client has synced up to.
+        limit (int): Maximum number of changes to return.
+
+    Returns:
+        Tuple[List[Contact], List[ContactTombstone], int, bool]: Changed contacts,
+        deletions, the cursor of the next page and whether more changes follow it.
+    """
+    contacts = (await db.execute(
+        select(Contact)
+        .where(Contact.owner_id == owner_id, Contact.change_seq > since)
+        .order_by(Contact.change_seq)
+        .limit(limit + 1)
+    )).scalars().all()
+    tombstones = (await db.execute(
+        select(ContactTombstone)
+        .where(ContactTombstone.owner_id == owner_id, ContactTombstone.change_seq > since)
+        .order_by(ContactTombstone.change_seq)
+        .limit(limit + 1)
+    )).scalars().all()
+
+    changes = sorted([*contacts, *tombstones], key=lambda change: change.change_seq)
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    cursor = changes[-1].change_seq if changes else since
+    return (
+        [change for change in changes if isinstance(change, Contact)],
+        [change for change in changes if isinstance(change, ContactTombstone)],
+        cursor,
+        has_more,
+    )
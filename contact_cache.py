@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User
+from redis_store import RedisStore
+
+CONTACT_CACHE_TTL = int(os.getenv("CONTACT_CACHE_TTL", 300))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an ``If-None-Match`` request header against an ETag.
+
+    Args:
+        if_none_match (Optional[str]): Header value, possibly a comma-separated list.
+        etag (str): The current strong ETag, including quotes.
+
+    Returns:
+        bool: True if the client already has the current representation.
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ContactCache:
+    """
+    Versioned per-user cache of serialized contact responses.
+
+    The version of a user's contacts is their ``change_seq``, which every write
+    to the contacts advances in the same transaction. Responses are cached under
+    the current version, so a write makes all cached responses of that user
+    unreachable at once, and ETags derived from the version change exactly when
+    the data may have changed, whatever happened to Redis in between.
+
+    While Redis is unavailable reads bypass the cache but still carry ETags.
+
+    Attributes:
+        store (RedisStore): Redis access used for responses.
+        ttl (int): Lifetime of cached responses in seconds.
+    """
+
+    def __init__(self, store: RedisStore, ttl: int = CONTACT_CACHE_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    @staticmethod
+    async def version(db: AsyncSession, owner_id: int) -> int:
+        """
+        Get the current version of a user's contacts.
+
+        Must be read before the contacts themselves, so a response is never
+        cached under a version newer than its data. This is a database read on
+        every request, 304s included; Redis only caches what depends on it.
+
+        Args:
+            db (AsyncSession): The database session.
+            owner_id (int): The user's ID.
+
+        Returns:
+            int: The user's change sequence number, 0 if their contacts were never changed.
+        """
+        version = (await db.execute(select(User.change_seq).where(User.id == owner_id))).scalar_one_or_none()
+        return version or 0
+
+    @staticmethod
+    def list_key(params: Iterable[Tuple[str, str]]) -> str:
+        """
+        Build a stable key for a list query from its parameters.
+
+        Args:
+            params (Iterable[Tuple[str, str]]): Query parameters of the request.
+
+        Returns:
+            str: Digest of the sorted parameters.
+        """
+        canonical = "&".join(f"{k}={v}" for k, v in sorted(params))
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def etag(owner_id: int, version: int, resource: str) -> str:
+        """
+        Build the strong ETag of a cached response.
+
+        Args:
+            owner_id (int): The user's ID.
+            version (int): Version of the user's contacts.
+            resource (str): Identifies the response within that version.
+
+        Returns:
+            str: The quoted ETag.
+        """
+        return f'"{owner_id}.{version}.{resource}"'
+
+    async def get(self, owner_id: int, version: int, resource: str) -> Optional[dict]:
+        """
+        Get a cached response.
+
+        Args:
+            owner_id (int): The user's ID.
+            version (int): Version of the user's contacts.
+            resource (str): Identifies the response within that version.
+
+        Returns:
+            Optional[dict]: ``{"body": str, "headers": dict}``, or None on a miss.
+        """
+        cached = await self.store.get(f"contacts:resp:{owner_id}:{version}:{resource}")
+        return json.loads(cached) if cached else None
+
+    async def set(self, owner_id: int, version: int, resource: str, body: str, headers: Optional[dict] = None) -> None:
+        """
+        Cache a serialized response.
+
+        Args:
+            owner_id (int): The user's ID.
+            version (int): Version the response was read at.
+            resource (str): Identifies the response within that version.
+            body (str): Serialized JSON body.
+            headers (Optional[dict]): Extra headers to replay with the body.
+        """
+        await self.store.setex(
+            f"contacts:resp:{owner_id}:{version}:{resource}",
+            self.ttl,
+            json.dumps({"body": body, "headers": headers or {}}),
+        )
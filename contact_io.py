@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+import os
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from models import ContactCreate
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))
+# Keeps one multi-row INSERT below the bind parameter limits of SQLite and asyncpg.
+MAX_IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ("csv", "ndjson")
+_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# A parsed record is either a validated contact or the list of its errors.
+ParsedRow = Tuple[int, Union[ContactCreate, List[dict]]]
+
+
+def detect_format(content_type: Optional[str], filename: Optional[str]) -> Optional[str]:
+    """
+    Guess the import format from the upload's content type or file name.
+
+    Args:
+        content_type (Optional[str]): MIME type sent with the upload.
+        filename (Optional[str]): Name of the uploaded file.
+
+    Returns:
+        Optional[str]: "csv", "ndjson" or None if the format is unknown.
+    """
+    if content_type:
+        fmt = _CONTENT_TYPES.get(content_type.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    if filename:
+        return _EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+    return None
+
+
+def _iter_records(text: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, Union[dict, List[dict]]]]:
+    if fmt == "csv":
+        for row_no, row in enumerate(csv.DictReader(text), start=1):
+            # Empty cells mean "not provided"; columns without a header are ignored.
+            yield row_no, {k: v for k, v in row.items() if k is not None and v not in ("", None)}
+        return
+
+    row_no = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_no, [{"field": None, "message": f"Invalid JSON: {e}"}]
+            continue
+        if not isinstance(record, dict):
+            yield row_no, [{"field": None, "message": "Expected a JSON object"}]
+            continue
+        yield row_no, record
+
+
+def _validate(record: Union[dict, List[dict]]) -> Union[ContactCreate, List[dict]]:
+    if isinstance(record, list):
+        return record
+    try:
+        return ContactCreate.model_validate(record)
+    except ValidationError as e:
+        return [
+            {"field": ".".join(str(part) for part in error["loc"]) or None, "message": error["msg"]}
+            for error in e.errors(include_url=False)
+        ]
+
+
+def read_batches(fileobj: BinaryIO, fmt: str, batch_size: int) -> Iterator[List[ParsedRow]]:
+    """
+    Read an uploaded CSV or NDJSON file incrementally and validate it in batches.
+
+    The file is decoded line by line, so only one batch of records is held in
+    memory at a time. Reading is blocking; callers on the event loop should pull
+    batches through the threadpool.
+
+    Args:
+        fileobj (BinaryIO): The uploaded file.
+        fmt (str): "csv" or "ndjson".
+        batch_size (int): Number of records per batch.
+
+    Yields:
+        List[ParsedRow]: ``(row number, contact or errors)`` pairs; row numbers are 1-based
+        and do not count the CSV header or blank NDJSON lines.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        batch = []
+        for row_no, record in _iter_records(text, fmt):
+            batch.append((row_no, _validate(record)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Leave the underlying upload open; the framework closes it.
+        text.detach()
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+EXPORT_FIELDS = ("id", "first_name", "last_name", "email", "phone", "birthday", "additional_info")
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "vcard": "text/vcard; charset=utf-8",
+}
+EXPORT_EXTENSIONS = {"ndjson": "ndjson", "csv": "csv", "vcard": "vcf"}
+
+
+def _export_values(contact) -> List:
+    values = [getattr(contact, field) for field in EXPORT_FIELDS]
+    return [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+
+
+def _vcard_escape(value: str) -> str:
+    # Any line break becomes \n; a bare \r would end the content line early.
+    value = value.replace("\r\n", "\n").replace("\r", "\n")
+    return (value.replace("\\", "\\\\").replace("\n", "\\n")
+            .replace(",", "\\,").replace(";", "\\;"))
+
+
+def _vcard(contact) -> str:
+    first = _vcard_escape(contact.first_name or "")
+    last = _vcard_escape(contact.last_name or "")
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:{last};{first};;;",
+        f"FN:{' '.join(part for part in (first, last) if part)}",
+    ]
+    if contact.email:
+        lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(contact.email)}")
+    if contact.phone:
+        lines.append(f"TEL:{_vcard_escape(contact.phone)}")
+    if contact.birthday:
+        lines.append(f"BDAY:{contact.birthday.isoformat()}")
+    if contact.additional_info:
+        lines.append(f"NOTE:{_vcard_escape(contact.additional_info)}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
+
+
+def export_header(fmt: str) -> str:
+    """
+    Get the text that starts an export in the given format.
+
+    Args:
+        fmt (str): "ndjson", "csv" or "vcard".
+
+    Returns:
+        str: The CSV header row, or an empty string for the other formats.
+    """
+    if fmt != "csv":
+        return ""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def encode_contacts(contacts, fmt: str) -> str:
+    """
+    Encode a chunk of contacts in an export format.
+
+    Args:
+        contacts (Iterable[Contact]): The contacts to encode.
+        fmt (str): "ndjson", "csv" or "vcard".
+
+    Returns:
+        str: The encoded chunk.
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(_export_values(c) for c in contacts)
+        return buffer.getvalue()
+    if fmt == "vcard":
+        return "".join(_vcard(c) for c in contacts)
+    return "".join(
+        json.dumps(dict(zip(EXPORT_FIELDS, _export_values(c))), separators=(",", ":")) + "\n"
+        for c in contacts
+    )
@@ -1,13 +1,149 @@
 import os
+import threading
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool, StaticPool
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite://")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Seconds after which a connection is replaced; -1 keeps connections forever.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Per-statement timeout in milliseconds on PostgreSQL; 0 disables it.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+
+
+class PoolStats:
+    """
+    Counters of how long requests waited for a pooled connection.
+
+    Attributes:
+        checkouts (int): Number of connections handed out.
+        timeouts (int): Number of checkouts that gave up after ``DB_POOL_TIMEOUT``.
+        wait_seconds_total (float): Total time spent waiting for connections.
+        wait_seconds_max (float): Longest single wait.
+    """
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        """
+        Record one checkout.
+
+        Args:
+            waited (float): Seconds spent getting the connection.
+            timed_out (bool): Whether the checkout failed with a pool timeout.
+        """
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class _TimedPoolMixin:
+    # Times every checkout; the stats survive pool.recreate() on engine.dispose().
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool that records checkout wait times in ``stats``."""
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait times in ``stats``."""
+
+
+def get_pool_options(url: str, asyncio: bool = False) -> dict:
+    """
+    Build the engine keyword arguments of the connection pool from the environment.
+
+    Args:
+        url (str): Database URL the engine is created for.
+        asyncio (bool): Whether the options are for an asyncio engine.
+
+    Returns:
+        dict: Keyword arguments for ``create_engine`` / ``create_async_engine``.
+    """
+    options = {
+        "poolclass": TimedAsyncQueuePool if asyncio else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    parsed = make_url(url)
+    if DB_STATEMENT_TIMEOUT_MS and parsed.get_backend_name() == "postgresql":
+        if parsed.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def pool_status(pool: Pool) -> dict:
+    """
+    Get a snapshot of a connection pool's usage.
+
+    Args:
+        pool (Pool): The engine's pool, e.g. ``engine.pool``.
+
+    Returns:
+        dict: Pool size, connections checked out and in, overflow and wait statistics.
+    """
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(
+            checkouts=stats.checkouts,
+            timeouts=stats.timeouts,
+            wait_seconds_total=round(stats.wait_seconds_total, 6),
+            wait_seconds_max=round(stats.wait_seconds_max, 6),
+        )
+    return status
 
 def get_engine():
     """
@@ -23,11 +159,52 @@ def get_engine():
             connect_args={"check_same_thread": False},
             poolclass=StaticPool,
         )
-    return create_engine(DATABASE_URL)
+    return create_engine(DATABASE_URL, **get_pool_options(DATABASE_URL))
+
+
+def get_async_url(url: str) -> str:
+    """
+    Translate a synchronous database URL into its asyncio driver equivalent.
+
+    Args:
+        url (str): Database URL as configured in ``DATABASE_URL``.
+
+    Returns:
+        str: The same URL using aiosqlite for SQLite and asyncpg for PostgreSQL.
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend == "postgresql":
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    return url
+
+
+def get_async_engine():
+    """
+    Create and return a SQLAlchemy asyncio engine instance.
+
+    Returns:
+        AsyncEngine: Asyncio engine for the same database as :func:`get_engine`.
+        The in-memory SQLite database of the async engine is separate from the
+        one used by the synchronous engine.
+    """
+    if DATABASE_URL == "sqlite://":
+        return create_async_engine(
+            get_async_url(DATABASE_URL),
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    async_url = get_async_url(DATABASE_URL)
+    return create_async_engine(async_url, **get_pool_options(async_url, asyncio=True))
 
 engine = get_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = get_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -42,3 +219,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency function to get an asyncio database session.
+
+    Yields:
+        AsyncSession: SQLAlchemy asyncio database session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
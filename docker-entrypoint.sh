@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Apply database migrations
+alembic upgrade head
+
 # Start the API server in the background
 uvicorn main:app --host 0.0.0.0 --port 8000 --reload &
 
@@ -0,0 +1,588 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Relative weights of the operations each virtual user picks from.
+DEFAULT_MIX = {
+    "login": 1,
+    "me": 2,
+    "list": 10,
+    "get": 10,
+    "search": 3,
+    "changes": 2,
+    "create": 3,
+    "update": 3,
+    "delete": 1,
+    "batch_get": 2,
+    "batch_update": 1,
+}
+BATCH_SIZE = 20
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """
+    Parse a workload mix such as ``"list=10,get=10,create=2"``.
+
+    Args:
+        value (str): Comma-separated ``operation=weight`` pairs.
+
+    Returns:
+        Dict[str, int]: Weight by operation.
+
+    Raises:
+        ValueError: If an operation is unknown or a weight is negative.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown operation {name!r}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name!r}")
+    return mix
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Get a nearest-rank percentile.
+
+    Args:
+        sorted_values (List[float]): Values in ascending order.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+
+    Returns:
+        float: The value, or 0.0 for no values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Recorder:
+    """
+    Collects the latency and status of every measured request by route.
+
+    Attributes:
+        measure_from (float): ``time.perf_counter()`` value before which results
+            are discarded as warm-up.
+    """
+
+    def __init__(self, measure_from: float = 0.0):
+        self.measure_from = measure_from
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    def record(self, route: str, status: int, started: float, finished: float) -> None:
+        """
+        Record one request.
+
+        Args:
+            route (str): Method and path template, e.g. "GET /contacts/{contact_id}".
+            status (int): Response status, 0 if no response was received.
+            started (float): ``time.perf_counter()`` when the request was sent.
+            finished (float): ``time.perf_counter()`` when the response was read.
+        """
+        if started < self.measure_from:
+            return
+        self.latencies.setdefault(route, []).append(finished - started)
+        statuses = self.statuses.setdefault(route, {})
+        statuses[status] = statuses.get(status, 0) + 1
+
+    @staticmethod
+    def _summarize(latencies: List[float], statuses: Dict[int, int], seconds: float) -> dict:
+        ordered = sorted(latencies)
+        return {
+            "requests": len(ordered),
+            "errors": sum(count for status, count in statuses.items() if status == 0 or status >= 400),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "throughput_rps": round(len(ordered) / seconds, 2) if seconds > 0 else 0.0,
+            "latency_ms": {
+                "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+                "p50": round(percentile(ordered, 0.50) * 1000, 3),
+                "p95": round(percentile(ordered, 0.95) * 1000, 3),
+                "p99": round(percentile(ordered, 0.99) * 1000, 3),
+                "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+            },
+        }
+
+    def summary(self, seconds: float) -> dict:
+        """
+        Summarize the measured requests.
+
+        Args:
+            seconds (float): Length of the measured period.
+
+        Returns:
+            dict: ``total`` and per-route request counts, errors, status counts,
+            throughput and mean/p50/p95/p99/max latency in milliseconds.
+        """
+        every_latency = [latency for latencies in self.latencies.values() for latency in latencies]
+        every_status: Dict[int, int] = {}
+        for statuses in self.statuses.values():
+            for status, count in statuses.items():
+                every_status[status] = every_status.get(status, 0) + count
+        return {
+            "total": self._summarize(every_latency, every_status, seconds),
+            "routes": {
+                route: self._summarize(self.latencies[route], self.statuses[route], seconds)
+                for route in sorted(self.latencies)
+            },
+        }
+
+
+@dataclass
+class SeededUser:
+    """
+    A user created by :func:`seed`, with the IDs of their contacts.
+    """
+    email: str
+    password: str
+    contact_ids: List[int] = field(default_factory=list)
+
+
+def configure_environment(args: argparse.Namespace) -> Dict[str, str]:
+    """
+    Set the environment the application modules read at import time.
+
+    Must run before anything from the application is imported.
+
+    Args:
+        args (argparse.Namespace): Command line options.
+
+    Returns:
+        Dict[str, str]: The variables that were set.
+    """
+    settings = {
+        "DATABASE_URL": args.database_url,
+        "SECRET_KEY": os.getenv("SECRET_KEY", "loadtest-secret"),
+        "ALGORITHM": os.getenv("ALGORITHM", "HS256"),
+        "RATE_LIMIT_ENABLED": "true" if args.rate_limit else "false",
+        "AVATAR_STORAGE": "local",
+        "AVATAR_LOCAL_DIR": os.path.join(args.work_dir, "media"),
+        "TRACE_EXPORT_FILE": os.path.join(args.work_dir, "traces.jsonl"),
+        "PROFILE_DIR": os.path.join(args.work_dir, "profiles"),
+    }
+    if args.bcrypt_rounds:
+        settings["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    if args.redis_host:
+        settings["REDIS_HOST"], settings["REDIS_PORT"] = args.redis_host, str(args.redis_port)
+    os.environ.update(settings)
+    return settings
+
+
+def prepare_database(url: str) -> None:
+    """
+    Bring a database to the latest schema with the project's migrations.
+
+    Args:
+        url (str): Synchronous SQLAlchemy URL.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+def seed(engine, users: int, contacts: int, seed_value: int) -> List[SeededUser]:
+    """
+    Create verified users with contacts directly in the database.
+
+    Emails are unique per run, so a database can be seeded repeatedly.
+
+    Args:
+        engine: Synchronous SQLAlchemy engine of the application's database.
+        users (int): Number of users.
+        contacts (int): Contacts per user.
+        seed_value (int): Seed of the generated contact data.
+
+    Returns:
+        List[SeededUser]: The users, their password and contact IDs.
+    """
+    from sqlalchemy import insert, select
+
+    from changes import contact_values
+    from models import Contact, User
+    from passwords import hash_password_sync
+
+    rng = random.Random(seed_value)
+    run = uuid.uuid4().hex[:8]
+    password = "loadtest-password"
+    hashed_password = hash_password_sync(password)
+    seeded = []
+    with engine.begin() as conn:
+        for i in range(users):
+            email = f"load-{run}-{i}@example.com"
+            user_id = conn.execute(
+                insert(User).values(email=email, hashed_password=hashed_password, is_verified=True,
+                                    role="user", change_seq=contacts).returning(User.id)
+            ).scalar_one()
+            if contacts:
+                conn.execute(insert(Contact), [
+                    contact_values({
+                        "owner_id": user_id,
+                        "first_name": rng.choice(["Anna", "Bohdan", "Iryna", "Maksym", "Olena", "Taras"]) + str(n),
+                        "last_name": rng.choice(["Bondar", "Kovalenko", "Melnyk", "Shevchenko", "Tkachenko"]),
+                        "email": f"contact{n}@{run}.example.com",
+                        "phone": f"+380{rng.randrange(10 ** 9):09d}",
+                        "birthday": date(rng.randrange(1950, 2005), rng.randrange(1, 13), rng.randrange(1, 29)),
+                        "change_seq": n + 1,
+                    })
+                    for n in range(contacts)
+                ])
+            contact_ids = conn.execute(
+                select(Contact.id).where(Contact.owner_id == user_id).order_by(Contact.id)
+            ).scalars().all()
+            seeded.append(SeededUser(email, password, list(contact_ids)))
+    return seeded
+
+
+class VirtualUser:
+    """
+    Sends a random mix of operations as one user, one request at a time.
+
+    Seeded contacts are only read and updated; deletes take contacts this
+    virtual user created, so no operation fails because another one ran first.
+
+    Attributes:
+        client (httpx.AsyncClient): Client bound to the application.
+        user (SeededUser): The user logged in as.
+        recorder (Recorder): Where results are recorded.
+        rng (random.Random): Source of the operation sequence.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, user: SeededUser, recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.user = user
+        self.recorder = recorder
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.created: List[int] = []
+
+    async def _request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(route, 0, started, time.perf_counter())
+            return None
+        self.recorder.record(route, response.status_code, started, time.perf_counter())
+        return response
+
+    def _contact(self) -> dict:
+        n = self.rng.randrange(10 ** 6)
+        return {
+            "first_name": f"Load{n}",
+            "last_name": "Test",
+            "email": f"load{n}@example.com",
+            "phone": f"+1555{n:07d}",
+            "birthday": "1990-05-17",
+        }
+
+    async def login(self) -> None:
+        response = await self._request("POST /token", "POST", "/token",
+                                       data={"username": self.user.email, "password": self.user.password})
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def me(self) -> None:
+        await self._request("GET /me/", "GET", "/me/")
+
+    async def list(self) -> None:
+        await self._request("GET /contacts/", "GET", "/contacts/", params={"limit": 50})
+
+    async def get(self) -> None:
+        contact_id = self.rng.choice(self.user.contact_ids)
+        await self._request("GET /contacts/{contact_id}", "GET", f"/contacts/{contact_id}")
+
+    async def search(self) -> None:
+        query = self.rng.choice(["anna", "bondar", "iryna", "melnyk", "taras", "kov"])
+        await self._request("GET /contacts/search", "GET", "/contacts/search", params={"q": query})
+
+    async def changes(self) -> None:
+        await self._request("GET /contacts/changes", "GET", "/contacts/changes", params={"since": 0, "limit": 100})
+
+    async def create(self) -> None:
+        response = await self._request("POST /contacts/", "POST", "/contacts/", json=self._contact())
+        if response is not None and response.status_code == 200:
+            self.created.append(response.json()["id"])
+
+    async def update(self) -> None:
+        contact_id = self.rng.choice(self.user.contact_ids)
+        await self._request("PUT /contacts/{contact_id}", "PUT", f"/contacts/{contact_id}", json=self._contact())
+
+    async def delete(self) -> None:
+        if not self.created:
+            await self.create()
+            return
+        contact_id = self.created.pop()
+        await self._request("DELETE /contacts/{contact_id}", "DELETE", f"/contacts/{contact_id}")
+
+    async def batch_get(self) -> None:
+        ids = self.rng.sample(self.user.contact_ids, min(BATCH_SIZE, len(self.user.contact_ids)))
+        await self._request("GET /contacts/batch", "GET", "/contacts/batch", params={"ids": ids})
+
+    async def batch_update(self) -> None:
+        ids = self.rng.sample(self.user.contact_ids, min(BATCH_SIZE, len(self.user.contact_ids)))
+        await self._request("PATCH /contacts/batch", "PATCH", "/contacts/batch",
+                            json={"ids": ids, "changes": {"additional_info": f"bulk {self.rng.randrange(1000)}"}})
+
+    async def run(self, mix: Dict[str, int], deadline: float) -> None:
+        """
+        Log in, then send operations picked by weight until the deadline.
+
+        Args:
+            mix (Dict[str, int]): Weight by operation.
+            deadline (float): ``time.perf_counter()`` value to stop at.
+        """
+        await self.login()
+        operations = [name for name, weight in mix.items() if weight > 0]
+        if not self.user.contact_ids:
+            operations = [name for name in operations if name not in ("get", "update", "batch_get", "batch_update")]
+        weights = [mix[name] for name in operations]
+        while operations and time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(operations, weights)[0])()
+
+
+async def run_workload(client: httpx.AsyncClient, users: List[SeededUser], mix: Dict[str, int],
+                       concurrency: int, duration: float, warmup: float = 0.0, seed_value: int = 0) -> dict:
+    """
+    Drive a mixed workload with concurrent virtual users and summarize it.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the application.
+        users (List[SeededUser]): Users shared round-robin by the virtual users.
+        mix (Dict[str, int]): Weight by operation.
+        concurrency (int): Number of virtual users.
+        duration (float): Seconds measured, after the warm-up.
+        warmup (float): Seconds run before measuring.
+        seed_value (int): Seed of the operation sequences.
+
+    Returns:
+        dict: :meth:`Recorder.summary` of the measured period.
+    """
+    start = time.perf_counter()
+    recorder = Recorder(measure_from=start + warmup)
+    deadline = start + warmup + duration
+    virtual_users = [
+        VirtualUser(client, users[i % len(users)], recorder, random.Random(seed_value * 1000 + i))
+        for i in range(concurrency)
+    ]
+    await asyncio.gather(*(virtual_user.run(mix, deadline) for virtual_user in virtual_users))
+    return recorder.summary(time.perf_counter() - recorder.measure_from)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_fake_redis(port: int) -> None:
+    import redis
+    from fakeredis import TcpFakeServer
+
+    from login_guard import CHECK_SCRIPT, RECORD_FAILURE_SCRIPT
+    from rate_limit import GCRA_SCRIPT
+
+    server = TcpFakeServer(("127.0.0.1", port))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # fakeredis' TCP server drops EVAL but runs loaded scripts, and the app
+    # only falls back to EVAL when EVALSHA finds nothing.
+    client = redis.Redis(host="127.0.0.1", port=port)
+    for script in (GCRA_SCRIPT, CHECK_SCRIPT, RECORD_FAILURE_SCRIPT):
+        client.script_load(script)
+    client.close()
+
+
+async def _wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+            try:
+                await client.get("/metrics")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"uvicorn did not start within {timeout} seconds")
+
+
+async def _run(args: argparse.Namespace, users: List[SeededUser], mix: Dict[str, int]) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.mode == "uvicorn":
+        port = _free_port()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT, env=os.environ.copy(),
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            await _wait_until_ready(base_url, process)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+                return await run_workload(client, users, mix, args.concurrency, args.duration, args.warmup, args.seed)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+    import fakeredis
+    import main as application
+
+    if not args.redis_host:
+        application.redis_store.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    await application.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=application.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", limits=limits,
+                                     timeout=30.0) as client:
+            return await run_workload(client, users, mix, args.concurrency, args.duration, args.warmup, args.seed)
+    finally:
+        await application.app.router.shutdown()
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: Optional[dict] = None) -> None:
+    """
+    Print per-route results, with changes against a baseline if given.
+
+    Args:
+        results (dict): Results written by this harness.
+        baseline (Optional[dict]): Earlier results to compare with.
+    """
+    rows = [("TOTAL", results["total"])] + list(results["routes"].items())
+    before = {"TOTAL": baseline["total"], **baseline["routes"]} if baseline else {}
+    print(f"{'route':<32} {'req':>7} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in rows:
+        latency = stats["latency_ms"]
+        print(f"{route:<32} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>9.1f} "
+              f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f}")
+        if route in before:
+            old = before[route]
+            print(f"{'  vs baseline':<32} {'':>7} {'':>5} "
+                  f"{_change(stats['throughput_rps'], old['throughput_rps']):>9} "
+                  f"{_change(latency['p50'], old['latency_ms']['p50']):>9} "
+                  f"{_change(latency['p95'], old['latency_ms']['p95']):>9} "
+                  f"{_change(latency['p99'], old['latency_ms']['p99']):>9}")
+
+
+def _change(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    """
+    Seed a database, drive a mixed workload against the app and write the results.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments; ``sys.argv`` if None.
+
+    Returns:
+        dict: The results, as written to ``--output``.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess",
+                        help="serve the app through httpx's ASGI transport or a uvicorn subprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="defaults to a new SQLite file in --work-dir")
+    parser.add_argument("--redis-host", help="use this Redis instead of fakeredis")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=200, help="contacts per user")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="operation weights, e.g. list=10,get=10,create=2 (default: %(default)s)")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting on")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the data and operation sequences")
+    parser.add_argument("--work-dir", help="directory for the SQLite file and app output")
+    parser.add_argument("--output", default="loadtest-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    args = parser.parse_args(argv)
+
+    args.work_dir = args.work_dir or tempfile.mkdtemp(prefix="loadtest-")
+    args.database_url = args.database_url or f"sqlite:///{os.path.join(args.work_dir, 'loadtest.db')}"
+    fake_redis = args.mode == "uvicorn" and not args.redis_host
+    if fake_redis:
+        # Worker processes need a server to share, so fakeredis listens on TCP.
+        args.redis_host, args.redis_port = "127.0.0.1", _free_port()
+    configure_environment(args)
+    if fake_redis:
+        _start_fake_redis(args.redis_port)
+
+    from database import engine
+
+    prepare_database(args.database_url)
+    users = seed(engine, args.users, args.contacts, args.seed)
+    summary = asyncio.run(_run(args, users, args.mix))
+
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "database": args.database_url.split("://")[0],
+            "redis": "fakeredis" if fake_redis or not args.redis_host else "redis",
+            "users": args.users,
+            "contacts_per_user": args.contacts,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": args.mix,
+            "bcrypt_rounds": int(os.environ.get("BCRYPT_ROUNDS", 12)),
+            "rate_limit": args.rate_limit,
+            "seed": args.seed,
+        },
+        **summary,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\nResults written to {args.output}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
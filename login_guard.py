@@ -0,0 +1,124 @@
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+
+from redis_store import RedisStore
+
+LOGIN_ACCOUNT_MAX_FAILURES = int(os.getenv("LOGIN_ACCOUNT_MAX_FAILURES", 5))
+LOGIN_IP_MAX_FAILURES = int(os.getenv("LOGIN_IP_MAX_FAILURES", 20))
+LOGIN_FAILURE_WINDOW = int(os.getenv("LOGIN_FAILURE_WINDOW", 900))
+LOGIN_LOCKOUT_SECONDS = int(os.getenv("LOGIN_LOCKOUT_SECONDS", 30))
+LOGIN_LOCKOUT_MAX_SECONDS = int(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", 3600))
+
+# KEYS are (failure counter, lock) pairs; ARGV holds the window, the base and
+# maximum lockout and then one threshold per pair. Every failure at or above a
+# threshold doubles that lock, up to the maximum.
+RECORD_FAILURE_SCRIPT = """
+local window = tonumber(ARGV[1])
+local base = tonumber(ARGV[2])
+local cap = tonumber(ARGV[3])
+for i = 1, #KEYS, 2 do
+    local failures = redis.call('INCR', KEYS[i])
+    redis.call('EXPIRE', KEYS[i], window)
+    local threshold = tonumber(ARGV[3 + (i + 1) / 2])
+    if failures >= threshold then
+        local lock = math.min(cap, base * 2 ^ math.min(failures - threshold, 30))
+        redis.call('SET', KEYS[i + 1], 1, 'EX', math.floor(lock))
+    end
+end
+return 0
+"""
+
+# Returns the longest remaining lock in milliseconds, or 0 if nothing is locked.
+CHECK_SCRIPT = """
+local remaining = 0
+for i = 1, #KEYS do
+    remaining = math.max(remaining, redis.call('PTTL', KEYS[i]))
+end
+return remaining
+"""
+
+
+class LoginGuard:
+    """
+    Locks out accounts and client IPs after repeated failed logins.
+
+    The lock is checked before the password is verified, so guesses against a
+    locked account or from a locked IP cost one Redis round trip instead of a
+    bcrypt verification, and cannot crowd legitimate logins out of the hashing
+    pool. While Redis is unavailable nothing is locked.
+
+    Attributes:
+        store (RedisStore): Redis access for counters and locks.
+        account_max_failures (int): Failures per account before it is locked.
+        ip_max_failures (int): Failures per IP before it is locked.
+        window (int): Seconds a failure is remembered after the last one.
+        lockout (int): First lockout in seconds; doubles with every further failure.
+        max_lockout (int): Longest lockout in seconds.
+    """
+
+    def __init__(self, store: RedisStore, account_max_failures: int = LOGIN_ACCOUNT_MAX_FAILURES,
+                 ip_max_failures: int = LOGIN_IP_MAX_FAILURES, window: int = LOGIN_FAILURE_WINDOW,
+                 lockout: int = LOGIN_LOCKOUT_SECONDS, max_lockout: int = LOGIN_LOCKOUT_MAX_SECONDS):
+        self.store = store
+        self.account_max_failures = account_max_failures
+        self.ip_max_failures = ip_max_failures
+        self.window = window
+        self.lockout = lockout
+        self.max_lockout = max_lockout
+
+    @staticmethod
+    def _account(email: str) -> str:
+        return f"login:acct:{email.strip().lower()}"
+
+    @staticmethod
+    def _ip(ip: Optional[str]) -> str:
+        return f"login:ip:{ip or 'unknown'}"
+
+    async def check(self, email: str, ip: Optional[str]) -> None:
+        """
+        Reject a login attempt if its account or IP is locked.
+
+        Args:
+            email (str): The submitted email.
+            ip (Optional[str]): The client's IP address.
+
+        Raises:
+            HTTPException: 429 with ``Retry-After`` while either is locked.
+        """
+        keys = [f"{self._account(email)}:lock", f"{self._ip(ip)}:lock"]
+        remaining = await self.store.run_script(CHECK_SCRIPT, keys, [], default=0)
+        if remaining and remaining > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many failed login attempts",
+                headers={"Retry-After": str(-(-int(remaining) // 1000))},
+            )
+
+    async def record_failure(self, email: str, ip: Optional[str]) -> None:
+        """
+        Count a failed login against the account and the IP, locking them at their thresholds.
+
+        Args:
+            email (str): The submitted email.
+            ip (Optional[str]): The client's IP address.
+        """
+        account, address = self._account(email), self._ip(ip)
+        await self.store.run_script(
+            RECORD_FAILURE_SCRIPT,
+            [f"{account}:fail", f"{account}:lock", f"{address}:fail", f"{address}:lock"],
+            [self.window, self.lockout, self.max_lockout, self.account_max_failures, self.ip_max_failures],
+        )
+
+    async def record_success(self, email: str) -> None:
+        """
+        Forget the failures of an account after a successful login.
+
+        The IP's failures are kept, so a credential-stuffing source is not reset by
+        the occasional valid pair.
+
+        Args:
+            email (str): The email that logged in.
+        """
+        await self.store.delete(f"{self._account(email)}:fail")
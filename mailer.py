@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import os
+import smtplib
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from metrics import SMTP_SEND_SECONDS
+from tracing import tracer
+from models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 30))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", 3600))
+# A batch left "sending" this long is assumed to belong to a worker that died and is sent again.
+OUTBOX_CLAIM_SECONDS = float(os.getenv("OUTBOX_CLAIM_SECONDS", 900))
+
+
+def queue_email(db: AsyncSession, recipient: str, subject: str, body: str) -> EmailOutbox:
+    """
+    Add an email to the outbox in the caller's transaction.
+
+    The email is sent only if the caller commits.
+
+    Args:
+        db (AsyncSession): The database session.
+        recipient (str): Recipient address.
+        subject (str): Message subject.
+        body (str): Plain text message body.
+
+    Returns:
+        EmailOutbox: The pending outbox row.
+    """
+    message = EmailOutbox(recipient=recipient, subject=subject, body=body)
+    db.add(message)
+    return message
+
+
+def queue_verification_email(db: AsyncSession, email: str, token: str) -> EmailOutbox:
+    """
+    Queue the email address verification email.
+
+    Args:
+        db (AsyncSession): The database session.
+        email (str): User's email address
+        token (str): Verification token
+
+    Returns:
+        EmailOutbox: The pending outbox row.
+    """
+    verification_url = f"{APP_BASE_URL}/verify/{token}"
+    return queue_email(db, email, "Verify your email",
+                       f"Please verify your email by clicking the link: {verification_url}")
+
+
+def queue_password_reset_email(db: AsyncSession, email: str, token: str) -> EmailOutbox:
+    """
+    Queue the password reset email.
+
+    Args:
+        db (AsyncSession): The database session.
+        email (str): The recipient's email address.
+        token (str): The password reset token.
+
+    Returns:
+        EmailOutbox: The pending outbox row.
+    """
+    return queue_email(db, email, "Reset your password",
+                       f"Click the link to reset your password: {APP_BASE_URL}/reset-password/{token}")
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """
+    Get the exponential backoff before the next delivery attempt.
+
+    Args:
+        attempts (int): Number of failed attempts so far, at least 1.
+
+    Returns:
+        timedelta: Delay before the next attempt.
+    """
+    return timedelta(seconds=min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS))
+
+
+class SMTPConnection:
+    """
+    A lazily opened SMTP session that is reused for many messages.
+
+    The session is opened (and upgraded with STARTTLS and logged in, if configured)
+    on the first send and kept open. A message that fails because the server
+    dropped the session is retried once on a fresh session.
+
+    Attributes:
+        host (str): SMTP server host.
+        port (int): SMTP server port.
+        username (Optional[str]): Login user, or None to skip authentication.
+        password (Optional[str]): Login password.
+        starttls (bool): Whether to upgrade the session with STARTTLS.
+        sender (Optional[str]): Address used in the From header.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = True, sender: Optional[str] = None, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.sender = sender or username
+        self.timeout = timeout
+        self._server = None
+
+    @classmethod
+    def from_env(cls) -> "SMTPConnection":
+        """
+        Create a connection from the ``SMTP_*`` environment variables.
+
+        Returns:
+            SMTPConnection: The (not yet opened) connection.
+        """
+        return cls(
+            host=os.getenv("SMTP_SERVER"),
+            port=int(os.getenv("SMTP_PORT", 587)),
+            username=os.getenv("SMTP_EMAIL"),
+            password=os.getenv("SMTP_PASSWORD"),
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+        )
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def send(self, recipient: str, subject: str, body: str) -> None:
+        """
+        Send one plain text message over the shared session.
+
+        Args:
+            recipient (str): Recipient address.
+            subject (str): Message subject.
+            body (str): Plain text message body.
+
+        Raises:
+            smtplib.SMTPException: If the server rejects the message.
+            OSError: If the server cannot be reached.
+        """
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = self.sender
+        msg["To"] = recipient
+        msg.set_content(body)
+
+        with SMTP_SEND_SECONDS.time(), tracer.span("smtp.send", **{"server.address": self.host}):
+            if self._server is None:
+                self._server = self._open()
+            try:
+                self._server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self._server = self._open()
+                self._server.send_message(msg)
+
+    def close(self) -> None:
+        """
+        Close the session if it is open.
+        """
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+
+class OutboxWorker:
+    """
+    Delivers pending outbox emails in batches over one reused SMTP connection.
+
+    :meth:`drain` can be scheduled after a request commits new emails;
+    :meth:`start` runs a polling loop that also picks up retries. Drains within
+    one process never overlap. A batch is claimed by marking it "sending" in a
+    short transaction (on PostgreSQL with ``FOR UPDATE SKIP LOCKED``, so several
+    processes can drain concurrently), sent with no transaction open, and its
+    results are recorded in a second short transaction. A batch whose results
+    never arrive is claimed again after ``OUTBOX_CLAIM_SECONDS``.
+
+    Attributes:
+        connection (SMTPConnection): The shared SMTP connection.
+        batch_size (int): Maximum number of emails claimed per transaction.
+    """
+
+    def __init__(self, connection: SMTPConnection, batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL, session_factory=AsyncSessionLocal):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self._lock = None
+        self._task = None
+
+    async def _claim_batch(self) -> List[Tuple[int, int, str, str, str]]:
+        now = datetime.utcnow()
+        due = EmailOutbox.status.in_(("pending", "sending"))
+        async with self.session_factory() as db:
+            ids = (await db.execute(
+                select(EmailOutbox.id)
+                .where(due, EmailOutbox.next_attempt_at <= now)
+                .order_by(EmailOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not ids:
+                return []
+            # While the batch is sent, next_attempt_at is the end of the claim.
+            claimed = (await db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids), due, EmailOutbox.next_attempt_at <= now)
+                .values(status="sending", attempts=EmailOutbox.attempts + 1,
+                        next_attempt_at=now + timedelta(seconds=OUTBOX_CLAIM_SECONDS))
+                .returning(EmailOutbox.id, EmailOutbox.attempts, EmailOutbox.recipient,
+                           EmailOutbox.subject, EmailOutbox.body)
+            )).all()
+            await db.commit()
+        return sorted(claimed)
+
+    async def _drain_batch(self) -> int:
+        messages = await self._claim_batch()
+        results = []
+        for message_id, attempts, recipient, subject, body in messages:
+            try:
+                await run_in_threadpool(self.connection.send, recipient, subject, body)
+            except (smtplib.SMTPException, OSError) as e:
+                logger.warning("Sending outbox email %s failed (attempt %s): %s", message_id, attempts, e)
+                await run_in_threadpool(self.connection.close)
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    values = dict(status="failed", last_error=str(e)[:1000])
+                else:
+                    values = dict(status="pending", last_error=str(e)[:1000],
+                                  next_attempt_at=datetime.utcnow() + retry_delay(attempts))
+            else:
+                values = dict(status="sent", sent_at=datetime.utcnow(), last_error=None)
+            results.append((message_id, attempts, values))
+        if results:
+            async with self.session_factory() as db:
+                for message_id, attempts, values in results:
+                    # Skip rows another worker took over after this claim expired.
+                    await db.execute(
+                        update(EmailOutbox)
+                        .where(EmailOutbox.id == message_id, EmailOutbox.status == "sending",
+                               EmailOutbox.attempts == attempts)
+                        .values(**values)
+                    )
+                await db.commit()
+        return len(messages)
+
+    async def drain(self) -> int:
+        """
+        Send due emails until none are left.
+
+        Returns:
+            int: Number of emails attempted.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        total = 0
+        async with self._lock:
+            while True:
+                count = await self._drain_batch()
+                total += count
+                if count < self.batch_size:
+                    return total
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except Exception:
+                logger.exception("Outbox drain failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """
+        Start the polling loop on the running event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the polling loop and close the SMTP connection.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.connection.close)
+
+
+outbox_worker = OutboxWorker(SMTPConnection.from_env())
@@ -2,39 +2,60 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
-import smtplib
+import csv
 from datetime import datetime, timedelta, date
-from email.message import EmailMessage
-from typing import List, Optional
-import json
-import redis
+from typing import List, Literal, Optional
 import cloudinary
-import cloudinary.uploader
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Security
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, UploadFile, File, Security, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pydantic import EmailStr
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.util import get_remote_address
-from sqlalchemy.orm import Session, relationship
+from pydantic import EmailStr, TypeAdapter
+from sqlalchemy import case, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter
 from starlette.requests import Request
-from database import SessionLocal, engine, Base
-from models import Contact, User, ContactResponse, ContactCreate, UserRole
+from database import DATABASE_URL, async_engine, AsyncSessionLocal, Base, engine, get_async_db, pool_status
+from models import AvatarJob, AvatarJobResponse, Contact, User, ContactResponse, ContactCreate, UserResponse, UserRole, \
+    ContactChangesResponse, ContactBatchResponse, ContactBatchDeleteResponse, ContactBatchUpdate, MAX_BATCH_SIZE, \
+    birthday_day_of_year
+from avatars import AVATAR_LOCAL_DIR, AVATAR_LOCAL_URL, AvatarPipeline, get_storage, spool_upload
+from mailer import outbox_worker, queue_password_reset_email, queue_verification_email
+from passwords import password_hasher
+from login_guard import LoginGuard
+from metrics import MetricsMiddleware, http_metrics, instrument_engine, render_metrics
+from profiling import ProfilingMiddleware, RequestProfiler
+from tracing import TracingMiddleware, trace_database, tracer
+from principal_cache import PrincipalCache
+from rate_limit import RateLimiter
+from redis_store import RedisStore
+from contact_cache import ContactCache, etag_matches
+from token_cache import TokenCache
+from contact_io import EXPORT_CHUNK_SIZE, EXPORT_EXTENSIONS, EXPORT_MEDIA_TYPES, IMPORT_BATCH_SIZE, \
+    IMPORT_FORMATS, MAX_IMPORT_BATCH_SIZE, MAX_REPORTED_ERRORS, detect_format, encode_contacts, export_header, \
+    read_batches
+from search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, build_search, search_terms
+from changes import DEFAULT_CHANGES_LIMIT, MAX_CHANGES_LIMIT, delete_contacts, insert_contact, load_changes, \
+    reserve_change_seq, update_contacts
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, next_cursor, paginate
 
 # Redis configuration
-redis_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"),
-    port=int(os.getenv("REDIS_PORT", 6379)),
-    db=0,
-    decode_responses=True
-)
+redis_store = RedisStore.from_env()
+principal_cache = PrincipalCache(redis_store)
+contact_cache = ContactCache(redis_store)
+contact_list_adapter = TypeAdapter(List[ContactResponse])
+avatar_pipeline = AvatarPipeline(get_storage(), principal_cache.invalidate)
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+token_cache = TokenCache(SECRET_KEY, ALGORITHM)
+rate_limiter = RateLimiter(redis_store, token_cache)
+login_guard = LoginGuard(redis_store)
+request_profiler = RequestProfiler(SECRET_KEY)
 
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
@@ -43,12 +64,31 @@ cloudinary.config(
     secure=True
 )
 
-app = FastAPI()
+# Every route is rate limited, per user when authenticated and per IP otherwise.
+app = FastAPI(dependencies=[Depends(rate_limiter)])
+app.mount(AVATAR_LOCAL_URL, StaticFiles(directory=AVATAR_LOCAL_DIR, check_dir=False), name="media")
 
-# Create tables only when running the app
 @app.on_event("startup")
 async def startup():
-    Base.metadata.create_all(bind=engine)
+    # The schema is managed by `alembic upgrade head`; only a private in-memory
+    # database cannot be migrated ahead of time.
+    if DATABASE_URL == "sqlite://":
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    http_metrics.prepare(app.routes)
+    principal_cache.start_listener()
+    outbox_worker.start()
+    avatar_pipeline.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await principal_cache.stop_listener()
+    await avatar_pipeline.stop()
+    password_hasher.shutdown()
+    await outbox_worker.stop()
+    await redis_store.close()
+    tracer.flush()
 
 # CORS Middleware
 app.add_middleware(
@@ -58,30 +98,18 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# Added last so they are outermost and time the whole request.
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+trace_database(engine, async_engine.sync_engine)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 
-def get_db():
-    """
-    Dependency to get a database session.
-    
-    Yields:
-        Session: A SQLAlchemy database session.
-    """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """
     Create a JWT access token.
@@ -100,76 +128,64 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_user(db: Session, email: str):
+async def get_user(db: AsyncSession, email: str):
     """
     Get a user by email from the database.
     
     Args:
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         email (str): The user's email.
     
     Returns:
         User: The user object if found, None otherwise.
     """
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """
-    Verify a plain password against a hashed password.
-    
-    Args:
-        plain_password (str): Plain text password to verify
-        hashed_password (str): Hashed password to verify against
-        
-    Returns:
-        bool: True if passwords match, False otherwise
-    """
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """
-    Hash a password.
-    
-    Args:
-        password (str): Plain text password to hash
-        
-    Returns:
-        str: Hashed password
-    """
-    return pwd_context.hash(password)
-
-
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """
     Authenticate a user with email and password.
+
+    The bcrypt check runs in the password hashing process pool. A hash below the
+    configured cost is replaced with a fresh one on successful login. Unknown
+    emails get a dummy verification, so they take as long as a wrong password.
     
     Args:
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         email (str): The user's email.
         password (str): The user's password.
     
     Returns:
         User: The authenticated user object if successful, None otherwise.
     """
-    user = get_user(db, email)
-    if not user or not verify_password(password, user.hashed_password):
+    user = await get_user(db, email)
+    if not user:
+        await password_hasher.verify_dummy(password)
+        return None
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme),
+                           db: AsyncSession = Depends(get_async_db)) -> UserResponse:
     """
     Get the current authenticated user from the JWT token.
-    First tries to get the user from Redis cache, if not found, gets from database.
+    Verified tokens are served from the token cache until they expire.
+    The user is looked up in the principal cache (worker memory, then Redis)
+    and loaded from the database only on a miss.
     
     Args:
         token (str): JWT token from Authorization header
-        db (Session): Database session
+        db (AsyncSession): Database session
         
     Returns:
-        User: Current authenticated user
+        UserResponse: Current authenticated user
         
     Raises:
         HTTPException: If token is invalid or user not found
@@ -180,110 +196,461 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        
-        # Try to get user from Redis cache
-        cached_user = redis_client.get(f"user:{email}")
-        if cached_user:
-            user_dict = json.loads(cached_user)
-            user = User(
-                id=user_dict["id"],
-                email=user_dict["email"],
-                hashed_password=user_dict["hashed_password"],
-                is_verified=user_dict["is_verified"]
-            )
-            return user
-        
-        # If not in cache, get from database
-        user = get_user(db, email)
-        if not user:
-            raise credentials_exception
-        
-        # Cache user in Redis for 30 minutes
-        user_dict = {
-            "id": user.id,
-            "email": user.email,
-            "hashed_password": user.hashed_password,
-            "is_verified": user.is_verified
-        }
-        redis_client.setex(
-            f"user:{email}",
-            timedelta(minutes=30),
-            json.dumps(user_dict)
-        )
-        
-        return user
+        payload = token_cache.decode(token)
     except JWTError:
         raise credentials_exception
+    email = payload.get("sub")
+    if not email:
+        raise credentials_exception
 
+    async def load_user():
+        user = await get_user(db, email)
+        return UserResponse.model_validate(user) if user else None
 
-def send_verification_email(email: str, token: str):
+    user = await principal_cache.get(email, load_user)
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+def json_response(body: str, headers: dict) -> Response:
     """
-    Send a verification email to the user.
-    
+    Wrap an already serialized JSON body in a response.
+
     Args:
-        email (str): User's email address
-        token (str): Verification token
+        body (str): The JSON body.
+        headers (dict): Response headers.
+
+    Returns:
+        Response: The response.
     """
-    verification_url = f"http://localhost:8000/verify/{token}"
-    msg = EmailMessage()
-    msg["Subject"] = "Verify your email"
-    msg["From"] = os.getenv("SMTP_EMAIL")
-    msg["To"] = email
-    msg.set_content(f"Please verify your email by clicking the link: {verification_url}")
+    return Response(content=body, media_type="application/json", headers=headers)
 
-    with smtplib.SMTP(os.getenv("SMTP_SERVER"), int(os.getenv("SMTP_PORT"))) as server:
-        server.starttls()
-        server.login(os.getenv("SMTP_EMAIL"), os.getenv("SMTP_PASSWORD"))
-        server.send_message(msg)
+
+async def get_owned_contact(db: AsyncSession, contact_id: int, owner_id: int):
+    """
+    Get a contact by ID if it belongs to the given user.
+
+    Args:
+        db (AsyncSession): The database session.
+        contact_id (int): The contact's ID.
+        owner_id (int): ID of the user that must own the contact.
+
+    Returns:
+        Contact: The contact if found, None otherwise.
+    """
+    result = await db.execute(select(Contact).where(Contact.id == contact_id, Contact.owner_id == owner_id))
+    return result.scalars().first()
 
 
 @app.post("/contacts/", response_model=ContactResponse)
-def create_contact(contact: ContactCreate, db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+async def create_contact(contact: ContactCreate, db: AsyncSession = Depends(get_async_db),
+                         current_user: UserResponse = Depends(get_current_user)):
     """
     Create a new contact for the current user.
+
+    The contact is written and read back with a single ``INSERT ... RETURNING``.
     
     Args:
         contact (ContactCreate): The contact data.
-        db (Session): The database session.
-        current_user (User): The authenticated user.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
         ContactResponse: The created contact.
     """
-    db_contact = Contact(**contact.dict(), owner_id=current_user.id)
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    db_contact = await insert_contact(db, current_user.id, contact.model_dump())
+    await db.commit()
     return db_contact
 
 
+@app.post("/contacts/import")
+async def import_contacts(
+    file: UploadFile = File(...),
+    format: Optional[Literal["csv", "ndjson"]] = None,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Bulk import contacts from an uploaded CSV or NDJSON file.
+
+    The file is read incrementally and validated against ``ContactCreate`` in
+    batches of ``batch_size`` rows. The valid rows of each batch are written with a
+    single multi-row INSERT and committed, so rows imported before an error stay
+    imported. CSV files need a header row with the ``ContactCreate`` field names.
+
+    Args:
+        file (UploadFile): The CSV or NDJSON file.
+        format (Optional[str]): "csv" or "ndjson"; detected from the upload when omitted.
+        batch_size (int): Number of rows validated and inserted per statement.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        dict: Number of imported and failed rows and the errors of the failed rows.
+
+    Raises:
+        HTTPException: If the format is unknown or the file cannot be decoded.
+    """
+    fmt = format or detect_format(file.content_type, file.filename)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=415, detail="Unsupported import format, expected CSV or NDJSON")
+
+    imported = 0
+    failed = 0
+    errors = []
+    batches = read_batches(file.file, fmt, batch_size)
+    while True:
+        try:
+            batch = await run_in_threadpool(next, batches, None)
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Malformed {fmt} file after {imported + failed} rows: {e}")
+        if batch is None:
+            break
+
+        rows = []
+        for row_no, parsed in batch:
+            if isinstance(parsed, ContactCreate):
+                rows.append(dict(
+                    parsed.model_dump(),
+                    birthday_doy=birthday_day_of_year(parsed.birthday),
+                    owner_id=current_user.id,
+                ))
+            else:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_no, "errors": parsed})
+        if not rows:
+            continue
+        try:
+            last_seq = await reserve_change_seq(db, current_user.id, len(rows))
+            for i, row in enumerate(rows):
+                row["change_seq"] = last_seq - len(rows) + 1 + i
+            await db.execute(insert(Contact).values(rows))
+            await db.commit()
+            imported += len(rows)
+        except SQLAlchemyError:
+            await db.rollback()
+            failed += len(rows)
+            for row_no, parsed in batch:
+                if isinstance(parsed, ContactCreate) and len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_no, "errors": [{"field": None, "message": "Database error"}]})
+
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+
+
 @app.get("/contacts/", response_model=List[ContactResponse])
-def read_contacts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def read_contacts(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "name", "updated_at"] = "id",
+    order: Literal["asc", "desc"] = "asc",
+    name: Optional[str] = Query(None, min_length=1, max_length=100),
+    email_domain: Optional[str] = Query(None, min_length=1, max_length=255),
+    birthday_from: Optional[date] = None,
+    birthday_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user),
+):
     """
-    Get all contacts for the current user.
-    
+    Get a page of contacts for the current user.
+
+    Pages are addressed with an opaque keyset cursor. The cursor of the next page is
+    returned in the ``X-Next-Cursor`` header and as a ``Link: rel="next"`` header;
+    both are absent on the last page.
+
+    Serialized pages are cached per user and contacts version. Every response
+    carries a strong ``ETag``; a matching ``If-None-Match`` gets a 304 after
+    reading only the version. The version is read from the database, not Redis,
+    so a 304 still costs one primary-key query: it stays correct when Redis is
+    flushed or down, and is never behind a write that already committed.
+
     Args:
-        db (Session): The database session.
-        current_user (User): The authenticated user.
-    
+        request (Request): The incoming request, used for the cache key and the next page link.
+        limit (int): Maximum number of contacts to return.
+        cursor (Optional[str]): Cursor returned with the previous page.
+        sort (str): Sort order: "id", "name" (last name, first name) or "updated_at".
+        order (str): Sort direction, "asc" or "desc".
+        name (Optional[str]): Prefix of the first or last name.
+        email_domain (Optional[str]): Domain of the contact's email address.
+        birthday_from (Optional[date]): Earliest birthday, inclusive.
+        birthday_to (Optional[date]): Latest birthday, inclusive.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        List[ContactResponse]: A page of the user's contacts.
+
+    Raises:
+        HTTPException: If the cursor is invalid.
+    """
+    version = await ContactCache.version(db, current_user.id)
+    resource = "list." + ContactCache.list_key(request.query_params.multi_items())
+    etag = ContactCache.etag(current_user.id, version, resource)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = await contact_cache.get(current_user.id, version, resource)
+    if cached:
+        return json_response(cached["body"], {"ETag": etag, **cached["headers"]})
+
+    stmt = select(Contact).where(Contact.owner_id == current_user.id)
+    if name:
+        stmt = stmt.where(or_(
+            Contact.first_name.istartswith(name, autoescape=True),
+            Contact.last_name.istartswith(name, autoescape=True),
+        ))
+    if email_domain:
+        stmt = stmt.where(Contact.email.iendswith("@" + email_domain.lstrip("@"), autoescape=True))
+    if birthday_from:
+        stmt = stmt.where(Contact.birthday >= birthday_from)
+    if birthday_to:
+        stmt = stmt.where(Contact.birthday <= birthday_to)
+
+    contacts = (await db.execute(paginate(stmt, sort, order, cursor, limit))).scalars().all()
+    headers = {}
+    next_page = next_cursor(contacts, sort, order, limit)
+    if next_page:
+        headers["X-Next-Cursor"] = next_page
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_page)}>; rel="next"'
+    body = contact_list_adapter.dump_json(contact_list_adapter.validate_python(contacts[:limit])).decode()
+    await contact_cache.set(current_user.id, version, resource, body, headers)
+    return json_response(body, {"ETag": etag, **headers})
+
+
+@app.get("/contacts/export")
+async def export_contacts(format: Literal["ndjson", "csv", "vcard"] = "ndjson",
+                          current_user: UserResponse = Depends(get_current_user)):
+    """
+    Export all contacts of the current user as a stream.
+
+    Rows are fetched through a server-side cursor in chunks of ``EXPORT_CHUNK_SIZE``
+    and encoded as they arrive, so memory use does not depend on the number of
+    contacts. The stream uses its own session because request-scoped dependencies
+    are closed before a streaming body is sent.
+
+    Args:
+        format (str): "ndjson", "csv" or "vcard".
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        StreamingResponse: The encoded contacts, ordered by ID.
+    """
+    owner_id = current_user.id
+
+    async def stream():
+        header = export_header(format)
+        if header:
+            yield header
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(Contact)
+                .where(Contact.owner_id == owner_id)
+                .order_by(Contact.id)
+                .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+            )
+            async for contacts in result.scalars().partitions():
+                yield encode_contacts(contacts, format)
+
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="contacts.{EXPORT_EXTENSIONS[format]}"'},
+    )
+
+
+@app.get("/contacts/changes", response_model=ContactChangesResponse)
+async def read_contact_changes(since: int = Query(0, ge=0),
+                               limit: int = Query(DEFAULT_CHANGES_LIMIT, ge=1, le=MAX_CHANGES_LIMIT),
+                               db: AsyncSession = Depends(get_async_db),
+                               current_user: UserResponse = Depends(get_current_user)):
+    """
+    Get the current user's contacts created, updated or deleted after a cursor.
+
+    Every write to a contact takes the next number of the user's change sequence;
+    deletions leave a tombstone with their number. A client stores the returned
+    ``cursor`` and passes it as ``since`` on the next sync, repeating while
+    ``has_more`` is true. ``since=0`` returns the full address book.
+
+    Args:
+        since (int): Cursor returned by the previous sync, 0 for a full sync.
+        limit (int): Maximum number of changes to return.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
     Returns:
-        List[ContactResponse]: List of user's contacts.
+        ContactChangesResponse: Changed contacts, deleted contact IDs and the next cursor.
+    """
+    upserted, deleted, cursor, has_more = await load_changes(db, current_user.id, since, limit)
+    return {"upserted": upserted, "deleted": deleted, "cursor": cursor, "has_more": has_more}
+
+
+@app.get("/contacts/search", response_model=List[ContactResponse])
+async def search_contacts(q: str = Query(..., min_length=1, max_length=100),
+                          limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+                          db: AsyncSession = Depends(get_async_db),
+                          current_user: UserResponse = Depends(get_current_user)):
+    """
+    Search the current user's contacts by name, email and phone.
+
+    Every whitespace-separated term must match the start of a word (SQLite full-text
+    index) or a substring (PostgreSQL trigram index). Results are ranked, best first.
+
+    Args:
+        q (str): The search query.
+        limit (int): Maximum number of results.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        List[ContactResponse]: Matching contacts.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    stmt = build_search(db.bind.dialect.name, current_user.id, terms, limit)
+    return (await db.execute(stmt)).scalars().all()
+
+
+@app.get("/contacts/birthdays", response_model=List[ContactResponse])
+async def upcoming_birthdays(days: int = Query(7, ge=0, le=365),
+                             limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                             db: AsyncSession = Depends(get_async_db),
+                             current_user: UserResponse = Depends(get_current_user)):
     """
-    return db.query(Contact).filter(Contact.owner_id == current_user.id).all()
+    Get the current user's contacts whose birthday is within the next ``days`` days.
+
+    The range is evaluated on the indexed ``birthday_doy`` column. Both ends are
+    converted from real dates, so the window keeps its length in years without a
+    February 29. A range that runs past the end of the year is split into two
+    ranges in SQL.
+
+    Args:
+        days (int): Size of the window in days; 0 means today only.
+        limit (int): Maximum number of contacts to return.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        List[ContactResponse]: Contacts ordered by upcoming birthday, soonest first.
+    """
+    today = date.today()
+    start = birthday_day_of_year(today)
+    end = birthday_day_of_year(today + timedelta(days=days))
+    stmt = select(Contact).where(Contact.owner_id == current_user.id)
+    if start <= end and days < 365:
+        stmt = stmt.where(Contact.birthday_doy.between(start, end)).order_by(Contact.birthday_doy, Contact.id)
+    else:
+        # The window wraps past December 31; one of a year or more matches every day.
+        stmt = stmt.where(or_(Contact.birthday_doy >= start, Contact.birthday_doy <= end)).order_by(
+            case((Contact.birthday_doy >= start, Contact.birthday_doy - start), else_=Contact.birthday_doy + 366 - start),
+            Contact.id,
+        )
+    return (await db.execute(stmt.limit(limit))).scalars().all()
+
+
+@app.get("/contacts/batch", response_model=ContactBatchResponse)
+async def read_contacts_batch(ids: List[int] = Query(..., min_length=1, max_length=MAX_BATCH_SIZE),
+                              db: AsyncSession = Depends(get_async_db),
+                              current_user: UserResponse = Depends(get_current_user)):
+    """
+    Get many of the current user's contacts by ID with one query.
+
+    Args:
+        ids (List[int]): IDs of the contacts, as repeated ``ids`` query parameters.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        ContactBatchResponse: The found contacts and the IDs that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    contacts = (await db.execute(
+        select(Contact).where(Contact.owner_id == current_user.id, Contact.id.in_(ids)).order_by(Contact.id)
+    )).scalars().all()
+    found = {contact.id for contact in contacts}
+    return {"contacts": contacts, "not_found": [contact_id for contact_id in ids if contact_id not in found]}
+
+
+@app.patch("/contacts/batch", response_model=ContactBatchResponse)
+async def update_contacts_batch(batch: ContactBatchUpdate, db: AsyncSession = Depends(get_async_db),
+                                current_user: UserResponse = Depends(get_current_user)):
+    """
+    Apply one partial update to many of the current user's contacts.
+
+    The contacts are updated by a single UPDATE scoped to the user, which returns
+    the updated rows where the database supports ``RETURNING``.
+
+    Args:
+        batch (ContactBatchUpdate): The contact IDs and the fields to set.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        ContactBatchResponse: The updated contacts and the IDs that were not found.
+
+    Raises:
+        HTTPException: If no fields are given.
+    """
+    values = batch.changes.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    ids = list(dict.fromkeys(batch.ids))
+    contacts = await update_contacts(db, current_user.id, ids, values)
+    await db.commit()
+
+    found = {contact.id for contact in contacts}
+    return {"contacts": contacts, "not_found": [contact_id for contact_id in ids if contact_id not in found]}
+
+
+@app.delete("/contacts/batch", response_model=ContactBatchDeleteResponse)
+async def delete_contacts_batch(ids: List[int] = Query(..., min_length=1, max_length=MAX_BATCH_SIZE),
+                                db: AsyncSession = Depends(get_async_db),
+                                current_user: UserResponse = Depends(get_current_user)):
+    """
+    Delete many of the current user's contacts by ID.
+
+    The contacts are removed by a single DELETE scoped to the user, which returns
+    the deleted IDs where the database supports ``RETURNING``. Every deleted
+    contact leaves a tombstone for the change feed.
+
+    Args:
+        ids (List[int]): IDs of the contacts, as repeated ``ids`` query parameters.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        ContactBatchDeleteResponse: The deleted IDs and the IDs that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    deleted = [contact.id for contact in await delete_contacts(db, current_user.id, ids)]
+    await db.commit()
+
+    found = set(deleted)
+    return {"deleted": deleted, "not_found": [contact_id for contact_id in ids if contact_id not in found]}
 
 
 @app.get("/contacts/{contact_id}", response_model=ContactResponse)
-def read_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def read_contact(contact_id: int, request: Request, db: AsyncSession = Depends(get_async_db),
+                       current_user: UserResponse = Depends(get_current_user)):
     """
     Get a specific contact by ID.
+
+    Cached and revalidated with ETags like :func:`read_contacts`, including its
+    one version query before a 304.
     
     Args:
         contact_id (int): The contact's ID.
-        db (Session): The database session.
-        current_user (User): The authenticated user.
+        request (Request): The incoming request, used for ``If-None-Match``.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
         ContactResponse: The requested contact.
@@ -291,23 +658,34 @@ def read_contact(contact_id: int, db: Session = Depends(get_db), current_user: U
     Raises:
         HTTPException: If the contact is not found.
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
+    version = await ContactCache.version(db, current_user.id)
+    resource = f"item.{contact_id}"
+    etag = ContactCache.etag(current_user.id, version, resource)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = await contact_cache.get(current_user.id, version, resource)
+    if cached:
+        return json_response(cached["body"], {"ETag": etag})
+
+    contact = await get_owned_contact(db, contact_id, current_user.id)
     if contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
-    return contact
+    body = ContactResponse.model_validate(contact).model_dump_json()
+    await contact_cache.set(current_user.id, version, resource, body)
+    return json_response(body, {"ETag": etag})
 
 
 @app.put("/contacts/{contact_id}", response_model=ContactResponse)
-def update_contact(contact_id: int, contact_data: ContactCreate, db: Session = Depends(get_db),
-                   current_user: User = Depends(get_current_user)):
+async def update_contact(contact_id: int, contact_data: ContactCreate, db: AsyncSession = Depends(get_async_db),
+                         current_user: UserResponse = Depends(get_current_user)):
     """
     Update a contact by ID.
     
     Args:
         contact_id (int): The contact's ID.
         contact_data (ContactCreate): The updated contact data.
-        db (Session): The database session.
-        current_user (User): The authenticated user.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
         ContactResponse: The updated contact.
@@ -315,25 +693,23 @@ def update_contact(contact_id: int, contact_data: ContactCreate, db: Session = D
     Raises:
         HTTPException: If the contact is not found.
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
-    if contact is None:
+    contacts = await update_contacts(db, current_user.id, [contact_id], contact_data.model_dump())
+    if not contacts:
         raise HTTPException(status_code=404, detail="Contact not found")
-    for key, value in contact_data.dict().items():
-        setattr(contact, key, value)
-    db.commit()
-    db.refresh(contact)
-    return contact
+    await db.commit()
+    return contacts[0]
 
 
 @app.delete("/contacts/{contact_id}", response_model=ContactResponse)
-def delete_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_contact(contact_id: int, db: AsyncSession = Depends(get_async_db),
+                         current_user: UserResponse = Depends(get_current_user)):
     """
     Delete a contact by ID.
     
     Args:
         contact_id (int): The contact's ID.
-        db (Session): The database session.
-        current_user (User): The authenticated user.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
         ContactResponse: The deleted contact.
@@ -341,55 +717,36 @@ def delete_contact(contact_id: int, db: Session = Depends(get_db), current_user:
     Raises:
         HTTPException: If the contact is not found.
     """
-    contact = db.query(Contact).filter(Contact.id == contact_id, Contact.owner_id == current_user.id).first()
-    if contact is None:
+    contacts = await delete_contacts(db, current_user.id, [contact_id])
+    if not contacts:
         raise HTTPException(status_code=404, detail="Contact not found")
-    db.delete(contact)
-    db.commit()
-    return contact
-
+    await db.commit()
+    return contacts[0]
 
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_middleware(SlowAPIMiddleware)
 
-@app.get("/me/")
-@limiter.limit("5/minute")
-async def read_users_me(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@app.get("/me/", response_model=UserResponse)
+async def read_users_me(current_user: UserResponse = Depends(get_current_user)):
     """
     Get the current user's information.
     
     Args:
-        request (Request): The FastAPI request object.
-        token (str): The JWT token.
-        db (Session): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
-        User: The current user's information.
-    
-    Raises:
-        HTTPException: If the token is invalid or the user is not found.
+        UserResponse: The current user's information.
     """
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
-        user = get_user(db, email)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    return current_user
 
 
-def get_current_admin(current_user: User = Security(get_current_user)):
+def get_current_admin(current_user: UserResponse = Security(get_current_user)):
     """
     Dependency to get the current user and verify they are an admin.
     
     Args:
-        current_user (User): The current authenticated user.
+        current_user (UserResponse): The current authenticated user.
     
     Returns:
-        User: The current admin user.
+        UserResponse: The current admin user.
     
     Raises:
         HTTPException: If the user is not an admin.
@@ -398,16 +755,140 @@ def get_current_admin(current_user: User = Security(get_current_user)):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
 
+
+@app.get("/internal/db-pool")
+async def read_db_pool(current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Get live statistics of the database connection pools (admin only).
+
+    Args:
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        dict: :func:`database.pool_status` of the asyncio pool used by requests and
+        of the synchronous pool.
+    """
+    return {"async": pool_status(async_engine.pool), "sync": pool_status(engine.pool)}
+
+
+@app.get("/internal/redis")
+async def read_redis_status(current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Get the Redis circuit breaker state and command latency (admin only).
+
+    Args:
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        dict: :meth:`redis_store.RedisStore.status`.
+    """
+    return redis_store.status()
+
+
+@app.post("/internal/profiles/token")
+async def create_profile_token(minutes: int = Query(15, ge=1, le=240),
+                               current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Issue a token that gets requests profiled (admin only).
+
+    Requests sending the token in the ``X-Profile-Token`` header run under
+    cProfile, and their response names the stored profile in ``X-Profile-Id``.
+
+    Args:
+        minutes (int): Lifetime of the token.
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        dict: The token, the header to send it in and its expiry.
+    """
+    return request_profiler.issue_token(current_user.email, minutes)
+
+
+@app.get("/internal/profiles")
+async def list_profiles(current_user: UserResponse = Depends(get_current_admin)):
+    """
+    List the stored request profiles, newest first (admin only).
+
+    Args:
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        list: Descriptions of the profiles.
+    """
+    descriptions = [request_profiler.describe(profile_id) for profile_id in reversed(request_profiler.list_ids())]
+    return [description for description in descriptions if description is not None]
+
+
+@app.get("/internal/profiles/{profile_id}", response_class=PlainTextResponse)
+async def read_profile(profile_id: str,
+                       sort: Literal["cumulative", "tottime", "calls"] = "cumulative",
+                       limit: int = Query(40, ge=1, le=500),
+                       current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Get a stored request profile as a pstats text report (admin only).
+
+    Args:
+        profile_id (str): The profile ID.
+        sort (str): Sort key of the report.
+        limit (int): Number of functions listed.
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        str: The report.
+
+    Raises:
+        HTTPException: If the profile does not exist.
+    """
+    report = await run_in_threadpool(request_profiler.report, profile_id, sort, limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+
+@app.get("/internal/profiles/{profile_id}/pstats")
+async def download_profile(profile_id: str, current_user: UserResponse = Depends(get_current_admin)):
+    """
+    Download a stored request profile for ``pstats`` or snakeviz (admin only).
+
+    Args:
+        profile_id (str): The profile ID.
+        current_user (UserResponse): The authenticated admin.
+
+    Returns:
+        FileResponse: The pstats file.
+
+    Raises:
+        HTTPException: If the profile does not exist.
+    """
+    path = request_profiler.pstats_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Expose request, database, cache, hashing, SMTP and Cloudinary metrics to Prometheus.
+
+    Returns:
+        Response: The metrics in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/register/")
-def register_user(email: EmailStr, password: str, is_admin: bool = False, db: Session = Depends(get_db)):
+async def register_user(email: EmailStr, password: str, background_tasks: BackgroundTasks, is_admin: bool = False,
+                        db: AsyncSession = Depends(get_async_db)):
     """
     Register a new user.
     
     Args:
         email (EmailStr): The user's email.
         password (str): The user's password.
+        background_tasks (BackgroundTasks): Used to deliver the verification email after responding.
         is_admin (bool): Whether to create an admin user.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
     
     Returns:
         dict: A message indicating successful registration.
@@ -415,11 +896,7 @@ def register_user(email: EmailStr, password: str, is_admin: bool = False, db: Se
     Raises:
         HTTPException: If a user with the given email already exists.
     """
-    db_user = db.query(User).filter(User.email == email).first()
-    if db_user:
-        raise HTTPException(status_code=409, detail="User already exists")
-    
-    hashed_password = get_password_hash(password)
+    hashed_password = await password_hasher.hash(password)
     user = User(
         email=email,
         hashed_password=hashed_password,
@@ -427,23 +904,27 @@ def register_user(email: EmailStr, password: str, is_admin: bool = False, db: Se
         role=UserRole.ADMIN if is_admin else UserRole.USER
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    
     verification_token = create_access_token({"sub": email})
-    send_verification_email(email, verification_token)
+    queue_verification_email(db, email, verification_token)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # The unique index on users.email decides; no existence check is needed.
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="User already exists")
+    background_tasks.add_task(outbox_worker.drain)
     
     return {"message": "User registered successfully. Please check your email to verify your account."}
 
 
 @app.get("/verify/{token}")
-def verify_email(token: str, db: Session = Depends(get_db)):
+async def verify_email(token: str, db: AsyncSession = Depends(get_async_db)):
     """
     Verify a user's email address.
     
     Args:
         token (str): The verification token.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
     
     Returns:
         dict: A message indicating successful verification.
@@ -454,134 +935,127 @@ def verify_email(token: str, db: Session = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
+        result = await db.execute(update(User).where(User.email == email).values(is_verified=True))
+        if not result.rowcount:
             raise HTTPException(status_code=400, detail="Invalid token")
-        user.is_verified = True
-        db.commit()
+        await db.commit()
+        await principal_cache.invalidate(email)
         return {"message": "Email verified successfully"}
     except JWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
 
 
-@app.put("/users/avatar/")
-def update_avatar(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@app.put("/users/avatar/", status_code=202, response_model=AvatarJobResponse)
+async def update_avatar(response: Response, background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                        db: AsyncSession = Depends(get_async_db),
+                        current_user: UserResponse = Depends(get_current_user)):
     """
     Update the current user's avatar.
     Only admin users can change their avatar.
+
+    The upload is spooled (up to ``MAX_AVATAR_BYTES``) and processed in the
+    background; poll the URL in the ``Location`` header for the result.
     
     Args:
+        response (Response): The outgoing response, used to set the ``Location`` header.
+        background_tasks (BackgroundTasks): Runs the avatar pipeline after responding.
         file (UploadFile): The avatar image file.
-        db (Session): The database session.
-        current_user (User): The authenticated user.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
     
     Returns:
-        dict: A message indicating successful update and the new avatar URL.
+        AvatarJobResponse: The pending avatar job.
     
     Raises:
-        HTTPException: If there's an error uploading the avatar or if the user doesn't have permission.
+        HTTPException: If the file is too large or if the user doesn't have permission.
     """
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Only admin users can change their avatar")
-    
-    try:
-        upload_result = cloudinary.uploader.upload(file.file)
-        current_user.avatar_url = upload_result["secure_url"]
-        db.commit()
-        db.refresh(current_user)
-        
-        # Update user in Redis cache
-        user_dict = {
-            "id": current_user.id,
-            "email": current_user.email,
-            "hashed_password": current_user.hashed_password,
-            "is_verified": current_user.is_verified,
-            "role": current_user.role.value,
-            "avatar_url": current_user.avatar_url
-        }
-        redis_client.setex(
-            f"user:{current_user.email}",
-            timedelta(minutes=30),
-            json.dumps(user_dict)
-        )
-        
-        return {"message": "Avatar updated successfully", "avatar_url": current_user.avatar_url}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error uploading avatar: {str(e)}")
+
+    source = await spool_upload(file)
+    job = AvatarJob(user_id=current_user.id, status="pending")
+    db.add(job)
+    await db.flush()
+    # Stored before the job is committed, so every pending job has its upload.
+    await avatar_pipeline.store_upload(job.id, source)
+    await db.commit()
+    background_tasks.add_task(avatar_pipeline.process, job.id)
+    response.headers["Location"] = f"/users/avatar/jobs/{job.id}"
+    return job
+
+
+@app.get("/users/avatar/jobs/{job_id}", response_model=AvatarJobResponse)
+async def read_avatar_job(job_id: int, db: AsyncSession = Depends(get_async_db),
+                          current_user: UserResponse = Depends(get_current_user)):
+    """
+    Get the status of one of the current user's avatar jobs.
+
+    Args:
+        job_id (int): The job's ID.
+        db (AsyncSession): The database session.
+        current_user (UserResponse): The authenticated user.
+
+    Returns:
+        AvatarJobResponse: The job's status and, once done, the variant URLs.
+
+    Raises:
+        HTTPException: If the job is not found.
+    """
+    result = await db.execute(select(AvatarJob).where(AvatarJob.id == job_id, AvatarJob.user_id == current_user.id))
+    job = result.scalars().first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Avatar job not found")
+    return job
 
 
 @app.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_async_db)):
     """
     Authenticate a user and return an access token.
-    Also caches the user in Redis upon successful login.
+    Also warms the principal cache upon successful login.
+
+    Accounts and client IPs with too many recent failures are rejected before
+    the password is verified.
     
     Args:
+        request (Request): The FastAPI request object.
         form_data (OAuth2PasswordRequestForm): The login form data.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
     
     Returns:
         dict: The access token and token type.
     
     Raises:
-        HTTPException: If the credentials are invalid or the email is not verified.
+        HTTPException: If the credentials are invalid, the email is not verified,
+            or the account or IP is locked out.
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    ip = request.client.host if request.client else None
+    await login_guard.check(form_data.username, ip)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     
     if not user:
+        await login_guard.record_failure(form_data.username, ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    await login_guard.record_success(form_data.username)
     
     if not user.is_verified:
         raise HTTPException(status_code=401, detail="Email not verified")
 
-    # Cache user in Redis
-    user_dict = {
-        "id": user.id,
-        "email": user.email,
-        "hashed_password": user.hashed_password,
-        "is_verified": user.is_verified
-    }
-    redis_client.setex(
-        f"user:{user.email}",
-        timedelta(minutes=30),
-        json.dumps(user_dict)
-    )
+    await principal_cache.put(UserResponse.model_validate(user))
 
     access_token = create_access_token({"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
-def send_password_reset_email(email: str, token: str):
-    """
-    Send a password reset email to the user.
-    
-    Args:
-        email (str): The recipient's email address.
-        token (str): The password reset token.
-    """
-    smtp_server = os.getenv("SMTP_SERVER")
-    smtp_port = int(os.getenv("SMTP_PORT"))
-    smtp_email = os.getenv("SMTP_EMAIL")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-
-    msg = EmailMessage()
-    msg["Subject"] = "Reset your password"
-    msg["From"] = smtp_email
-    msg["To"] = email
-    msg.set_content(f"Click the link to reset your password: http://127.0.0.1:8000/reset-password/{token}")
-
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()
-        server.login(smtp_email, smtp_password)
-        server.send_message(msg)
-
 @app.post("/forgot-password/")
-def forgot_password(email: EmailStr, db: Session = Depends(get_db)):
+async def forgot_password(email: EmailStr, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
     """
     Initiate the password reset process.
     
     Args:
         email (EmailStr): The user's email address.
-        db (Session): The database session.
+        background_tasks (BackgroundTasks): Used to deliver the reset email after responding.
+        db (AsyncSession): The database session.
     
     Returns:
         dict: A message indicating that the reset email was sent.
@@ -589,7 +1063,7 @@ def forgot_password(email: EmailStr, db: Session = Depends(get_db)):
     Raises:
         HTTPException: If the user is not found.
     """
-    user = get_user(db, email)
+    user = await get_user(db, email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -599,20 +1073,22 @@ def forgot_password(email: EmailStr, db: Session = Depends(get_db)):
         expires_delta=timedelta(minutes=15)
     )
     
-    # Send the reset email
-    send_password_reset_email(email, reset_token)
+    # Queue the reset email
+    queue_password_reset_email(db, email, reset_token)
+    await db.commit()
+    background_tasks.add_task(outbox_worker.drain)
     
     return {"message": "Password reset email sent. Please check your email."}
 
 @app.post("/reset-password/{token}")
-def reset_password(token: str, new_password: str, db: Session = Depends(get_db)):
+async def reset_password(token: str, new_password: str, db: AsyncSession = Depends(get_async_db)):
     """
     Reset a user's password using a reset token.
     
     Args:
         token (str): The password reset token.
         new_password (str): The new password.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
     
     Returns:
         dict: A message indicating successful password reset.
@@ -628,26 +1104,14 @@ def reset_password(token: str, new_password: str, db: Session = Depends(get_db))
         if token_type != "password_reset":
             raise HTTPException(status_code=400, detail="Invalid token type")
         
-        user = get_user(db, email)
-        if not user:
+        # Hashing before the lookup keeps the UPDATE the only statement.
+        hashed_password = await password_hasher.hash(new_password)
+        result = await db.execute(update(User).where(User.email == email).values(hashed_password=hashed_password))
+        if not result.rowcount:
             raise HTTPException(status_code=404, detail="User not found")
+        await db.commit()
         
-        # Update the password
-        user.hashed_password = get_password_hash(new_password)
-        db.commit()
-        
-        # Update user in Redis cache
-        user_dict = {
-            "id": user.id,
-            "email": user.email,
-            "hashed_password": user.hashed_password,
-            "is_verified": user.is_verified
-        }
-        redis_client.setex(
-            f"user:{email}",
-            timedelta(minutes=30),
-            json.dumps(user_dict)
-        )
+        await principal_cache.invalidate(email)
         
         return {"message": "Password has been reset successfully"}
     except JWTError:
@@ -0,0 +1,323 @@
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Set to a writable directory when running several worker processes, so that
+# /metrics aggregates the samples of all of them.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# Statements slower than this are logged with their route.
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", 100))
+# A request running the same statement this many times is logged as a suspected N+1.
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+# Debug mode adds a Server-Timing header with the SQL and total time to every response.
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
+registry = CollectorRegistry()
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route.",
+    ["method", "route"], registry=registry,
+)
+REQUESTS = Counter(
+    "http_requests", "Responses by route and status code.",
+    ["method", "route", "status"], registry=registry,
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.",
+    ["method", "route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100), registry=registry,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.",
+    ["method", "route"], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5), registry=registry,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Latency of single SQL statements.",
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1), registry=registry,
+)
+PRINCIPAL_CACHE = Counter(
+    "principal_cache_lookups", "Authenticated user lookups by the tier that answered.",
+    ["result"], registry=registry,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "Bcrypt operations, including the wait for a pool worker.",
+    ["operation"], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5), registry=registry,
+)
+SMTP_SEND_SECONDS = Histogram(
+    "smtp_send_duration_seconds", "Time to hand one message to the SMTP server.",
+    registry=registry,
+)
+CLOUDINARY_UPLOAD_SECONDS = Histogram(
+    "cloudinary_upload_duration_seconds", "Time to upload one avatar variant to Cloudinary.",
+    registry=registry,
+)
+
+# Children of the fixed label sets, resolved once at import.
+PRINCIPAL_CACHE_LOCAL = PRINCIPAL_CACHE.labels("local")
+PRINCIPAL_CACHE_REDIS = PRINCIPAL_CACHE.labels("redis")
+PRINCIPAL_CACHE_MISS = PRINCIPAL_CACHE.labels("miss")
+PASSWORD_HASH = PASSWORD_HASH_SECONDS.labels("hash")
+PASSWORD_VERIFY = PASSWORD_HASH_SECONDS.labels("verify")
+
+# Requests not matched by any route share one label, so scanners cannot
+# create a series per probed URL.
+UNMATCHED_ROUTE = "unmatched"
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"\?|%\(\w+\)s|%s|\$\d+|(?<![:\w]):(?!:)\w+")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(statement: str) -> str:
+    """
+    Reduce a statement to its shape, so executions differing only in values compare equal.
+
+    Literals and bind parameters become ``?``, parameter lists of any length
+    become ``(?)`` and whitespace is collapsed.
+
+    Args:
+        statement (str): SQL as sent to the driver.
+
+    Returns:
+        str: The normalized statement.
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PARAMETER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(?)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class RequestStats:
+    """
+    Database work done while serving one request.
+
+    Attributes:
+        scope (Optional[dict]): ASGI scope of the request; the router adds the matched route.
+        queries (int): SQL statements executed.
+        db_seconds (float): Time spent executing them.
+        statements (Dict[str, int]): Executions by normalized statement.
+    """
+    __slots__ = ("scope", "queries", "db_seconds", "statements")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Dict[str, int] = {}
+
+    @property
+    def route(self) -> str:
+        """str: Path template of the matched route, or "unmatched"."""
+        route = self.scope.get("route") if self.scope is not None else None
+        return route.path if route is not None else UNMATCHED_ROUTE
+
+    def repeated_statements(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """
+        Get the statements executed at least ``threshold`` times, typically a
+        query per row of an earlier result.
+
+        Args:
+            threshold (int): Minimum number of executions.
+
+        Returns:
+            Dict[str, int]: Executions by normalized statement.
+        """
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """
+    Get the statistics of the request being served.
+
+    Returns:
+        Optional[RequestStats]: The statistics, or None outside a request.
+    """
+    return _request_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        normalized = normalize_sql(statement)
+        stats.statements[normalized] = stats.statements.get(normalized, 0) + 1
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000,
+                       stats.route if stats is not None else "-", normalize_sql(statement))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Time every statement of an engine and count it against the current request.
+
+    Args:
+        engine (Engine): A sync engine, or ``AsyncEngine.sync_engine``.
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class _RouteMetrics:
+    __slots__ = ("latency", "db_queries", "db_seconds", "statuses", "method", "route")
+
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.latency = REQUEST_SECONDS.labels(method, route)
+        self.db_queries = REQUEST_DB_QUERIES.labels(method, route)
+        self.db_seconds = REQUEST_DB_SECONDS.labels(method, route)
+        self.statuses = {}
+
+    def status(self, code: int):
+        counter = self.statuses.get(code)
+        if counter is None:
+            counter = self.statuses[code] = REQUESTS.labels(self.method, self.route, str(code))
+        return counter
+
+
+class HttpMetrics:
+    """
+    Latency, status and database work per route.
+
+    Series are labelled with the route's path template, not the URL. The label
+    children of every route are created by :meth:`prepare` at startup, so
+    recording a request only looks them up.
+    """
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], _RouteMetrics] = {}
+
+    def prepare(self, routes: Iterable) -> None:
+        """
+        Create the label children of the given routes.
+
+        Args:
+            routes (Iterable): The application's routes.
+        """
+        for route in routes:
+            for method in getattr(route, "methods", None) or ():
+                self._route_metrics(method, route.path)
+
+    def _route_metrics(self, method: str, route: str) -> _RouteMetrics:
+        metrics = self._routes.get((method, route))
+        if metrics is None:
+            metrics = self._routes[(method, route)] = _RouteMetrics(method, route)
+        return metrics
+
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        """
+        Record one served request.
+
+        Args:
+            method (str): HTTP method.
+            route (str): Path template of the matched route.
+            status (int): Response status code.
+            seconds (float): Time taken to serve the request.
+            stats (RequestStats): Database work done for it.
+        """
+        metrics = self._route_metrics(method, route)
+        metrics.latency.observe(seconds)
+        metrics.db_queries.observe(stats.queries)
+        metrics.db_seconds.observe(stats.db_seconds)
+        metrics.status(status).inc()
+
+
+http_metrics = HttpMetrics()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request and recording it in ``http_metrics``.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        metrics (HttpMetrics): Where requests are recorded.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = RequestStats(scope)
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if DEBUG:
+                    message["headers"] = [*message.get("headers", ()),
+                                          (b"server-timing", server_timing(stats, time.perf_counter() - start))]
+            await send(message)
+
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            route = stats.route
+            self.metrics.observe(scope["method"], route, status, elapsed, stats)
+            for statement, count in stats.repeated_statements().items():
+                logger.warning("Suspected N+1 on %s %s: %s executions of %s", scope["method"], route, count, statement)
+
+
+def server_timing(stats: RequestStats, seconds: float) -> bytes:
+    """
+    Build a ``Server-Timing`` header value.
+
+    Args:
+        stats (RequestStats): Database work of the request so far.
+        seconds (float): Time since the request started.
+
+    Returns:
+        bytes: SQL time with the statement count, and the total time, in milliseconds.
+    """
+    return (f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+            f'total;dur={seconds * 1000:.2f}').encode()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple[bytes, str]: The body and its content type.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return generate_latest(collected), CONTENT_TYPE_LATEST
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,59 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from database import DATABASE_URL, Base
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+url = config.get_main_option("sqlalchemy.url") or DATABASE_URL
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Keep the SQLite full-text index tables, which are managed by raw DDL, out of autogenerate.
+    """
+    return not (type_ == "table" and name.startswith("contacts_fts"))
+
+
+def run_migrations_offline():
+    """
+    Emit the migration SQL to stdout instead of running it (``alembic upgrade head --sql``).
+    """
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Run the migrations against the configured database.
+    """
+    connectable = engine_from_config({"sqlalchemy.url": url}, prefix="sqlalchemy.", poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
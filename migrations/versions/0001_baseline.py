@@ -0,0 +1,64 @@
+"""Baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-03-20 00:00:00
+
+The schema the app created with ``create_all`` before it used migrations.
+Databases created that way already have these tables; they are adopted as
+they are, so ``alembic upgrade head`` brings them up to date directly.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables():
+    if op.get_context().as_sql:
+        return set()
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    existing = _existing_tables()
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("is_verified", sa.Boolean(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+        op.create_index("ix_users_id", "users", ["id"])
+
+    if "contacts" not in existing:
+        op.create_table(
+            "contacts",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("first_name", sa.String(), nullable=True),
+            sa.Column("last_name", sa.String(), nullable=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("phone", sa.String(), nullable=True),
+            sa.Column("birthday", sa.DateTime(), nullable=True),
+            sa.Column("owner_id", sa.Integer(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_contacts_id", "contacts", ["id"])
+
+
+def downgrade():
+    op.drop_table("contacts")
+    op.drop_table("users")
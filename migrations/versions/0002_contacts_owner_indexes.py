@@ -0,0 +1,27 @@
+"""Owner-scoped composite indexes on contacts
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-03-20 00:10:00
+
+Every contact query filters on owner_id. These indexes match the keyset
+pagination orders (id, name, updated_at) so a page is an index range scan.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_contacts_owner_id_id", "contacts", ["owner_id", "id"])
+    op.create_index("ix_contacts_owner_id_last_name_first_name", "contacts", ["owner_id", "last_name", "first_name"])
+    op.create_index("ix_contacts_owner_id_updated_at", "contacts", ["owner_id", "updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_contacts_owner_id_updated_at", table_name="contacts")
+    op.drop_index("ix_contacts_owner_id_last_name_first_name", table_name="contacts")
+    op.drop_index("ix_contacts_owner_id_id", table_name="contacts")
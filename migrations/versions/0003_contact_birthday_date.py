@@ -0,0 +1,44 @@
+"""Store contact birthdays as dates and add additional_info
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-03-20 00:20:00
+
+Birthdays were DateTime columns holding midnight. On SQLite, where a batch
+type change would CAST the text to a number, the date part is copied into a
+new column that then replaces the old one.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_context().dialect.name == "sqlite":
+        op.add_column("contacts", sa.Column("birthday_date", sa.Date(), nullable=True))
+        op.execute("UPDATE contacts SET birthday_date = date(birthday)")
+        with op.batch_alter_table("contacts") as batch:
+            batch.drop_column("birthday")
+            batch.alter_column("birthday_date", new_column_name="birthday")
+    else:
+        op.alter_column("contacts", "birthday", type_=sa.Date(), existing_nullable=True,
+                        postgresql_using="birthday::date")
+    op.add_column("contacts", sa.Column("additional_info", sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("contacts") as batch:
+        batch.drop_column("additional_info")
+    if op.get_context().dialect.name == "sqlite":
+        op.add_column("contacts", sa.Column("birthday_datetime", sa.DateTime(), nullable=True))
+        op.execute("UPDATE contacts SET birthday_datetime = datetime(birthday)")
+        with op.batch_alter_table("contacts") as batch:
+            batch.drop_column("birthday")
+            batch.alter_column("birthday_datetime", new_column_name="birthday")
+    else:
+        op.alter_column("contacts", "birthday", type_=sa.DateTime(), existing_nullable=True,
+                        postgresql_using="birthday::timestamp")
@@ -0,0 +1,37 @@
+"""Index contacts by the day of year of their birthday
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-03-20 00:30:00
+
+birthday_doy is the day of year on a leap-year calendar, see
+``models.birthday_day_of_year``; existing contacts are backfilled.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# Days before the first of each month in a leap year.
+DAYS_BEFORE_MONTH = {1: 0, 2: 31, 3: 60, 4: 91, 5: 121, 6: 152, 7: 182, 8: 213, 9: 244, 10: 274, 11: 305, 12: 335}
+
+
+def upgrade():
+    op.add_column("contacts", sa.Column("birthday_doy", sa.Integer(), nullable=True))
+    contacts = sa.table("contacts", sa.column("birthday", sa.Date()), sa.column("birthday_doy", sa.Integer()))
+    month = sa.extract("month", contacts.c.birthday)
+    op.execute(
+        contacts.update()
+        .where(contacts.c.birthday.is_not(None))
+        .values(birthday_doy=sa.case(DAYS_BEFORE_MONTH, value=month) + sa.extract("day", contacts.c.birthday))
+    )
+    op.create_index("ix_contacts_owner_id_birthday_doy", "contacts", ["owner_id", "birthday_doy"])
+
+
+def downgrade():
+    op.drop_index("ix_contacts_owner_id_birthday_doy", table_name="contacts")
+    with op.batch_alter_table("contacts") as batch:
+        batch.drop_column("birthday_doy")
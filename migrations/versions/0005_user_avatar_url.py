@@ -0,0 +1,22 @@
+"""Add the avatar URL to users
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-03-20 00:40:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("avatar_url", sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("avatar_url")
@@ -0,0 +1,34 @@
+"""Add background avatar jobs
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-03-20 01:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "avatar_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("thumbnail_url", sa.String(), nullable=True),
+        sa.Column("medium_url", sa.String(), nullable=True),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_avatar_jobs_user_id", "avatar_jobs", ["user_id"])
+
+
+def downgrade():
+    op.drop_table("avatar_jobs")
@@ -0,0 +1,62 @@
+"""Add change sequence numbers and tombstones for delta sync
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-03-20 01:10:00
+
+Existing contacts are numbered in ID order within their owner, and every
+user's change_seq is set to their highest number, so a client syncing from
+0 receives all of them. Every contact has a number from then on.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("users", sa.Column("change_seq", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("contacts", sa.Column("change_seq", sa.Integer(), nullable=True))
+
+    users = sa.table("users", sa.column("id", sa.Integer()), sa.column("change_seq", sa.Integer()))
+    contacts = sa.table("contacts", sa.column("id", sa.Integer()), sa.column("owner_id", sa.Integer()),
+                        sa.column("change_seq", sa.Integer()))
+    # One pass numbering every owner's contacts, instead of a count per row.
+    numbered = sa.select(
+        contacts.c.id,
+        sa.func.row_number().over(partition_by=contacts.c.owner_id, order_by=contacts.c.id).label("seq"),
+    ).subquery("numbered")
+    op.execute(contacts.update().where(contacts.c.id == numbered.c.id).values(change_seq=numbered.c.seq))
+    with op.batch_alter_table("contacts") as batch:
+        batch.alter_column("change_seq", existing_type=sa.Integer(), nullable=False)
+    latest = (
+        sa.select(contacts.c.owner_id, sa.func.max(contacts.c.change_seq).label("seq"))
+        .group_by(contacts.c.owner_id)
+        .subquery("latest")
+    )
+    op.execute(users.update().where(users.c.id == latest.c.owner_id).values(change_seq=latest.c.seq))
+    op.create_index("ix_contacts_owner_id_change_seq", "contacts", ["owner_id", "change_seq"])
+
+    op.create_table(
+        "contact_tombstones",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column("contact_id", sa.Integer(), nullable=False),
+        sa.Column("change_seq", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_contact_tombstones_owner_id_change_seq", "contact_tombstones", ["owner_id", "change_seq"])
+
+
+def downgrade():
+    op.drop_table("contact_tombstones")
+    op.drop_index("ix_contacts_owner_id_change_seq", table_name="contacts")
+    with op.batch_alter_table("contacts") as batch:
+        batch.drop_column("change_seq")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("change_seq")
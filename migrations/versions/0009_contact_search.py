@@ -0,0 +1,66 @@
+"""Full-text search index on contacts
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-03-20 01:20:00
+
+SQLite gets an external-content FTS5 table kept in sync by triggers and
+filled from the existing contacts; PostgreSQL gets a trigram index. This
+runs after the revisions that rebuild the contacts table on SQLite, which
+would drop the triggers.
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+SEARCH_DOCUMENT_SQL = (
+    "lower(coalesce(contacts.first_name, '') || ' ' || coalesce(contacts.last_name, '') || ' ' || "
+    "coalesce(contacts.email, '') || ' ' || coalesce(contacts.phone, ''))"
+)
+
+SQLITE_SEARCH = [
+    """CREATE VIRTUAL TABLE contacts_fts USING fts5(
+        first_name, last_name, email, phone,
+        content='contacts', content_rowid='id',
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER contacts_fts_au AFTER UPDATE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+]
+
+POSTGRESQL_SEARCH = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX ix_contacts_search_trgm ON contacts USING gin (({SEARCH_DOCUMENT_SQL}) gin_trgm_ops)",
+]
+
+
+def upgrade():
+    dialect = op.get_context().dialect.name
+    for statement in SQLITE_SEARCH if dialect == "sqlite" else POSTGRESQL_SEARCH if dialect == "postgresql" else []:
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_context().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("contacts_fts_au", "contacts_fts_ad", "contacts_fts_ai"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS contacts_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_contacts_search_trgm")
@@ -0,0 +1,58 @@
+"""Make the contact sort keys NOT NULL
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-03-20 01:30:00
+
+Keyset pagination compares the sort key of the last row with the next rows;
+a NULL in it makes the comparison NULL and ends the listing early. Missing
+names become empty strings and a missing updated_at becomes created_at.
+
+Rebuilding the table on SQLite drops its triggers, so the full-text search
+triggers of revision 0009 are created again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+SQLITE_SEARCH_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+]
+
+
+def _set_nullable(nullable: bool):
+    with op.batch_alter_table("contacts") as batch:
+        batch.alter_column("first_name", existing_type=sa.String(), nullable=nullable)
+        batch.alter_column("last_name", existing_type=sa.String(), nullable=nullable)
+        batch.alter_column("updated_at", existing_type=sa.DateTime(), nullable=nullable)
+    if op.get_context().dialect.name == "sqlite":
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    op.execute("UPDATE contacts SET first_name = '' WHERE first_name IS NULL")
+    op.execute("UPDATE contacts SET last_name = '' WHERE last_name IS NULL")
+    op.execute("UPDATE contacts SET updated_at = coalesce(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+    _set_nullable(False)
+
+
+def downgrade():
+    _set_nullable(True)
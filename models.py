@@ -1,12 +1,14 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Enum, DateTime
-from sqlalchemy.orm import relationship
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, Enum, DateTime, Date, Index
+from sqlalchemy.orm import relationship, validates
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator
+from typing import List, Optional
 import enum
-from datetime import datetime
+from datetime import datetime, date
 
 from database import Base
 
+MAX_BATCH_SIZE = 500
+
 
 class UserRole(str, enum.Enum):
     """
@@ -16,6 +18,24 @@ class UserRole(str, enum.Enum):
     ADMIN = "admin"
 
 
+def birthday_day_of_year(birthday: Optional[date]) -> Optional[int]:
+    """
+    Get the day of year of a birthday on a leap-year calendar.
+
+    Every month/day pair maps to the same number in every year, so February 29
+    is day 60 and March 1 is day 61 whether or not the current year is a leap year.
+
+    Args:
+        birthday (Optional[date]): The birthday.
+
+    Returns:
+        Optional[int]: Day of year between 1 and 366, or None if there is no birthday.
+    """
+    if birthday is None:
+        return None
+    return date(2000, birthday.month, birthday.day).timetuple().tm_yday
+
+
 class User(Base):
     """
     SQLAlchemy model for User entity.
@@ -27,6 +47,8 @@ class User(Base):
         is_active (bool): Whether the user is active
         is_verified (bool): Whether the user's email is verified
         role (str): User's role (user/admin)
+        avatar_url (str): URL of the user's avatar
+        change_seq (int): Sequence number of the latest change to the user's contacts
         contacts (relationship): Relationship to user's contacts
         created_at (datetime): User creation timestamp
         updated_at (datetime): User last update timestamp
@@ -39,7 +61,10 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     role = Column(String, default="user")
-    contacts = relationship("Contact", back_populates="owner")
+    avatar_url = Column(String, nullable=True)
+    change_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Never loaded implicitly: a lazy load per row would be an N+1 query.
+    contacts = relationship("Contact", back_populates="owner", lazy="raise_on_sql")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -54,7 +79,10 @@ class Contact(Base):
         last_name (str): Contact's last name
         email (str): Contact's email address
         phone (str): Contact's phone number
-        birthday (datetime): Contact's birthday
+        birthday (date): Contact's birthday
+        birthday_doy (int): Day of year of the birthday, see :func:`birthday_day_of_year`
+        additional_info (str): Free-form notes about the contact
+        change_seq (int): Owner's change sequence number of the latest write to the contact
         owner_id (int): Foreign key to User
         owner (relationship): Relationship to owner User
         created_at (datetime): Contact creation timestamp
@@ -63,13 +91,118 @@ class Contact(Base):
     __tablename__ = "contacts"
 
     id = Column(Integer, primary_key=True, index=True)
-    first_name = Column(String)
-    last_name = Column(String)
+    # Sort keys of keyset pagination are NOT NULL: a NULL in the cursor would
+    # make the next-page comparison NULL and end the listing early.
+    first_name = Column(String, nullable=False)
+    last_name = Column(String, nullable=False)
     email = Column(String)
     phone = Column(String)
-    birthday = Column(DateTime)
+    birthday = Column(Date)
+    birthday_doy = Column(Integer)
+    additional_info = Column(String, nullable=True)
+    change_seq = Column(Integer, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
-    owner = relationship("User", back_populates="contacts")
+    owner = relationship("User", back_populates="contacts", lazy="raise_on_sql")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_contacts_owner_id_id", "owner_id", "id"),
+        Index("ix_contacts_owner_id_last_name_first_name", "owner_id", "last_name", "first_name"),
+        Index("ix_contacts_owner_id_updated_at", "owner_id", "updated_at"),
+        Index("ix_contacts_owner_id_birthday_doy", "owner_id", "birthday_doy"),
+        Index("ix_contacts_owner_id_change_seq", "owner_id", "change_seq"),
+    )
+
+    @validates("birthday")
+    def _set_birthday_doy(self, key, birthday):
+        self.birthday_doy = birthday_day_of_year(birthday)
+        return birthday
+
+
+class ContactTombstone(Base):
+    """
+    SQLAlchemy model recording the deletion of a contact for delta sync.
+
+    Attributes:
+        id (int): Primary key
+        owner_id (int): Foreign key to the User that owned the contact
+        contact_id (int): ID of the deleted contact
+        change_seq (int): Owner's change sequence number of the deletion
+        deleted_at (datetime): Deletion timestamp
+    """
+    __tablename__ = "contact_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    contact_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_contact_tombstones_owner_id_change_seq", "owner_id", "change_seq"),
+    )
+
+
+class EmailOutbox(Base):
+    """
+    SQLAlchemy model for an email waiting to be sent.
+
+    Rows are written in the same transaction as the change that triggers the email
+    and delivered later by :class:`mailer.OutboxWorker`.
+
+    Attributes:
+        id (int): Primary key
+        recipient (str): Recipient address
+        subject (str): Message subject
+        body (str): Plain text message body
+        status (str): "pending", "sending", "sent" or "failed"
+        attempts (int): Number of delivery attempts so far
+        next_attempt_at (datetime): Earliest time of the next delivery attempt
+        last_error (str): Error of the last failed attempt
+        created_at (datetime): Creation timestamp
+        sent_at (datetime): Delivery timestamp
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+class AvatarJob(Base):
+    """
+    SQLAlchemy model for an avatar upload being processed in the background.
+
+    Attributes:
+        id (int): Primary key
+        user_id (int): Foreign key to the User whose avatar is changed
+        status (str): "pending", "processing", "done" or "failed"
+        thumbnail_url (str): URL of the thumbnail variant once done
+        medium_url (str): URL of the medium variant once done
+        error (str): Reason of the failure
+        created_at (datetime): Creation timestamp
+        updated_at (datetime): Last status change timestamp
+    """
+    __tablename__ = "avatar_jobs"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")
+    thumbnail_url = Column(String, nullable=True)
+    medium_url = Column(String, nullable=True)
+    error = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -83,14 +216,14 @@ class ContactCreate(BaseModel):
         last_name (str): The contact's last name.
         email (EmailStr): The contact's email address.
         phone (str): The contact's phone number.
-        birthday (str): The contact's birthday.
+        birthday (date): The contact's birthday.
         additional_info (Optional[str]): Additional information about the contact.
     """
     first_name: str
     last_name: str
     email: EmailStr
     phone: str
-    birthday: str
+    birthday: date
     additional_info: Optional[str] = None
 
 
@@ -101,7 +234,155 @@ class ContactResponse(ContactCreate):
     Inherits all fields from ContactCreate and adds:
         id (int): The contact's unique identifier.
     """
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+
+
+class UserResponse(BaseModel):
+    """
+    Pydantic model for the authenticated user.
+
+    This is both the response of ``/me/`` and the schema of the principal cache.
+
+    Attributes:
+        id (int): The user's unique identifier.
+        email (str): The user's email address.
+        is_verified (bool): Whether the user's email is verified.
+        role (UserRole): The user's role.
+        avatar_url (Optional[str]): URL of the user's avatar.
+    """
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: int
+    email: str
+    is_verified: bool
+    role: UserRole
+    avatar_url: Optional[str] = None
+
+
+class AvatarJobResponse(BaseModel):
+    """
+    Pydantic model for the status of an avatar job.
+
+    Attributes:
+        id (int): The job's unique identifier.
+        status (str): "pending", "processing", "done" or "failed".
+        thumbnail_url (Optional[str]): URL of the thumbnail variant once done.
+        medium_url (Optional[str]): URL of the medium variant once done.
+        error (Optional[str]): Reason of the failure.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
+    status: str
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ContactSyncResponse(ContactResponse):
+    """
+    Pydantic model for a created or updated contact in the change feed.
+
+    Inherits all fields from ContactResponse and adds:
+        change_seq (int): Change sequence number of the contact's latest write.
+        updated_at (datetime): Time of the contact's latest write.
+    """
+    change_seq: int
+    updated_at: datetime
+
+
+class ContactTombstoneResponse(BaseModel):
+    """
+    Pydantic model for a deleted contact in the change feed.
+
+    Attributes:
+        contact_id (int): ID of the deleted contact.
+        change_seq (int): Change sequence number of the deletion.
+        deleted_at (datetime): Deletion timestamp.
+    """
+    model_config = ConfigDict(from_attributes=True)
+
+    contact_id: int
+    change_seq: int
+    deleted_at: datetime
+
+
+class ContactChangesResponse(BaseModel):
+    """
+    Pydantic model for a page of the contacts change feed.
+
+    Attributes:
+        upserted (List[ContactSyncResponse]): Contacts created or updated since the cursor.
+        deleted (List[ContactTombstoneResponse]): Contacts deleted since the cursor.
+        cursor (int): Value of ``since`` for the next request.
+        has_more (bool): Whether more changes are available after ``cursor``.
+    """
+    upserted: List[ContactSyncResponse]
+    deleted: List[ContactTombstoneResponse]
+    cursor: int
+    has_more: bool
 
-    class Config:
-        orm_mode = True
+
+class ContactPatch(BaseModel):
+    """
+    Pydantic model for a partial contact update; omitted fields are left unchanged.
+
+    Attributes:
+        first_name (Optional[str]): The contact's first name.
+        last_name (Optional[str]): The contact's last name.
+        email (Optional[EmailStr]): The contact's email address.
+        phone (Optional[str]): The contact's phone number.
+        birthday (Optional[date]): The contact's birthday.
+        additional_info (Optional[str]): Additional information; may be set to null.
+    """
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+    birthday: Optional[date] = None
+    additional_info: Optional[str] = None
+
+    @field_validator("first_name", "last_name", "email", "phone", "birthday")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
+
+class ContactBatchUpdate(BaseModel):
+    """
+    Pydantic model for applying one partial update to many contacts.
+
+    Attributes:
+        ids (List[int]): IDs of the contacts to update.
+        changes (ContactPatch): Fields to set on every contact.
+    """
+    ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+    changes: ContactPatch
+
+
+class ContactBatchResponse(BaseModel):
+    """
+    Pydantic model for the result of a batch read or update.
+
+    Attributes:
+        contacts (List[ContactResponse]): The found contacts, ordered by ID.
+        not_found (List[int]): Requested IDs that do not exist or belong to another user.
+    """
+    contacts: List[ContactResponse]
+    not_found: List[int]
+
+
+class ContactBatchDeleteResponse(BaseModel):
+    """
+    Pydantic model for the result of a batch delete.
+
+    Attributes:
+        deleted (List[int]): IDs of the deleted contacts.
+        not_found (List[int]): Requested IDs that do not exist or belong to another user.
+    """
+    deleted: List[int]
+    not_found: List[int]
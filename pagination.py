@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+from models import Contact
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Whitelisted sort orders. Every order ends with the primary key so the keyset
+# is unique and pages never overlap or skip rows with equal sort values.
+SORT_KEYS = {
+    "id": (Contact.id,),
+    "name": (Contact.last_name, Contact.first_name, Contact.id),
+    "updated_at": (Contact.updated_at, Contact.id),
+}
+
+
+def encode_cursor(sort: str, order: str, values: Sequence[Any]) -> str:
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+
+    Args:
+        sort (str): Name of the sort order the page was produced with.
+        order (str): Sort direction, "asc" or "desc".
+        values (Sequence[Any]): Values of the sort columns of the last row.
+
+    Returns:
+        str: URL-safe cursor string.
+    """
+    payload = {
+        "s": sort,
+        "o": order,
+        "k": [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> List[Any]:
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    Args:
+        cursor (str): The opaque cursor sent by the client.
+        sort (str): Sort order of the current request.
+        order (str): Sort direction of the current request.
+
+    Returns:
+        List[Any]: Values of the sort columns to continue after.
+
+    Raises:
+        HTTPException: If the cursor is malformed or was issued for another sort order.
+    """
+    invalid = HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = payload["k"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise invalid
+    if payload.get("s") != sort or payload.get("o") != order:
+        raise invalid
+    columns = SORT_KEYS[sort]
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise invalid
+    for i, column in enumerate(columns):
+        values[i] = _cursor_value(column, values[i], invalid)
+    return values
+
+
+def _cursor_value(column, value: Any, invalid: HTTPException) -> Any:
+    # Cursor values come from the client, so each must have its column's type
+    # before it reaches the keyset comparison.
+    if value is None and column.nullable and not column.primary_key:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        raise invalid
+    if python_type is int:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        raise invalid
+    if isinstance(value, python_type):
+        return value
+    raise invalid
+
+
+def paginate(stmt: Select, sort: str, order: str, cursor: Optional[str], limit: int) -> Select:
+    """
+    Apply keyset ordering, the cursor predicate and the page size to a contacts query.
+
+    One extra row is requested so the caller can tell whether a next page exists.
+
+    Args:
+        stmt (Select): Query selecting contacts, already scoped to the owner.
+        sort (str): Name of a sort order from :data:`SORT_KEYS`.
+        order (str): Sort direction, "asc" or "desc".
+        cursor (Optional[str]): Cursor returned with the previous page.
+        limit (int): Page size.
+
+    Returns:
+        Select: The paginated query.
+    """
+    columns = SORT_KEYS[sort]
+    if cursor:
+        values = decode_cursor(cursor, sort, order)
+        key = tuple_(*columns)
+        stmt = stmt.where(key < tuple_(*values) if order == "desc" else key > tuple_(*values))
+    ordering = [c.desc() if order == "desc" else c.asc() for c in columns]
+    return stmt.order_by(*ordering).limit(limit + 1)
+
+
+def next_cursor(rows: List[Contact], sort: str, order: str, limit: int) -> Optional[str]:
+    """
+    Build the cursor for the page following ``rows``.
+
+    Args:
+        rows (List[Contact]): Rows fetched by a query built with :func:`paginate`.
+        sort (str): Name of the sort order.
+        order (str): Sort direction.
+        limit (int): Page size.
+
+    Returns:
+        Optional[str]: Cursor of the next page, or None if this was the last page.
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(sort, order, [getattr(last, c.key) for c in SORT_KEYS[sort]])
@@ -0,0 +1,157 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from metrics import PASSWORD_HASH, PASSWORD_VERIFY
+from tracing import tracer
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 8 * PASSWORD_HASH_WORKERS))
+
+# Hashes with fewer rounds than the target are reported as needing an update,
+# so they are re-hashed the next time the user logs in.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+def hash_password_sync(password: str) -> str:
+    """
+    Hash a password with the configured bcrypt cost.
+
+    Args:
+        password (str): Plain text password.
+
+    Returns:
+        str: The bcrypt hash.
+    """
+    return pwd_context.hash(password)
+
+
+def verify_and_update_sync(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and re-hash it if its hash is below the configured cost.
+
+    Args:
+        password (str): Plain text password.
+        hashed_password (str): Stored hash.
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether the password matches, and the new hash
+        to store if it does and the stored one is outdated.
+    """
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded process pool so it never blocks the event loop.
+
+    At most ``max_pending`` operations may be queued or running at once; further
+    requests are rejected with 503 instead of queueing behind a login storm.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        max_pending (int): Maximum number of queued or running operations.
+        pending (int): Number of operations currently queued or running.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+        self._dummy_hash: Optional[str] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned workers do not inherit the parent's threads and locks.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many concurrent password operations",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password in the process pool.
+
+        Args:
+            password (str): Plain text password.
+
+        Returns:
+            str: The bcrypt hash.
+
+        Raises:
+            HTTPException: If too many password operations are pending.
+        """
+        with PASSWORD_HASH.time(), tracer.span("password.hash"):
+            return await self._run(hash_password_sync, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password in the process pool, re-hashing outdated hashes.
+
+        Args:
+            password (str): Plain text password.
+            hashed_password (str): Stored hash.
+
+        Returns:
+            Tuple[bool, Optional[str]]: See :func:`verify_and_update_sync`.
+
+        Raises:
+            HTTPException: If too many password operations are pending.
+        """
+        with PASSWORD_VERIFY.time(), tracer.span("password.verify"):
+            return await self._run(verify_and_update_sync, password, hashed_password)
+
+    async def verify_dummy(self, password: str) -> None:
+        """
+        Spend the cost of a real verification without a stored hash.
+
+        Used for unknown users, so a failed login takes as long whether or not the
+        email exists. The dummy hash is created once, at the configured cost.
+
+        Args:
+            password (str): The submitted password.
+
+        Raises:
+            HTTPException: If too many password operations are pending.
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = await self._run(hash_password_sync, "dummy password")
+        with PASSWORD_VERIFY.time(), tracer.span("password.verify", dummy=True):
+            await self._run(verify_and_update_sync, password, self._dummy_hash)
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pydantic import ValidationError
+from redis.exceptions import RedisError
+
+from metrics import PRINCIPAL_CACHE_LOCAL, PRINCIPAL_CACHE_MISS, PRINCIPAL_CACHE_REDIS
+from models import UserResponse
+from redis_store import RedisStore
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_LOCAL_MAXSIZE = int(os.getenv("PRINCIPAL_LOCAL_MAXSIZE", 10000))
+PRINCIPAL_LOCAL_TTL = float(os.getenv("PRINCIPAL_LOCAL_TTL", 60))
+PRINCIPAL_REDIS_TTL = timedelta(minutes=int(os.getenv("PRINCIPAL_REDIS_TTL_MINUTES", 30)))
+PRINCIPAL_LISTENER_RETRY = float(os.getenv("PRINCIPAL_LISTENER_RETRY", 5))
+INVALIDATION_CHANNEL = "user:invalidate"
+
+
+class PrincipalCache:
+    """
+    Two-tier cache of authenticated users: a per-worker TTL LRU in front of Redis.
+
+    Both tiers store :class:`models.UserResponse`, serialized as JSON in Redis.
+    Concurrent misses for the same user in one worker share a single database load.
+    When a user changes, :meth:`invalidate` deletes the Redis entry and publishes
+    the email on :data:`INVALIDATION_CHANNEL` so every worker drops its local copy.
+
+    While Redis is unavailable the shared tier is skipped and misses go to the
+    loader; other workers then see a change only once their local entry expires.
+
+    Attributes:
+        store (RedisStore): Redis access used for the shared tier and pub/sub.
+        local (TTLCache): The per-worker tier.
+    """
+
+    def __init__(self, store: RedisStore, maxsize: int = PRINCIPAL_LOCAL_MAXSIZE,
+                 ttl: float = PRINCIPAL_LOCAL_TTL, redis_ttl: timedelta = PRINCIPAL_REDIS_TTL):
+        self.store = store
+        self.local = TTLCache(maxsize, ttl)
+        self.redis_ttl = redis_ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listener = None
+
+    @staticmethod
+    def _key(email: str) -> str:
+        return f"user:{email}"
+
+    async def get(self, email: str,
+                  loader: Callable[[], Awaitable[Optional[UserResponse]]]) -> Optional[UserResponse]:
+        """
+        Get a user from the local tier, then Redis, then ``loader``.
+
+        Args:
+            email (str): The user's email.
+            loader (Callable): Coroutine function loading the user from the database,
+                returning None if the user does not exist.
+
+        Returns:
+            Optional[UserResponse]: The user, or None if the loader found nothing.
+        """
+        principal = self.local.get(email)
+        if principal is not None:
+            PRINCIPAL_CACHE_LOCAL.inc()
+            return principal
+
+        cached = await self.store.get(self._key(email))
+        if cached:
+            try:
+                principal = UserResponse.model_validate_json(cached)
+            except ValidationError:
+                logger.warning("Dropping malformed cache entry for %s", email)
+            else:
+                self.local.set(email, principal)
+                PRINCIPAL_CACHE_REDIS.inc()
+                return principal
+
+        PRINCIPAL_CACHE_MISS.inc()
+        inflight = self._inflight.get(email)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[email] = future
+        try:
+            principal = await loader()
+            if principal is not None:
+                await self.put(principal)
+            future.set_result(principal)
+            return principal
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting for it.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[email]
+
+    async def put(self, principal: UserResponse) -> None:
+        """
+        Store a freshly loaded user in both tiers.
+
+        Args:
+            principal (UserResponse): The user.
+        """
+        await self.store.setex(self._key(principal.email), self.redis_ttl, principal.model_dump_json())
+        self.local.set(principal.email, principal)
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Drop a user from Redis and from the local tier of every worker.
+
+        Args:
+            email (str): The user's email.
+        """
+        self.local.pop(email)
+        await self.store.delete(self._key(email))
+        await self.store.publish(INVALIDATION_CHANNEL, email)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self.store.client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    while True:
+                        # An explicit timeout overrides the pool's short socket timeout.
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is not None:
+                            self.local.pop(message["data"])
+            except (RedisError, OSError) as e:
+                # Entries may have changed while disconnected.
+                self.local.clear()
+                logger.warning("Invalidation listener disconnected: %s", e)
+                await asyncio.sleep(PRINCIPAL_LISTENER_RETRY)
+
+    def start_listener(self) -> None:
+        """
+        Subscribe to invalidation messages in a task on the running event loop.
+        """
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        """
+        Stop the invalidation listener task.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
@@ -0,0 +1,265 @@
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+
+# Share of all requests profiled without a token; 0 profiles only requests with one.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Oldest profiles are deleted once there are more than this many.
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+PROFILE_TOKEN_MINUTES = int(os.getenv("PROFILE_TOKEN_MINUTES", 15))
+
+PROFILE_HEADER = "X-Profile-Token"
+# Audience of profile tokens; access tokens carrying any audience are rejected.
+PROFILE_AUDIENCE = "profile"
+_PROFILE_ALGORITHM = "HS256"
+_PROFILE_HEADER_KEY = PROFILE_HEADER.lower().encode()
+_PROFILE_ID = re.compile(r"^\d{13}-[0-9a-f]{8}$")
+
+
+class RequestProfiler:
+    """
+    Profiles selected requests with cProfile and keeps the latest results on disk.
+
+    A request is profiled when it carries a profile token issued to an admin, or
+    when it falls into the sampled share of traffic. Only one request is
+    profiled at a time: cProfile hooks the whole thread, and the event loop
+    thread runs every concurrent request, so overlapping profiles would mix.
+    Work other requests do on the event loop while a profile runs still shows
+    up in it, and work in the threadpool does not.
+
+    Profile tokens are signed with a key derived from the app's secret key and
+    carry their own audience, so they cannot be used as access tokens.
+
+    Profiles are stored as pstats files with a JSON description in ``directory``,
+    which holds at most ``max_profiles`` of them.
+
+    Attributes:
+        directory (str): Where profiles are stored.
+        max_profiles (int): Number of profiles kept.
+        sample_rate (float): Share of requests profiled without a token.
+    """
+
+    def __init__(self, secret_key: str, directory: str = PROFILE_DIR,
+                 max_profiles: int = PROFILE_MAX_FILES, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self._token_key = hmac.new(secret_key.encode(), b"request-profiler", hashlib.sha256).hexdigest()
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    def issue_token(self, issued_to: str, minutes: int = PROFILE_TOKEN_MINUTES) -> dict:
+        """
+        Create a token that gets requests carrying it profiled.
+
+        Args:
+            issued_to (str): Email of the admin requesting it.
+            minutes (int): Lifetime of the token.
+
+        Returns:
+            dict: The token, the header to send it in and its expiry.
+        """
+        expires_at = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+        token = jwt.encode({"sub": issued_to, "aud": PROFILE_AUDIENCE, "exp": expires_at},
+                           self._token_key, algorithm=_PROFILE_ALGORITHM)
+        return {"token": token, "header": PROFILE_HEADER, "expires_at": expires_at}
+
+    def _has_valid_token(self, scope) -> bool:
+        for key, value in scope["headers"]:
+            if key == _PROFILE_HEADER_KEY:
+                try:
+                    jwt.decode(value.decode("latin-1"), self._token_key, algorithms=[_PROFILE_ALGORITHM],
+                               audience=PROFILE_AUDIENCE)
+                except JWTError:
+                    return False
+                return True
+        return False
+
+    def should_profile(self, scope) -> bool:
+        """
+        Decide whether to profile a request.
+
+        Args:
+            scope (dict): ASGI scope of the request.
+
+        Returns:
+            bool: True if it carries a valid profile token or is sampled.
+        """
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        return self._has_valid_token(scope)
+
+    def try_begin(self) -> bool:
+        """
+        Claim the profiler for one request.
+
+        Returns:
+            bool: False if another request is being profiled.
+        """
+        return self._busy.acquire(blocking=False)
+
+    def end(self) -> None:
+        """
+        Release the profiler claimed with :meth:`try_begin`.
+        """
+        self._busy.release()
+
+    def _path(self, profile_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profile_id: str, profile: cProfile.Profile, description: dict) -> None:
+        """
+        Store a profile and drop the oldest ones beyond ``max_profiles``.
+
+        Args:
+            profile_id (str): ID of the new profile.
+            profile (cProfile.Profile): The finished profile.
+            description (dict): What was profiled.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(self._path(profile_id, "prof"))
+        with open(self._path(profile_id, "json"), "w", encoding="utf-8") as f:
+            json.dump(description, f)
+        # IDs start with a millisecond timestamp, so they sort by age.
+        for stale in self.list_ids()[:-self.max_profiles or None]:
+            for extension in ("prof", "json"):
+                try:
+                    os.remove(self._path(stale, extension))
+                except FileNotFoundError:
+                    pass
+
+    def list_ids(self) -> List[str]:
+        """
+        Get the IDs of the stored profiles, oldest first.
+
+        Returns:
+            List[str]: Profile IDs.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json") and _PROFILE_ID.match(name[:-5]))
+
+    def describe(self, profile_id: str) -> Optional[dict]:
+        """
+        Get the description of a stored profile.
+
+        Args:
+            profile_id (str): The profile ID.
+
+        Returns:
+            Optional[dict]: ID, method, route, path, status, duration and creation
+            time, or None if there is no such profile.
+        """
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def pstats_path(self, profile_id: str) -> Optional[str]:
+        """
+        Get the file of a stored profile, loadable with :class:`pstats.Stats`.
+
+        Args:
+            profile_id (str): The profile ID.
+
+        Returns:
+            Optional[str]: The path, or None if there is no such profile.
+        """
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = self._path(profile_id, "prof")
+        return path if os.path.exists(path) else None
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 40) -> Optional[str]:
+        """
+        Render a stored profile as a pstats text report.
+
+        Args:
+            profile_id (str): The profile ID.
+            sort (str): pstats sort key, e.g. "cumulative" or "tottime".
+            limit (int): Number of functions listed.
+
+        Returns:
+            Optional[str]: The report, or None if there is no such profile.
+        """
+        path = self.pstats_path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware running selected requests under :class:`RequestProfiler`.
+
+    Profiled responses carry an ``X-Profile-Id`` header naming the stored profile.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        profiler (RequestProfiler): Selects requests and stores their profiles.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self.profiler.try_begin():
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{time.time_ns() // 1_000_000}-{random.getrandbits(32):08x}"
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                profile.disable()
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            description = {
+                "id": profile_id,
+                "method": scope["method"],
+                "route": route.path if route is not None else None,
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 3),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            await run_in_threadpool(self.profiler.save, profile_id, profile, description)
+        finally:
+            self.profiler.end()
@@ -0,0 +1,165 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from jose import JWTError
+from starlette.requests import Request
+
+from redis_store import RedisStore
+from token_cache import TokenCache
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "300/minute")
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Generic cell rate algorithm: the key holds the theoretical arrival time (TAT)
+# of the next request in milliseconds. Each request moves it forward by one
+# emission interval; a request is allowed while the TAT stays within one period
+# of now. One key, one round trip, and Redis' clock is shared by all workers.
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + emission
+if new_tat - now > period then
+    return {0, 0, new_tat - now - period}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor((period - (new_tat - now)) / emission), 0}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    A request budget: ``limit`` requests per ``period`` seconds, refilled evenly.
+
+    Attributes:
+        limit (int): Requests allowed per period, also the maximum burst.
+        period (int): Length of the period in seconds.
+    """
+    limit: int
+    period: int
+
+    @classmethod
+    def parse(cls, value: str) -> "RateLimitPolicy":
+        """
+        Parse a policy such as ``"5/minute"``.
+
+        Args:
+            value (str): ``"<count>/<second|minute|hour|day>"``.
+
+        Returns:
+            RateLimitPolicy: The policy.
+        """
+        count, period = value.split("/")
+        return cls(int(count), _PERIODS[period.strip()])
+
+    def __str__(self) -> str:
+        return f"{self.limit} per {self.period} seconds"
+
+
+# Policies by route path template; every other route gets RATE_LIMIT_DEFAULT.
+ROUTE_POLICIES: Dict[str, RateLimitPolicy] = {
+    "/token": RateLimitPolicy.parse("10/minute"),
+    "/register/": RateLimitPolicy.parse("5/minute"),
+    "/forgot-password/": RateLimitPolicy.parse("5/minute"),
+    "/reset-password/{token}": RateLimitPolicy.parse("5/minute"),
+    "/verify/{token}": RateLimitPolicy.parse("10/minute"),
+    "/me/": RateLimitPolicy.parse("5/minute"),
+    "/contacts/import": RateLimitPolicy.parse("10/minute"),
+    "/contacts/export": RateLimitPolicy.parse("10/minute"),
+    "/users/avatar/": RateLimitPolicy.parse("10/minute"),
+}
+
+
+class RateLimiter:
+    """
+    Shared rate limiter: one atomic Redis script per checked request.
+
+    Authenticated requests are counted per user (the token subject), others per
+    client IP. Counters live in Redis, so the limit holds across all workers.
+    While Redis is unavailable requests are allowed.
+
+    Attributes:
+        store (RedisStore): Redis access.
+        token_cache (TokenCache): Verifies bearer tokens to identify users.
+        default (RateLimitPolicy): Policy of routes without their own.
+        policies (Dict[str, RateLimitPolicy]): Policies by route path template.
+    """
+
+    def __init__(self, store: RedisStore, token_cache: TokenCache,
+                 default: RateLimitPolicy = RateLimitPolicy.parse(RATE_LIMIT_DEFAULT),
+                 policies: Optional[Dict[str, RateLimitPolicy]] = None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store
+        self.token_cache = token_cache
+        self.default = default
+        self.policies = ROUTE_POLICIES if policies is None else policies
+        self.enabled = enabled
+
+    def identity(self, request: Request) -> str:
+        """
+        Get the key a request is counted under.
+
+        Args:
+            request (Request): The incoming request.
+
+        Returns:
+            str: ``user:<subject>`` for a valid bearer token, else ``ip:<address>``.
+        """
+        authorization = request.headers.get("authorization")
+        if authorization and authorization[:7].lower() == "bearer ":
+            try:
+                subject = self.token_cache.decode(authorization[7:]).get("sub")
+            except JWTError:
+                subject = None
+            if subject:
+                return f"user:{subject}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    async def check(self, route: str, identity: str) -> None:
+        """
+        Count a request against its route's policy.
+
+        Args:
+            route (str): Route path template, e.g. ``/contacts/{contact_id}``.
+            identity (str): Key from :meth:`identity`.
+
+        Raises:
+            HTTPException: 429 with ``Retry-After`` if the budget is exhausted.
+        """
+        policy = self.policies.get(route, self.default)
+        period_ms = policy.period * 1000
+        result = await self.store.run_script(
+            GCRA_SCRIPT, [f"rl:{route}:{identity}"], [max(1, period_ms // policy.limit), period_ms],
+        )
+        if result is None or result[0]:
+            return
+        retry_after = -(-int(result[2]) // 1000) or 1
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded: {policy}",
+            headers={"Retry-After": str(retry_after), "X-RateLimit-Limit": str(policy.limit)},
+        )
+
+    async def __call__(self, request: Request) -> None:
+        """
+        FastAPI dependency applying the limit of the matched route.
+
+        Args:
+            request (Request): The incoming request.
+
+        Raises:
+            HTTPException: 429 if the caller is over the limit.
+        """
+        if not self.enabled:
+            return
+        route = request.scope.get("route")
+        await self.check(route.path if route is not None else request.url.path, self.identity(request))
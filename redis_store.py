@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import NoScriptError, RedisError
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.25))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.25))
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", 5))
+REDIS_BREAKER_RESET_SECONDS = float(os.getenv("REDIS_BREAKER_RESET_SECONDS", 10))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency after repeated failures and probes it again later.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and every
+    call is refused for ``reset_timeout`` seconds. Then a single trial call is let
+    through: success closes the breaker, failure opens it again.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a trial call.
+        failures (int): Current number of consecutive failures.
+    """
+
+    def __init__(self, failure_threshold: int = REDIS_BREAKER_FAILURES,
+                 reset_timeout: float = REDIS_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """str: "closed", "open" or "half_open"."""
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may be made now.
+
+        Returns:
+            bool: True if the breaker is closed, or half-open with no trial running.
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """
+        Record a successful call, closing the breaker.
+        """
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """
+        Record a failed call, opening the breaker at the threshold or after a failed trial.
+        """
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Redis circuit breaker opened after %s failures", self.failures)
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self) -> None:
+        """
+        Give up a call without an outcome, freeing the trial slot if it held it.
+        """
+        with self._lock:
+            self._trial_running = False
+
+
+class RedisStore:
+    """
+    Asyncio Redis access that fails open.
+
+    Every command goes through :meth:`call`, which refuses to touch Redis while the
+    circuit breaker is open and turns connection errors and timeouts into the
+    caller's ``default``. Callers treat that like a cache miss and fall back to the
+    database, so a slow or missing Redis degrades latency instead of availability.
+
+    Attributes:
+        client (redis.asyncio.Redis): The client, sharing one connection pool.
+        breaker (CircuitBreaker): Breaker guarding the client.
+        calls (int): Commands sent to Redis.
+        errors (int): Commands that failed or timed out.
+        rejected (int): Commands skipped because the breaker was open.
+    """
+
+    def __init__(self, client: aioredis.Redis, breaker: Optional[CircuitBreaker] = None):
+        self.client = client
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+
+    @classmethod
+    def from_env(cls) -> "RedisStore":
+        """
+        Create a store from the ``REDIS_*`` environment variables.
+
+        Returns:
+            RedisStore: Store with an explicit, bounded connection pool. No
+            connection is opened until the first command.
+        """
+        pool = aioredis.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=REDIS_DB,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_CONNECT_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+            decode_responses=True,
+        )
+        return cls(aioredis.Redis(connection_pool=pool))
+
+    async def call(self, command: str, *args, default: Any = None, **kwargs) -> Any:
+        """
+        Run a Redis command unless the breaker is open.
+
+        Args:
+            command (str): Name of the ``redis.asyncio.Redis`` method, e.g. "get".
+            *args: Positional arguments of the command.
+            default (Any): Returned when Redis is unavailable.
+            **kwargs: Keyword arguments of the command.
+
+        Returns:
+            Any: The command's result, or ``default``.
+        """
+        return await self._guarded(command, lambda: getattr(self.client, command)(*args, **kwargs), default)
+
+    async def _guarded(self, name: str, run: Callable[[], Awaitable[Any]], default: Any) -> Any:
+        if not self.breaker.allow():
+            self.rejected += 1
+            return default
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"redis.{name}"):
+                result = await run()
+        except (RedisError, OSError, asyncio.TimeoutError) as e:
+            self.errors += 1
+            self.breaker.record_failure()
+            logger.warning("Redis %s failed: %s", name, e)
+            return default
+        except asyncio.CancelledError:
+            # The caller gave up, e.g. the client disconnected; that says nothing
+            # about Redis, so only the half-open trial slot is released.
+            self.breaker.release()
+            raise
+        else:
+            self.breaker.record_success()
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.latency_total += elapsed
+            self.latency_last = elapsed
+            self.latency_max = max(self.latency_max, elapsed)
+
+    async def run_script(self, script: str, keys: List[str], args: List[Any], default: Any = None) -> Any:
+        """
+        Run a Lua script by its SHA1, loading it on the first call to a server.
+
+        Args:
+            script (str): The Lua source.
+            keys (List[str]): Keys the script touches.
+            args (List[Any]): Script arguments.
+            default (Any): Returned when Redis is unavailable.
+
+        Returns:
+            Any: The script's result, or ``default``.
+        """
+        sha = hashlib.sha1(script.encode()).hexdigest()
+
+        async def run():
+            try:
+                return await self.client.evalsha(sha, len(keys), *keys, *args)
+            except NoScriptError:
+                return await self.client.eval(script, len(keys), *keys, *args)
+
+        return await self._guarded("evalsha", run, default)
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Get a value; None if it is missing or Redis is unavailable.
+        """
+        return await self.call("get", key)
+
+    async def setex(self, key: str, ttl, value: str) -> None:
+        """
+        Set a value with an expiry; a no-op if Redis is unavailable.
+        """
+        await self.call("setex", key, ttl, value)
+
+    async def delete(self, *keys: str) -> None:
+        """
+        Delete keys; a no-op if Redis is unavailable.
+        """
+        await self.call("delete", *keys)
+
+    async def incr(self, key: str) -> Optional[int]:
+        """
+        Increment a counter; None if Redis is unavailable.
+        """
+        return await self.call("incr", key)
+
+    async def publish(self, channel: str, message: str) -> None:
+        """
+        Publish a message; a no-op if Redis is unavailable.
+        """
+        await self.call("publish", channel, message)
+
+    def status(self) -> dict:
+        """
+        Get the breaker state and latency statistics.
+
+        Returns:
+            dict: Breaker state, consecutive failures, command counters and
+            average, maximum and last latency in milliseconds.
+        """
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "calls": self.calls,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "latency_ms_avg": round(self.latency_total / self.calls * 1000, 3) if self.calls else 0.0,
+            "latency_ms_max": round(self.latency_max * 1000, 3),
+            "latency_ms_last": round(self.latency_last * 1000, 3),
+        }
+
+    async def close(self) -> None:
+        """
+        Close the pooled connections.
+        """
+        await self.client.aclose()
@@ -0,0 +1,114 @@
+from typing import List
+
+from sqlalchemy import DDL, Select, column, event, func, literal_column, or_, select, table, text
+
+from models import Contact
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+# Text the PostgreSQL trigram index is built on. Queries must use the same
+# expression for the planner to pick the index.
+SEARCH_DOCUMENT_SQL = (
+    "lower(coalesce(contacts.first_name, '') || ' ' || coalesce(contacts.last_name, '') || ' ' || "
+    "coalesce(contacts.email, '') || ' ' || coalesce(contacts.phone, ''))"
+)
+
+_fts = table("contacts_fts", column("rowid"))
+
+_SQLITE_CREATE = [
+    # External-content FTS5 table: the index lives in contacts_fts, the text stays in contacts.
+    """CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+        first_name, last_name, email, phone,
+        content='contacts', content_rowid='id',
+        prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE ON contacts BEGIN
+        INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email, phone)
+        VALUES ('delete', old.id, old.first_name, old.last_name, old.email, old.phone);
+        INSERT INTO contacts_fts(rowid, first_name, last_name, email, phone)
+        VALUES (new.id, new.first_name, new.last_name, new.email, new.phone);
+    END""",
+    "INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')",
+]
+
+_POSTGRESQL_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts USING gin (({SEARCH_DOCUMENT_SQL}) gin_trgm_ops)",
+]
+
+for _statement in _SQLITE_CREATE:
+    event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in _POSTGRESQL_CREATE:
+    event.listen(Contact.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(
+    Contact.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS contacts_fts").execute_if(dialect="sqlite"),
+)
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Split a search query into lower-cased terms.
+
+    Args:
+        query (str): The raw query string.
+
+    Returns:
+        List[str]: Non-empty terms of the query.
+    """
+    return query.lower().split()
+
+
+def _fts_match(terms: List[str]) -> str:
+    # Every term is a quoted prefix query, so FTS5 operators in user input are inert.
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def build_search(dialect_name: str, owner_id: int, terms: List[str], limit: int) -> Select:
+    """
+    Build a ranked contact search query for the given database backend.
+
+    PostgreSQL filters with the trigram index and ranks by word similarity, SQLite
+    matches against the FTS5 table and ranks by bm25. Other backends fall back to
+    unindexed substring matching ordered by last name.
+
+    Args:
+        dialect_name (str): Name of the SQLAlchemy dialect in use.
+        owner_id (int): ID of the user whose contacts are searched.
+        terms (List[str]): Search terms from :func:`search_terms`; all must match.
+        limit (int): Maximum number of results.
+
+    Returns:
+        Select: Query selecting matching contacts, best match first.
+    """
+    stmt = select(Contact).where(Contact.owner_id == owner_id)
+    if dialect_name == "sqlite":
+        return (
+            stmt.join(_fts, _fts.c.rowid == Contact.id)
+            .where(text("contacts_fts MATCH :match").bindparams(match=_fts_match(terms)))
+            .order_by(func.bm25(literal_column("contacts_fts")), Contact.id)
+            .limit(limit)
+        )
+    if dialect_name == "postgresql":
+        document = literal_column(SEARCH_DOCUMENT_SQL)
+        for term in terms:
+            stmt = stmt.where(document.contains(term, autoescape=True))
+        return stmt.order_by(func.word_similarity(" ".join(terms), document).desc(), Contact.id).limit(limit)
+
+    for term in terms:
+        stmt = stmt.where(or_(
+            Contact.first_name.icontains(term, autoescape=True),
+            Contact.last_name.icontains(term, autoescape=True),
+            Contact.email.icontains(term, autoescape=True),
+            Contact.phone.icontains(term, autoescape=True),
+        ))
+    return stmt.order_by(Contact.last_name, Contact.first_name, Contact.id).limit(limit)
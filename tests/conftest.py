@@ -1,19 +1,22 @@
 import os
+import tempfile
+from contextlib import contextmanager
+import fakeredis
 import pytest
+from sqlalchemy import event
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
 
-from database import Base
-from main import app, get_db
-
-# Mock environment variables
-os.environ["DATABASE_URL"] = "sqlite://"
+# Mock environment variables before the application modules read them.
+# The sync and async engines must share one database, so the tests use a
+# file-backed SQLite database instead of an in-memory one.
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
 os.environ["SECRET_KEY"] = "test_secret_key"
 os.environ["ALGORITHM"] = "HS256"
 os.environ["ACCESS_TOKEN_EXPIRE_MINUTES"] = "30"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["PASSWORD_HASH_WORKERS"] = "1"
 os.environ["REDIS_HOST"] = "localhost"
 os.environ["REDIS_PORT"] = "6379"
 os.environ["SMTP_SERVER"] = "localhost"
@@ -23,13 +26,15 @@ os.environ["SMTP_PASSWORD"] = "test_password"
 os.environ["CLOUDINARY_CLOUD_NAME"] = "test_cloud"
 os.environ["CLOUDINARY_API_KEY"] = "test_key"
 os.environ["CLOUDINARY_API_SECRET"] = "test_secret"
+os.environ["AVATAR_STORAGE"] = "local"
+os.environ["AVATAR_LOCAL_DIR"] = tempfile.mkdtemp()
+os.environ["AVATAR_UPLOAD_DIR"] = tempfile.mkdtemp()
+os.environ["MAX_AVATAR_BYTES"] = "100000"
+
+from database import Base, async_engine, engine
+from mailer import outbox_worker
+from main import app, principal_cache, redis_store, token_cache
 
-# Create a test database in memory
-engine = create_engine(
-    "sqlite://",
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Store for test fixtures
@@ -39,9 +44,28 @@ test_state = {}
 def mock_smtp():
     with patch("smtplib.SMTP") as mock_smtp:
         mock_server = MagicMock()
-        mock_smtp.return_value.__enter__.return_value = mock_server
+        mock_smtp.return_value = mock_server
+        mock_server.__enter__.return_value = mock_server
         test_state['mock_smtp'] = mock_server
+        # Drop the outbox worker's session so the next send uses this mock.
+        outbox_worker.connection.close()
         yield mock_server
+        outbox_worker.connection.close()
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    # Every test gets its own empty in-process Redis, so no server is needed.
+    redis_store.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_store.breaker.record_success()
+    yield redis_store.client
+
+@pytest.fixture(autouse=True)
+def clear_auth_caches():
+    principal_cache.local.clear()
+    token_cache.clear()
+    yield
+    principal_cache.local.clear()
+    token_cache.clear()
 
 @pytest.fixture
 def test_db():
@@ -55,13 +79,6 @@ def test_db():
 
 @pytest.fixture
 def client(test_db):
-    def override_get_db():
-        try:
-            yield test_db
-        finally:
-            test_db.close()
-    
-    app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
     app.dependency_overrides.clear()
 
@@ -91,4 +108,31 @@ def test_user_token(client, test_user):
         "password": test_user["password"]
     })
     assert response.status_code == 200
-    return response.json()["access_token"] 
\ No newline at end of file
+    return response.json()["access_token"] 
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Assert that the statements run inside a block stay within a limit::
+
+        with assert_max_queries(2):
+            client.get("/contacts/", headers=headers)
+    """
+    @contextmanager
+    def max_queries(limit):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        targets = (engine, async_engine.sync_engine)
+        for target in targets:
+            event.listen(target, "after_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            for target in targets:
+                event.remove(target, "after_cursor_execute", record)
+        assert len(statements) <= limit, f"{len(statements)} queries, expected at most {limit}:\n" + "\n".join(statements)
+
+    return max_queries
@@ -1,7 +1,11 @@
 import pytest
+from datetime import timedelta
+from unittest.mock import patch
 from fastapi import HTTPException
-from jose import jwt
-from main import SECRET_KEY, ALGORITHM, create_access_token, verify_password, get_current_user, pwd_context
+from jose import JWTError, jwt
+from login_guard import LoginGuard
+from main import SECRET_KEY, ALGORITHM, create_access_token, get_current_user, password_hasher, redis_store
+from token_cache import TokenCache
 
 def test_create_access_token():
     data = {"sub": "test@example.com"}
@@ -9,11 +13,12 @@ def test_create_access_token():
     payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     assert payload.get("sub") == "test@example.com"
 
-def test_verify_password():
+@pytest.mark.asyncio
+async def test_verify_password():
     plain_password = "testpassword123"
-    hashed_password = pwd_context.hash(plain_password)
-    assert verify_password(plain_password, hashed_password)
-    assert not verify_password("wrongpassword", hashed_password)
+    hashed_password = await password_hasher.hash(plain_password)
+    assert (await password_hasher.verify(plain_password, hashed_password))[0]
+    assert not (await password_hasher.verify("wrongpassword", hashed_password))[0]
 
 def test_register_user(client):
     response = client.post(
@@ -62,4 +67,66 @@ def test_get_current_user_invalid_token(client):
         headers={"Authorization": "Bearer invalid_token"}
     )
     assert response.status_code == 401
-    assert "Invalid token" in response.json()["detail"] 
\ No newline at end of file
+    assert "Invalid token" in response.json()["detail"] 
+
+@pytest.mark.parametrize("claims", [{"scope": "profile"}, {"aud": "profile"}])
+def test_get_current_user_rejects_restricted_tokens(client, test_user, claims):
+    token = create_access_token({"sub": test_user["email"], **claims})
+    response = client.get("/me/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+def test_token_cache_skips_repeated_verification():
+    cache = TokenCache(SECRET_KEY, ALGORITHM, maxsize=2)
+    token = create_access_token({"sub": "cached@example.com"})
+    with patch("token_cache.jwt.decode", wraps=jwt.decode) as decode:
+        assert cache.decode(token)["sub"] == "cached@example.com"
+        assert cache.decode(token)["sub"] == "cached@example.com"
+    assert decode.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    for bad in (token + "x", create_access_token({"sub": "old@example.com"}, timedelta(seconds=-1))):
+        for _ in range(2):
+            with pytest.raises(JWTError):
+                cache.decode(bad)
+    assert len(cache.cache) == 1
+
+    cache.decode(create_access_token({"sub": "a@example.com"}))
+    cache.decode(create_access_token({"sub": "b@example.com"}))
+    assert len(cache.cache) == 2
+
+def test_login_lockout_rejects_before_hashing(client, test_user):
+    for _ in range(5):
+        response = client.post("/token", data={"username": test_user["email"], "password": "wrong"})
+        assert response.status_code == 401
+
+    with patch.object(password_hasher, "verify", wraps=password_hasher.verify) as verify:
+        response = client.post("/token", data={"username": test_user["email"], "password": test_user["password"]})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    verify.assert_not_called()
+
+def test_login_unknown_user_runs_dummy_verify(client):
+    with patch.object(password_hasher, "verify_dummy", wraps=password_hasher.verify_dummy) as verify_dummy:
+        response = client.post("/token", data={"username": "nobody@example.com", "password": "secret"})
+    assert response.status_code == 401
+    verify_dummy.assert_called_once_with("secret")
+
+@pytest.mark.asyncio
+async def test_login_guard_lockout_grows_exponentially(fake_redis):
+    guard = LoginGuard(redis_store, account_max_failures=2, ip_max_failures=100, lockout=10, max_lockout=25)
+    await guard.record_failure("a@example.com", "1.2.3.4")
+    await guard.check("a@example.com", "1.2.3.4")
+
+    await guard.record_failure("a@example.com", "1.2.3.4")
+    assert 0 < await fake_redis.ttl("login:acct:a@example.com:lock") <= 10
+    with pytest.raises(HTTPException) as exc:
+        await guard.check("A@example.com", "5.6.7.8")
+    assert exc.value.status_code == 429
+
+    await guard.record_failure("a@example.com", "1.2.3.4")
+    assert 10 < await fake_redis.ttl("login:acct:a@example.com:lock") <= 20
+    await guard.record_failure("a@example.com", "1.2.3.4")
+    assert 20 < await fake_redis.ttl("login:acct:a@example.com:lock") <= 25
+
+    # Other accounts from another IP are unaffected.
+    await guard.check("b@example.com", "5.6.7.8")
@@ -0,0 +1,109 @@
+import json
+
+
+def test_import_contacts_csv(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    body = (
+        "first_name,last_name,email,phone,birthday,additional_info\n"
+        "Ann,Lee,ann@example.com,111,1990-01-01,\n"
+        "Bad,Row,not-an-email,222,1990-01-02,\n"
+        "Cid,Moe,cid@example.com,333,1991-03-04,\"notes, with comma\"\n"
+    )
+    response = client.post(
+        "/contacts/import",
+        headers=headers,
+        params={"batch_size": 1},
+        files={"file": ("contacts.csv", body, "text/csv")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 2
+    assert data["failed"] == 1
+    assert data["errors"][0]["row"] == 2
+    assert data["errors"][0]["errors"][0]["field"] == "email"
+
+    contacts = client.get("/contacts/", headers=headers).json()
+    assert [c["first_name"] for c in contacts] == ["Ann", "Cid"]
+    assert contacts[1]["additional_info"] == "notes, with comma"
+
+
+def test_import_contacts_ndjson(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    rows = [
+        {"first_name": f"N{i}", "last_name": "Bulk", "email": f"n{i}@example.com",
+         "phone": "1", "birthday": "2000-02-29"}
+        for i in range(5)
+    ]
+    body = "\n".join(json.dumps(r) for r in rows) + "\n\n{broken\n[1, 2]\n"
+    response = client.post(
+        "/contacts/import",
+        headers=headers,
+        params={"batch_size": 2},
+        files={"file": ("contacts.ndjson", body, "application/x-ndjson")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 5
+    assert [e["row"] for e in data["errors"]] == [6, 7]
+    assert len(client.get("/contacts/", headers=headers).json()) == 5
+
+
+def test_import_contacts_unknown_format(client, test_user_token):
+    response = client.post(
+        "/contacts/import",
+        headers={"Authorization": f"Bearer {test_user_token}"},
+        files={"file": ("contacts.xlsx", b"...", "application/octet-stream")}
+    )
+    assert response.status_code == 415
+
+
+def _import(client, headers, count):
+    rows = [
+        {"first_name": f"Exp{i}", "last_name": "Smith, Jr" if i == 0 else "Port",
+         "email": f"exp{i}@example.com", "phone": "555", "birthday": "1990-05-17"}
+        for i in range(count)
+    ]
+    client.post(
+        "/contacts/import",
+        headers=headers,
+        files={"file": ("c.ndjson", "\n".join(json.dumps(r) for r in rows), "application/x-ndjson")}
+    )
+
+
+def test_export_contacts_ndjson(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _import(client, headers, 3)
+    response = client.get("/contacts/export", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [c["first_name"] for c in lines] == ["Exp0", "Exp1", "Exp2"]
+    assert lines[0]["birthday"] == "1990-05-17"
+
+
+def test_export_contacts_csv_and_vcard(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _import(client, headers, 2)
+
+    response = client.get("/contacts/export", headers=headers, params={"format": "csv"})
+    lines = response.text.splitlines()
+    assert lines[0] == "id,first_name,last_name,email,phone,birthday,additional_info"
+    assert '"Smith, Jr"' in lines[1]
+    assert len(lines) == 3
+
+    response = client.get("/contacts/export", headers=headers, params={"format": "vcard"})
+    assert response.headers["content-disposition"] == 'attachment; filename="contacts.vcf"'
+    assert response.text.count("BEGIN:VCARD") == 2
+    assert "N:Smith\\, Jr;Exp0;;;\r\n" in response.text
+
+
+def test_export_vcard_escapes_line_breaks(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    client.post("/contacts/", headers=headers, json={
+        "first_name": "Ann", "last_name": "Lee", "email": "ann@example.com", "phone": "1",
+        "birthday": "1990-01-01", "additional_info": "one\r\ntwo\rthree\nfour"
+    })
+
+    response = client.get("/contacts/export", headers=headers, params={"format": "vcard"})
+    assert "NOTE:one\\ntwo\\nthree\\nfour\r\n" in response.text
+    assert "\r" not in response.text.replace("\r\n", "")
@@ -1,6 +1,8 @@
 import pytest
 from fastapi.testclient import TestClient
 
+from pagination import encode_cursor
+
 def test_create_contact(client, test_user_token):
     contact_data = {
         "first_name": "John",
@@ -154,4 +156,304 @@ def test_contact_not_found(client, test_user_token):
         headers={"Authorization": f"Bearer {test_user_token}"}
     )
     assert response.status_code == 404
-    assert "Contact not found" in response.json()["detail"] 
\ No newline at end of file
+    assert "Contact not found" in response.json()["detail"] 
+def _create_contacts(client, token, count):
+    for i in range(count):
+        client.post(
+            "/contacts/",
+            headers={"Authorization": f"Bearer {token}"},
+            json={
+                "first_name": f"Name{i:02d}",
+                "last_name": "Pager" if i % 2 else "Other",
+                "email": f"user{i}@{'example.com' if i % 3 else 'corp.io'}",
+                "phone": f"555000{i:04d}",
+                "birthday": f"1990-01-{i + 1:02d}",
+            }
+        )
+
+def test_read_contacts_keyset_pagination(client, test_user_token):
+    _create_contacts(client, test_user_token, 7)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 3, "sort": "name", "order": "desc"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/contacts/", headers=headers, params=params)
+        assert response.status_code == 200
+        seen.extend(c["id"] for c in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            assert "Link" not in response.headers
+            break
+        assert 'rel="next"' in response.headers["Link"]
+
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+
+def test_read_contacts_filters(client, test_user_token):
+    _create_contacts(client, test_user_token, 7)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    response = client.get("/contacts/", headers=headers, params={"name": "pag"})
+    assert {c["last_name"] for c in response.json()} == {"Pager"}
+
+    response = client.get("/contacts/", headers=headers, params={"email_domain": "corp.io"})
+    assert [c["email"] for c in response.json()] == ["user0@corp.io", "user3@corp.io", "user6@corp.io"]
+
+    response = client.get(
+        "/contacts/",
+        headers=headers,
+        params={"birthday_from": "1990-01-02", "birthday_to": "1990-01-03"}
+    )
+    assert [c["birthday"] for c in response.json()] == ["1990-01-02", "1990-01-03"]
+
+def test_read_contacts_invalid_cursor(client, test_user_token):
+    response = client.get(
+        "/contacts/",
+        headers={"Authorization": f"Bearer {test_user_token}"},
+        params={"cursor": "not-a-cursor"}
+    )
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+@pytest.mark.parametrize("sort, values", [
+    ("id", ["1"]),
+    ("id", [[1]]),
+    ("id", [True]),
+    ("name", [1, "Doe", 1]),
+    ("name", ["Doe", "John", None]),
+    ("updated_at", ["yesterday", 1]),
+])
+def test_read_contacts_cursor_with_wrong_types(client, test_user_token, sort, values):
+    response = client.get(
+        "/contacts/",
+        headers={"Authorization": f"Bearer {test_user_token}"},
+        params={"sort": sort, "cursor": encode_cursor(sort, "asc", values)}
+    )
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+def test_search_contacts(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for first, last, email, phone in [
+        ("John", "Doe", "john.doe@example.com", "5551234"),
+        ("Johanna", "Smith", "jo@corp.io", "5559876"),
+        ("Mark", "Johnson", "mark@example.com", "5550000"),
+    ]:
+        client.post("/contacts/", headers=headers, json={
+            "first_name": first, "last_name": last, "email": email,
+            "phone": phone, "birthday": "1990-01-01"
+        })
+
+    response = client.get("/contacts/search", headers=headers, params={"q": "joh"})
+    assert response.status_code == 200
+    assert {c["first_name"] for c in response.json()} == {"John", "Johanna", "Mark"}
+
+    response = client.get("/contacts/search", headers=headers, params={"q": "john doe"})
+    assert [c["first_name"] for c in response.json()] == ["John"]
+
+    response = client.get("/contacts/search", headers=headers, params={"q": "corp", "limit": 1})
+    assert [c["first_name"] for c in response.json()] == ["Johanna"]
+
+    client.put(f"/contacts/{response.json()[0]['id']}", headers=headers, json={
+        "first_name": "Joanna", "last_name": "Smith", "email": "jo@corp.io",
+        "phone": "5559876", "birthday": "1990-01-01"
+    })
+    response = client.get("/contacts/search", headers=headers, params={"q": 'johanna" OR *'})
+    assert response.json() == []
+
+def test_upcoming_birthdays(client, test_user_token):
+    from datetime import date, timedelta
+
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    today = date.today()
+    for name, offset in [("Later", 10), ("Soon", 3), ("Today", 0), ("Past", -1)]:
+        # Year 2000 is a leap year, so February 29 is a valid birthday.
+        birthday = (today + timedelta(days=offset)).replace(year=2000)
+        client.post("/contacts/", headers=headers, json={
+            "first_name": name, "last_name": "B", "email": f"{name.lower()}@example.com",
+            "phone": "1", "birthday": birthday.isoformat()
+        })
+
+    response = client.get("/contacts/birthdays", headers=headers, params={"days": 7})
+    assert response.status_code == 200
+    assert [c["first_name"] for c in response.json()] == ["Today", "Soon"]
+
+    response = client.get("/contacts/birthdays", headers=headers, params={"days": 365})
+    assert [c["first_name"] for c in response.json()] == ["Today", "Soon", "Later", "Past"]
+
+def test_upcoming_birthdays_after_february_28_of_a_common_year(client, test_user_token, monkeypatch):
+    from datetime import date
+
+    import main
+
+    class FrozenDate(date):
+        @classmethod
+        def today(cls):
+            return cls(2025, 2, 28)
+
+    monkeypatch.setattr(main, "date", FrozenDate)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for name, birthday in [("Today", "1990-02-28"), ("Leap", "1992-02-29"), ("Tomorrow", "1990-03-01"),
+                           ("Later", "1990-03-02")]:
+        client.post("/contacts/", headers=headers, json={
+            "first_name": name, "last_name": "B", "email": f"{name.lower()}@example.com",
+            "phone": "1", "birthday": birthday
+        })
+
+    # March 1 is day 61 on the leap-year calendar of birthday_doy.
+    response = client.get("/contacts/birthdays", headers=headers, params={"days": 1})
+    assert [c["first_name"] for c in response.json()] == ["Today", "Leap", "Tomorrow"]
+
+def test_read_contacts_etag(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _create_contacts(client, test_user_token, 2)
+
+    first = client.get("/contacts/", headers=headers, params={"limit": 1})
+    etag = first.headers["ETag"]
+    assert first.headers["X-Next-Cursor"]
+
+    cached = client.get("/contacts/", headers=headers, params={"limit": 1})
+    assert cached.json() == first.json()
+    assert cached.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+
+    not_modified = client.get("/contacts/", headers={**headers, "If-None-Match": etag}, params={"limit": 1})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+
+    contact_id = first.json()[0]["id"]
+    item = client.get(f"/contacts/{contact_id}", headers=headers)
+    assert client.get(f"/contacts/{contact_id}", headers={**headers, "If-None-Match": item.headers["ETag"]}).status_code == 304
+
+    client.delete(f"/contacts/{contact_id}", headers=headers)
+    changed = client.get("/contacts/", headers={**headers, "If-None-Match": etag}, params={"limit": 1})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["id"] != contact_id
+    assert client.get(f"/contacts/{contact_id}", headers={**headers, "If-None-Match": item.headers["ETag"]}).status_code == 404
+
+def test_etag_survives_redis_losing_the_version(client, test_user_token):
+    import fakeredis
+    from main import redis_store
+
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _create_contacts(client, test_user_token, 1)
+    etag = client.get("/contacts/", headers=headers).headers["ETag"]
+
+    # A write while Redis is down, then Redis comes back empty.
+    down = fakeredis.FakeServer()
+    down.connected = False
+    redis_store.client = fakeredis.FakeAsyncRedis(server=down, decode_responses=True)
+    _create_contacts(client, test_user_token, 1)
+    redis_store.client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    redis_store.breaker.record_success()
+
+    response = client.get("/contacts/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+
+def test_contact_changes_feed(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _create_contacts(client, test_user_token, 3)
+
+    full = client.get("/contacts/changes", headers=headers)
+    assert full.status_code == 200
+    data = full.json()
+    assert len(data["upserted"]) == 3
+    assert data["deleted"] == []
+    assert data["has_more"] is False
+    cursor = data["cursor"]
+
+    first, second = data["upserted"][0]["id"], data["upserted"][1]["id"]
+    client.put(f"/contacts/{first}", headers=headers, json={
+        "first_name": "Renamed", "last_name": "Other", "email": "user0@corp.io",
+        "phone": "5550000000", "birthday": "1990-01-01"
+    })
+    client.delete(f"/contacts/{second}", headers=headers)
+
+    delta = client.get("/contacts/changes", headers=headers, params={"since": cursor}).json()
+    assert [c["first_name"] for c in delta["upserted"]] == ["Renamed"]
+    assert [t["contact_id"] for t in delta["deleted"]] == [second]
+    assert delta["cursor"] == cursor + 2
+
+    page = client.get("/contacts/changes", headers=headers, params={"since": cursor, "limit": 1}).json()
+    assert page["has_more"] is True
+    assert page["cursor"] == cursor + 1
+    assert len(page["upserted"]) == 1 and page["deleted"] == []
+
+    empty = client.get("/contacts/changes", headers=headers, params={"since": delta["cursor"]}).json()
+    assert empty == {"upserted": [], "deleted": [], "cursor": delta["cursor"], "has_more": False}
+
+def test_contacts_batch(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _create_contacts(client, test_user_token, 4)
+    ids = [c["id"] for c in client.get("/contacts/", headers=headers).json()]
+    since = client.get("/contacts/changes", headers=headers).json()["cursor"]
+
+    response = client.get("/contacts/batch", headers=headers, params={"ids": [ids[1], ids[0], 999]})
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json()["contacts"]] == [ids[0], ids[1]]
+    assert response.json()["not_found"] == [999]
+
+    response = client.patch("/contacts/batch", headers=headers, json={
+        "ids": ids[:3] + [999], "changes": {"last_name": "Bulk", "birthday": "1985-12-31"}
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert [c["id"] for c in data["contacts"]] == ids[:3]
+    assert {c["last_name"] for c in data["contacts"]} == {"Bulk"}
+    assert data["not_found"] == [999]
+    assert client.get(f"/contacts/{ids[3]}", headers=headers).json()["last_name"] != "Bulk"
+
+    assert client.patch("/contacts/batch", headers=headers, json={"ids": ids, "changes": {}}).status_code == 400
+    assert client.patch("/contacts/batch", headers=headers,
+                        json={"ids": ids, "changes": {"email": None}}).status_code == 422
+
+    response = client.delete("/contacts/batch", headers=headers, params={"ids": [ids[0], ids[2], 999]})
+    assert response.json() == {"deleted": [ids[0], ids[2]], "not_found": [999]}
+    assert [c["id"] for c in client.get("/contacts/", headers=headers).json()] == [ids[1], ids[3]]
+
+    changes = client.get("/contacts/changes", headers=headers, params={"since": since}).json()
+    assert [c["id"] for c in changes["upserted"]] == [ids[1]]
+    assert [t["contact_id"] for t in changes["deleted"]] == [ids[0], ids[2]]
+    assert len({t["change_seq"] for t in changes["deleted"]}) == 2
+
+def test_contacts_work_while_redis_is_down(client, test_user_token):
+    import fakeredis
+    from main import redis_store
+
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    server = fakeredis.FakeServer()
+    server.connected = False
+    redis_store.client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    _create_contacts(client, test_user_token, 2)
+    response = client.get("/contacts/", headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    # The version comes from the database, so revalidation still works.
+    assert client.get("/contacts/", headers={**headers, "If-None-Match": response.headers["ETag"]}).status_code == 304
+    assert redis_store.status()["errors"] > 0
+
+def test_contact_endpoints_query_counts(client, test_user_token, assert_max_queries):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    _create_contacts(client, test_user_token, 20)
+    ids = [c["id"] for c in client.get("/contacts/", headers=headers, params={"limit": 20}).json()]
+
+    # The user comes from the principal cache, so a read is the contacts version
+    # plus a single query however many contacts it returns, and a cached read
+    # is only the version.
+    with assert_max_queries(1):
+        assert client.get("/contacts/", headers=headers, params={"limit": 20}).status_code == 200
+    with assert_max_queries(2):
+        assert client.get(f"/contacts/{ids[0]}", headers=headers).status_code == 200
+    with assert_max_queries(1):
+        assert client.get("/contacts/batch", headers=headers, params={"ids": ids}).status_code == 200
+    # Counter bump plus one UPDATE ... RETURNING.
+    with assert_max_queries(2):
+        response = client.patch("/contacts/batch", headers=headers,
+                                json={"ids": ids, "changes": {"additional_info": "bulk"}})
+        assert response.status_code == 200
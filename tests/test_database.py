@@ -0,0 +1,127 @@
+import os
+from datetime import date
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+import database
+from database import AsyncSessionLocal, Base, get_async_url, get_pool_options
+from models import Contact, User
+from pagination import next_cursor, paginate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_get_async_url():
+    assert get_async_url("sqlite://") == "sqlite+aiosqlite://"
+    assert get_async_url("sqlite:///./contacts.db") == "sqlite+aiosqlite:///./contacts.db"
+    assert get_async_url("postgresql://user:secret@db:5432/contacts") == \
+        "postgresql+asyncpg://user:secret@db:5432/contacts"
+    assert get_async_url("postgresql+psycopg2://user:secret@db/contacts") == \
+        "postgresql+asyncpg://user:secret@db/contacts"
+
+
+def test_get_pool_options(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = get_pool_options("postgresql+asyncpg://user:secret@db/contacts", asyncio=True)
+    assert options["poolclass"] is database.TimedAsyncQueuePool
+    assert options["connect_args"] == {"server_settings": {"statement_timeout": "5000"}}
+    options = get_pool_options("postgresql://user:secret@db/contacts")
+    assert options["connect_args"] == {"options": "-c statement_timeout=5000"}
+    assert "connect_args" not in get_pool_options("sqlite:///./contacts.db")
+
+
+@pytest.mark.asyncio
+async def test_async_session_sees_sync_writes(test_db):
+    test_db.add(User(email="sync@example.com", hashed_password="x"))
+    test_db.commit()
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.email))
+        assert result.scalars().all() == ["sync@example.com"]
+
+
+def _alembic_config(url):
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+
+def test_migrations_match_models(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    config = _alembic_config(url)
+
+    command.upgrade(config, "head")
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+        assert [d for d in diff if "contacts_fts" not in str(d)] == []
+        indexes = {index["name"] for index in inspect(conn).get_indexes("contacts")}
+        assert {"ix_contacts_owner_id_id", "ix_contacts_owner_id_last_name_first_name",
+                "ix_contacts_owner_id_updated_at"} <= indexes
+        assert "contacts_fts" in inspect(conn).get_table_names()
+
+    command.downgrade(config, "base")
+    with engine.connect() as conn:
+        assert inspect(conn).get_table_names() == ["alembic_version"]
+    engine.dispose()
+
+
+def test_migrations_upgrade_database_created_before_them(tmp_path):
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engine = create_engine(url)
+    # The schema and data as the app created them with create_all.
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE users (id INTEGER NOT NULL PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, "
+            "is_active BOOLEAN, is_verified BOOLEAN, role VARCHAR, created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_email ON users (email)"))
+        conn.execute(text("CREATE INDEX ix_users_id ON users (id)"))
+        conn.execute(text(
+            "CREATE TABLE contacts (id INTEGER NOT NULL PRIMARY KEY, first_name VARCHAR, last_name VARCHAR, "
+            "email VARCHAR, phone VARCHAR, birthday DATETIME, owner_id INTEGER REFERENCES users (id), "
+            "created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text("CREATE INDEX ix_contacts_id ON contacts (id)"))
+        conn.execute(text(
+            "INSERT INTO users (id, email, hashed_password, role) VALUES "
+            "(1, 'old@example.com', 'x', 'user'), (2, 'other@example.com', 'x', 'user')"
+        ))
+        conn.execute(text(
+            "INSERT INTO contacts (id, first_name, last_name, email, phone, birthday, owner_id) VALUES "
+            "(1, 'Ada', 'Lovelace', 'ada@example.com', '1', '1990-03-01 00:00:00.000000', 1), "
+            "(2, 'Alan', 'Turing', 'alan@example.com', '2', '1992-02-29 00:00:00.000000', 1), "
+            "(3, 'Grace', NULL, 'grace@example.com', '3', NULL, 1), "
+            "(4, 'Edsger', 'Dijkstra', 'edsger@example.com', '4', NULL, 2)"
+        ))
+
+    command.upgrade(_alembic_config(url), "head")
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+        assert [d for d in diff if "contacts_fts" not in str(d)] == []
+        rows = conn.execute(text(
+            "SELECT id, birthday, birthday_doy, change_seq FROM contacts ORDER BY id"
+        )).all()
+        assert rows == [(1, "1990-03-01", 61, 1), (2, "1992-02-29", 60, 2), (3, None, None, 3), (4, None, None, 1)]
+        assert conn.execute(text("SELECT change_seq FROM users ORDER BY id")).scalars().all() == [3, 1]
+        assert conn.execute(text("SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH 'turing'")).scalars().all() == [2]
+    with Session(engine) as session:
+        # A contact saved without a last name still pages by name.
+        seen, cursor = [], None
+        while True:
+            page = session.execute(paginate(select(Contact).where(Contact.owner_id == 1), "name", "asc", cursor, 1)).scalars().all()
+            seen.append(page[0].id)
+            cursor = next_cursor(page, "name", "asc", 1)
+            if cursor is None:
+                break
+        assert seen == [3, 1, 2]
+        assert session.get(Contact, 3).updated_at is not None
+    engine.dispose()
+    assert date.fromisoformat(rows[0][1]) == date(1990, 3, 1)
@@ -0,0 +1,51 @@
+import httpx
+import pytest
+
+from database import engine
+from loadtest import DEFAULT_MIX, Recorder, parse_mix, percentile, run_workload, seed
+from main import app, rate_limiter
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([7.0], 0.99) == 7.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_parse_mix():
+    assert parse_mix("list=10, get=5,delete=0") == {"list": 10, "get": 5, "delete": 0}
+    with pytest.raises(ValueError):
+        parse_mix("drop_tables=1")
+
+
+def test_recorder_summary_skips_warmup():
+    recorder = Recorder(measure_from=10.0)
+    recorder.record("GET /me/", 200, 9.0, 9.5)
+    recorder.record("GET /me/", 200, 10.0, 10.002)
+    recorder.record("GET /me/", 503, 11.0, 11.004)
+    summary = recorder.summary(2.0)
+    route = summary["routes"]["GET /me/"]
+    assert route["requests"] == 2 and route["errors"] == 1
+    assert route["statuses"] == {"200": 1, "503": 1}
+    assert route["throughput_rps"] == 1.0
+    assert route["latency_ms"]["p50"] == 2.0 and route["latency_ms"]["max"] == 4.0
+    assert summary["total"]["requests"] == 2
+
+
+@pytest.mark.asyncio
+async def test_short_mixed_workload(test_db, monkeypatch):
+    # Like the harness, measure the endpoints rather than the limiter.
+    monkeypatch.setattr(rate_limiter, "enabled", False)
+    users = seed(engine, users=2, contacts=30, seed_value=1)
+    assert all(len(user.contact_ids) == 30 for user in users)
+
+    mix = {name: weight for name, weight in DEFAULT_MIX.items() if name != "login"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest") as client:
+        summary = await run_workload(client, users, mix, concurrency=2, duration=1.0)
+
+    assert summary["total"]["requests"] > 0
+    assert summary["total"]["errors"] == 0, summary
+    assert "GET /contacts/{contact_id}" in summary["routes"]
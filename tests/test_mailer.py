@@ -0,0 +1,111 @@
+import smtplib
+import socket
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from aiosmtpd.controller import Controller
+from sqlalchemy import select
+
+from database import AsyncSessionLocal
+from mailer import OutboxWorker, SMTPConnection, queue_email
+from models import EmailOutbox
+
+# Captured at import time, before the autouse fixture patches smtplib.SMTP.
+REAL_SMTP = smtplib.SMTP
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    with patch("smtplib.SMTP", REAL_SMTP):
+        yield controller, handler
+    controller.stop()
+
+
+def test_connection_is_reused(smtp_server):
+    controller, handler = smtp_server
+    connection = SMTPConnection(controller.hostname, controller.port, starttls=False, sender="app@example.com")
+    try:
+        for i in range(3):
+            connection.send(f"user{i}@example.com", "Hello", "Body")
+    finally:
+        connection.close()
+    assert [m.rcpt_tos for m in handler.messages] == [[f"user{i}@example.com"] for i in range(3)]
+    assert len(handler.sessions) == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_worker_sends_and_retries(test_db, smtp_server):
+    controller, handler = smtp_server
+    async with AsyncSessionLocal() as db:
+        for i in range(3):
+            queue_email(db, f"user{i}@example.com", "Hello", f"Message {i}")
+        await db.commit()
+
+    worker = OutboxWorker(SMTPConnection(controller.hostname, controller.port, starttls=False,
+                                         sender="app@example.com"), batch_size=2)
+    try:
+        assert await worker.drain() == 3
+    finally:
+        await worker.stop()
+    assert len(handler.messages) == 3
+    assert len(handler.sessions) == 1
+
+    async with AsyncSessionLocal() as db:
+        queue_email(db, "late@example.com", "Hello", "Body")
+        await db.commit()
+    unreachable = OutboxWorker(SMTPConnection("127.0.0.1", _free_port(), starttls=False, timeout=1))
+    assert await unreachable.drain() == 1
+    # The failed message is not due again until its backoff has passed.
+    assert await unreachable.drain() == 0
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(EmailOutbox).order_by(EmailOutbox.id))).scalars().all()
+    assert [r.status for r in rows] == ["sent", "sent", "sent", "pending"]
+    assert rows[3].attempts == 1
+    assert rows[3].last_error
+    assert rows[3].next_attempt_at > datetime.utcnow()
+
+
+@pytest.mark.asyncio
+async def test_outbox_worker_resends_abandoned_claims(test_db, smtp_server):
+    controller, handler = smtp_server
+    async with AsyncSessionLocal() as db:
+        # Claimed by workers that stopped before recording a result.
+        db.add(EmailOutbox(recipient="expired@example.com", subject="Hello", body="Body", status="sending",
+                           attempts=1, next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.add(EmailOutbox(recipient="claimed@example.com", subject="Hello", body="Body", status="sending",
+                           attempts=1, next_attempt_at=datetime.utcnow() + timedelta(minutes=5)))
+        await db.commit()
+
+    worker = OutboxWorker(SMTPConnection(controller.hostname, controller.port, starttls=False,
+                                         sender="app@example.com"))
+    try:
+        assert await worker.drain() == 1
+    finally:
+        await worker.stop()
+    assert [m.rcpt_tos for m in handler.messages] == [["expired@example.com"]]
+
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(EmailOutbox).order_by(EmailOutbox.id))).scalars().all()
+    assert [(r.status, r.attempts) for r in rows] == [("sent", 2), ("sending", 1)]
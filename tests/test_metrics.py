@@ -0,0 +1,81 @@
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+import metrics
+from database import async_engine
+from metrics import HttpMetrics, MetricsMiddleware, normalize_sql, registry
+
+
+def _sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+def test_metrics_record_routes_db_and_caches(client, test_user_token):
+    me = {"method": "GET", "route": "/me/"}
+    before_ok = _sample("http_requests_total", status="200", **me)
+    before_local = _sample("principal_cache_lookups_total", result="local")
+    before_db = _sample("http_request_db_queries_count", **me)
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+
+    assert client.get("/me/", headers=headers).status_code == 200
+    assert client.get("/me/").status_code == 401
+
+    assert _sample("http_requests_total", status="200", **me) == before_ok + 1
+    assert _sample("http_requests_total", status="401", **me) >= 1
+    assert _sample("http_request_db_queries_count", **me) == before_db + 2
+    assert _sample("http_request_duration_seconds_count", **me) >= 2
+    # Login put the user into the local tier.
+    assert _sample("principal_cache_lookups_total", result="local") == before_local + 1
+    assert _sample("password_hash_duration_seconds_count", operation="verify") >= 1
+    assert _sample("smtp_send_duration_seconds_count") >= 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/me/",status="200"}' in response.text
+    assert "db_query_duration_seconds_bucket" in response.text
+
+
+def test_metrics_label_unmatched_paths_once(client):
+    before = _sample("http_requests_total", method="GET", route="unmatched", status="404")
+    client.get("/no-such-page-1")
+    client.get("/no-such-page-2")
+    assert _sample("http_requests_total", method="GET", route="unmatched", status="404") == before + 2
+    assert 'route="/no-such-page-1"' not in client.get("/metrics").text
+
+
+def test_normalize_sql():
+    assert normalize_sql(
+        "SELECT c.id FROM contacts AS c\n WHERE c.owner_id = $1::INTEGER AND c.id IN (?, ?, ?) AND c.email = 'a''b'"
+    ) == "SELECT c.id FROM contacts AS c WHERE c.owner_id = ?::INTEGER AND c.id IN (?) AND c.email = ?"
+    assert normalize_sql("SELECT 1 LIMIT %(param_1)s") == normalize_sql("SELECT 2 LIMIT %(param_2)s")
+
+
+def test_middleware_logs_slow_and_repeated_queries(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "DEBUG", True)
+    monkeypatch.setattr(metrics, "SQL_SLOW_QUERY_MS", 0)
+    app = FastAPI()
+
+    @app.get("/repeat/{times}")
+    async def repeat(times: int):
+        async with async_engine.connect() as conn:
+            for i in range(times):
+                await conn.execute(text("SELECT :value"), {"value": i})
+        return {}
+
+    app.add_middleware(MetricsMiddleware, metrics=HttpMetrics())
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        response = TestClient(app).get(f"/repeat/{metrics.SQL_N_PLUS_ONE_THRESHOLD}")
+
+    server_timing = response.headers["Server-Timing"]
+    assert f'desc="{metrics.SQL_N_PLUS_ONE_THRESHOLD} queries"' in server_timing
+    assert "total;dur=" in server_timing
+    assert "Slow query" in caplog.text and "/repeat/{times}: SELECT ?" in caplog.text
+    assert f"Suspected N+1 on GET /repeat/{{times}}: {metrics.SQL_N_PLUS_ONE_THRESHOLD} executions" in caplog.text
+
+
+def test_no_server_timing_outside_debug(client):
+    assert "Server-Timing" not in client.get("/no-such-page").headers
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import passwords
+from passwords import PasswordHasher, verify_and_update_sync
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    yield hasher
+    hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_in_process_pool(hasher):
+    hashed = await hasher.hash("s3cret")
+    assert hashed.startswith("$2b$04$")
+    assert await hasher.verify("s3cret", hashed) == (True, None)
+    assert await hasher.verify("wrong", hashed) == (False, None)
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full(hasher):
+    results = await asyncio.gather(hasher.hash("a"), hasher.hash("b"), return_exceptions=True)
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1
+    assert rejected[0].status_code == 503
+    assert hasher.pending == 0
+
+
+def test_rehash_below_target_cost(monkeypatch):
+    weak = passwords.pwd_context.hash("s3cret")
+    monkeypatch.setattr(
+        passwords, "pwd_context",
+        passwords.pwd_context.copy(bcrypt__default_rounds=5, bcrypt__min_rounds=5),
+    )
+    valid, new_hash = verify_and_update_sync("s3cret", weak)
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+    assert verify_and_update_sync("s3cret", new_hash) == (True, None)
@@ -0,0 +1,110 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from models import UserResponse, UserRole
+from principal_cache import PrincipalCache
+from redis_store import RedisStore
+
+
+def _principal(**overrides):
+    data = {"id": 1, "email": "p@example.com", "is_verified": True, "role": UserRole.ADMIN}
+    data.update(overrides)
+    return UserResponse(**data)
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def _store(server):
+    return RedisStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+
+
+@pytest.fixture
+def cache(redis_server):
+    return PrincipalCache(_store(redis_server))
+
+
+@pytest.mark.asyncio
+async def test_get_loads_once_and_keeps_role(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return _principal()
+
+    first = await cache.get("p@example.com", loader)
+    second = await cache.get("p@example.com", loader)
+    assert first == second
+    assert second.role == UserRole.ADMIN
+    assert len(calls) == 1
+
+    # A cold worker reads the Redis tier without touching the loader.
+    cache.local.clear()
+    assert (await cache.get("p@example.com", loader)).role == UserRole.ADMIN
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load(cache):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return _principal()
+
+    results = await asyncio.gather(*(cache.get("p@example.com", loader) for _ in range(10)))
+    assert len(calls) == 1
+    assert all(r.id == 1 for r in results)
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_not_cached(cache):
+    async def loader():
+        return None
+
+    assert await cache.get("nobody@example.com", loader) is None
+    assert await cache.store.get("user:nobody@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reaches_other_workers(redis_server, cache):
+    other = PrincipalCache(_store(redis_server))
+    other.start_listener()
+    try:
+        # Let the listener subscribe before publishing.
+        await asyncio.sleep(0.1)
+        principal = _principal()
+        other.local.set(principal.email, principal)
+        await cache.put(principal)
+
+        await cache.invalidate(principal.email)
+
+        for _ in range(100):
+            if other.local.get(principal.email) is None:
+                break
+            await asyncio.sleep(0.05)
+        assert other.local.get(principal.email) is None
+        assert await cache.store.get("user:p@example.com") is None
+    finally:
+        await other.stop_listener()
+
+
+@pytest.mark.asyncio
+async def test_redis_outage_falls_back_to_loader(redis_server, cache):
+    redis_server.connected = False
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return _principal()
+
+    assert (await cache.get("p@example.com", loader)).id == 1
+    cache.local.clear()
+    assert (await cache.get("p@example.com", loader)).id == 1
+    assert len(calls) == 2
+    assert cache.store.errors > 0
@@ -0,0 +1,56 @@
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from rate_limit import RateLimiter, RateLimitPolicy
+from redis_store import RedisStore
+from token_cache import TokenCache
+
+
+def _limiter(server, **kwargs):
+    store = RedisStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+    return RateLimiter(store, TokenCache("secret", "HS256"), **kwargs)
+
+
+def test_parse_policy():
+    assert RateLimitPolicy.parse("5/minute") == RateLimitPolicy(5, 60)
+    assert RateLimitPolicy.parse("100 / hour") == RateLimitPolicy(100, 3600)
+
+
+@pytest.mark.asyncio
+async def test_limit_is_shared_and_per_identity():
+    server = fakeredis.FakeServer()
+    policy = RateLimitPolicy(3, 60)
+    workers = [_limiter(server, default=policy), _limiter(server, default=policy)]
+
+    for i in range(3):
+        await workers[i % 2].check("/contacts/", "user:a@example.com")
+    with pytest.raises(HTTPException) as exc:
+        await workers[1].check("/contacts/", "user:a@example.com")
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+    # Other users and other routes have their own budgets.
+    await workers[0].check("/contacts/", "user:b@example.com")
+    await workers[0].check("/contacts/search", "user:a@example.com")
+
+
+@pytest.mark.asyncio
+async def test_limiter_fails_open_without_redis():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    limiter = _limiter(server, default=RateLimitPolicy(1, 60))
+    for _ in range(3):
+        await limiter.check("/contacts/", "ip:127.0.0.1")
+
+
+def test_me_endpoint_is_limited_per_user(client, test_user_token):
+    headers = {"Authorization": f"Bearer {test_user_token}"}
+    for _ in range(5):
+        assert client.get("/me/", headers=headers).status_code == 200
+    response = client.get("/me/", headers=headers)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+
+    # Unauthenticated callers are counted per IP, separately from the user.
+    assert client.get("/me/").status_code == 401
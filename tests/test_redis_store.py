@@ -0,0 +1,72 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from redis_store import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RedisStore
+
+
+def test_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    breaker.reset_timeout = 0
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # Only one trial call at a time.
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_store_fails_open_while_redis_is_down():
+    server = fakeredis.FakeServer()
+    store = RedisStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True),
+                       CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    await store.setex("k", 60, "v")
+    assert await store.get("k") == "v"
+
+    server.connected = False
+    assert await store.get("k") is None
+    assert await store.call("get", "k", default="fallback") == "fallback"
+    assert store.status()["state"] == OPEN
+
+    # Open breaker: Redis is not called at all.
+    server.connected = True
+    assert await store.get("k") is None
+    status = store.status()
+    assert status["errors"] == 2
+    assert status["rejected"] == 1
+    assert status["latency_ms_max"] >= 0
+
+    store.breaker.reset_timeout = 0
+    assert await store.get("k") == "v"
+    assert store.status()["state"] == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_calls_do_not_open_the_breaker():
+    store = RedisStore(fakeredis.FakeAsyncRedis(decode_responses=True),
+                       CircuitBreaker(failure_threshold=1, reset_timeout=0))
+
+    async def cancelled():
+        raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        await store._guarded("get", cancelled, None)
+    assert store.breaker.failures == 0
+    assert store.status()["state"] == CLOSED
+
+    # A cancelled half-open trial frees the slot for the next call.
+    store.breaker.record_failure()
+    assert store.breaker.state == HALF_OPEN
+    with pytest.raises(asyncio.CancelledError):
+        await store._guarded("get", cancelled, None)
+    assert await store.call("set", "k", "v") is True
+    assert store.status()["state"] == CLOSED
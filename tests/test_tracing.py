@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from tracing import FileSpanExporter, Span, parse_traceparent, tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def spans(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path), batch_size=1)
+    monkeypatch.setattr(tracer, "exporter", exporter)
+
+    def read():
+        exporter.flush()
+        if not path.exists():
+            return []
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    return read
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID.upper()}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert parse_traceparent("00-abc-def-01") is None
+    assert parse_traceparent(None) is None
+
+
+def test_login_continues_incoming_trace(client, test_user, spans, monkeypatch):
+    monkeypatch.setattr(tracer, "sample_rate", 0.01)
+    monkeypatch.setattr(tracer, "trust_parent", True)
+    response = client.post(
+        "/token",
+        data={"username": test_user["email"], "password": test_user["password"]},
+        headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"},
+    )
+    assert response.status_code == 200
+    assert response.headers["traceresponse"].startswith(f"00-{TRACE_ID}-")
+
+    recorded = spans()
+    assert {span["traceId"] for span in recorded} == {TRACE_ID}
+    root = next(span for span in recorded if span["name"] == "POST /token")
+    assert root["parentSpanId"] == PARENT_ID
+    assert root["attributes"]["http.response.status_code"] == 200
+    names = {span["name"] for span in recorded if span["parentSpanId"] == root["spanId"]}
+    assert {"db.query", "password.verify", "redis.evalsha", "redis.setex"} <= names
+    query = next(span for span in recorded if span["name"] == "db.query")
+    assert "FROM users WHERE users.email = ?" in query["attributes"]["db.statement"]
+
+
+def test_register_traces_hashing_and_commit(client, spans, monkeypatch):
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    response = client.post("/register/", params={"email": "traced@example.com", "password": "secret123"})
+    assert response.status_code == 200
+    names = [span["name"] for span in spans()]
+    assert "POST /register/" in names
+    assert {"password.hash", "db.commit", "db.query"} <= set(names)
+    assert all(span["endTimeUnixNano"] >= span["startTimeUnixNano"] for span in spans())
+
+
+def test_unsampled_requests_are_not_traced(client, spans, monkeypatch):
+    monkeypatch.setattr(tracer, "trust_parent", True)
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    response = client.post("/token", data={"username": "nobody@example.com", "password": "x"},
+                           headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    assert "traceresponse" not in response.headers
+    assert spans() == []
+
+
+def test_callers_cannot_force_tracing(client, spans, monkeypatch):
+    forced = {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+    # Tracing is off by default.
+    assert "traceresponse" not in client.get("/metrics", headers=forced).headers
+
+    # Without a trusted upstream the flag is ignored, but a sampled request
+    # still joins the caller's trace.
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+    assert client.get("/metrics", headers=forced).headers["traceresponse"].startswith(f"00-{TRACE_ID}-")
+    monkeypatch.setattr(tracer, "sample_rate", 1e-9)
+    assert "traceresponse" not in client.get("/metrics", headers=forced).headers
+
+
+def test_exporter_writes_in_background_and_rotates(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = FileSpanExporter(str(path), batch_size=2, max_bytes=1500, backups=2)
+    for i in range(12):
+        exporter.export(Span(TRACE_ID, None, f"span-{i}"))
+    exporter.flush()
+
+    files = sorted(p.name for p in tmp_path.iterdir())
+    assert files == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    assert all(p.stat().st_size <= 1500 for p in tmp_path.iterdir())
+    newest = [json.loads(line)["name"] for line in path.read_text().splitlines()]
+    assert newest[-1] == "span-11"
+    assert exporter.dropped == 0
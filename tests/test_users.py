@@ -0,0 +1,181 @@
+import asyncio
+import io
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+
+from conftest import test_state
+from avatars import AvatarPipeline, AvatarStorage
+from database import AsyncSessionLocal
+from main import avatar_pipeline, request_profiler
+from models import AvatarJob, User
+
+
+@pytest.fixture
+def admin_token(client):
+    email, password = "admin@example.com", "adminpassword123"
+    client.post("/register/", params={"email": email, "password": password, "is_admin": True})
+    token = test_state['mock_smtp'].send_message.call_args[0][0].get_content().split("/verify/")[1].strip()
+    client.get(f"/verify/{token}")
+    return client.post("/token", data={"username": email, "password": password}).json()["access_token"]
+
+
+def _png(width=300, height=200):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_update_avatar_renders_variants(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.put("/users/avatar/", headers=headers, files={"file": ("a.png", _png(), "image/png")})
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+    status_url = response.headers["Location"]
+
+    job = client.get(status_url, headers=headers).json()
+    assert job["status"] == "done"
+    thumbnail = client.get(job["thumbnail_url"])
+    assert thumbnail.status_code == 200
+    assert Image.open(io.BytesIO(thumbnail.content)).size == (64, 64)
+    assert Image.open(io.BytesIO(client.get(job["medium_url"]).content)).size == (256, 256)
+
+    assert client.get("/me/", headers=headers).json()["avatar_url"] == job["medium_url"]
+
+
+def test_update_avatar_rejects_bad_uploads(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.put("/users/avatar/", headers=headers,
+                          files={"file": ("big.bin", b"x" * 100001, "image/png")})
+    assert response.status_code == 413
+
+    response = client.put("/users/avatar/", headers=headers,
+                          files={"file": ("a.png", b"not an image", "image/png")})
+    job = client.get(response.headers["Location"], headers=headers).json()
+    assert job["status"] == "failed"
+    assert job["error"]
+
+
+def test_update_avatar_requires_admin(client, test_user_token):
+    response = client.put("/users/avatar/", headers={"Authorization": f"Bearer {test_user_token}"},
+                          files={"file": ("a.png", _png(), "image/png")})
+    assert response.status_code == 403
+
+
+def test_read_db_pool(client, admin_token, test_user_token):
+    response = client.get("/internal/db-pool", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    stats = response.json()["async"]
+    assert stats["pool_class"] == "TimedAsyncQueuePool"
+    assert stats["checkouts"] > 0
+    assert stats["checked_out"] >= 0 and stats["wait_seconds_max"] >= 0
+
+    response = client.get("/internal/db-pool", headers={"Authorization": f"Bearer {test_user_token}"})
+    assert response.status_code == 403
+
+
+def test_read_redis_status(client, admin_token):
+    response = client.get("/internal/redis", headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert response.json()["state"] == "closed"
+    assert response.json()["calls"] > 0
+
+
+def test_profile_requests_on_demand(client, admin_token, test_user_token, tmp_path, monkeypatch):
+    monkeypatch.setattr(request_profiler, "directory", str(tmp_path))
+    monkeypatch.setattr(request_profiler, "max_profiles", 2)
+    admin = {"Authorization": f"Bearer {admin_token}"}
+
+    response = client.post("/internal/profiles/token", headers={"Authorization": f"Bearer {test_user_token}"})
+    assert response.status_code == 403
+    grant = client.post("/internal/profiles/token", headers=admin).json()
+    assert grant["header"] == "X-Profile-Token"
+    # A profile token grants nothing else.
+    assert client.get("/me/", headers={"Authorization": f"Bearer {grant['token']}"}).status_code == 401
+
+    # Requests without a valid token are not profiled.
+    assert "X-Profile-Id" not in client.get("/me/", headers=admin).headers
+    bad = client.get("/me/", headers={**admin, "X-Profile-Token": test_user_token})
+    assert "X-Profile-Id" not in bad.headers
+
+    profile_ids = []
+    for _ in range(3):
+        response = client.get("/contacts/", headers={**admin, "X-Profile-Token": grant["token"]})
+        assert response.status_code == 200
+        profile_ids.append(response.headers["X-Profile-Id"])
+
+    # Only the newest two are kept.
+    listed = client.get("/internal/profiles", headers=admin).json()
+    assert [profile["id"] for profile in listed] == profile_ids[:0:-1]
+    assert listed[0]["route"] == "/contacts/" and listed[0]["status"] == 200
+    assert client.get(f"/internal/profiles/{profile_ids[0]}", headers=admin).status_code == 404
+
+    report = client.get(f"/internal/profiles/{profile_ids[-1]}", headers=admin)
+    assert report.status_code == 200
+    assert "function calls" in report.text and "read_contacts" in report.text
+    by_own_time = client.get(f"/internal/profiles/{profile_ids[-1]}", headers=admin, params={"sort": "tottime"})
+    assert by_own_time.status_code == 200
+    download = client.get(f"/internal/profiles/{profile_ids[-1]}/pstats", headers=admin)
+    assert download.status_code == 200 and len(download.content) > 0
+    assert client.get("/internal/profiles/..%2Fsecret", headers=admin).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_avatar_job_that_is_gone_is_skipped(test_db):
+    await avatar_pipeline.store_upload(12345, io.BytesIO(_png()))
+    await avatar_pipeline.process(12345)
+    assert not os.path.exists(avatar_pipeline.upload_path(12345))
+
+
+def test_pending_avatar_jobs_are_resumed(client, admin_token, test_db):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    user = test_db.query(User).filter(User.email == "admin@example.com").one()
+    # Jobs left behind by a process that stopped before handling them.
+    pending = AvatarJob(user_id=user.id, status="pending")
+    stuck = AvatarJob(user_id=user.id, status="processing", updated_at=datetime.utcnow() - timedelta(hours=1))
+    lost = AvatarJob(user_id=user.id, status="pending")
+    test_db.add_all([pending, stuck, lost])
+    test_db.commit()
+    for job in (pending, stuck):
+        asyncio.run(avatar_pipeline.store_upload(job.id, io.BytesIO(_png())))
+
+    assert asyncio.run(avatar_pipeline.resume()) == 3
+
+    assert client.get(f"/users/avatar/jobs/{pending.id}", headers=headers).json()["status"] == "done"
+    assert client.get(f"/users/avatar/jobs/{stuck.id}", headers=headers).json()["status"] == "done"
+    assert client.get(f"/users/avatar/jobs/{lost.id}", headers=headers).json()["status"] == "failed"
+    assert os.listdir(avatar_pipeline.upload_dir) == []
+
+
+def test_avatar_job_renders_without_an_open_session(admin_token, test_db, tmp_path):
+    open_sessions = []
+
+    @asynccontextmanager
+    async def session_factory():
+        async with AsyncSessionLocal() as db:
+            open_sessions.append(db)
+            try:
+                yield db
+            finally:
+                open_sessions.remove(db)
+
+    class Storage(AvatarStorage):
+        def save(self, key, data):
+            assert open_sessions == []
+            return f"https://cdn.example.com/{key}.jpg"
+
+    pipeline = AvatarPipeline(Storage(), session_factory=session_factory, upload_dir=str(tmp_path))
+    user = test_db.query(User).filter(User.email == "admin@example.com").one()
+    job = AvatarJob(user_id=user.id, status="pending")
+    test_db.add(job)
+    test_db.commit()
+    asyncio.run(pipeline.store_upload(job.id, io.BytesIO(_png())))
+
+    asyncio.run(pipeline.process(job.id))
+
+    test_db.expire_all()
+    assert test_db.get(AvatarJob, job.id).status == "done"
+    assert test_db.get(User, user.id).avatar_url == f"https://cdn.example.com/avatars/{user.id}/{job.id}-medium.jpg"
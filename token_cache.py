@@ -0,0 +1,79 @@
+import hashlib
+import os
+import time
+from types import MappingProxyType
+from typing import Mapping
+
+from jose import JWTError, jwt
+
+from ttl_cache import TTLCache
+
+TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", 10000))
+# Claims that mark a token issued for a narrower purpose than authentication.
+RESTRICTED_CLAIMS = ("aud", "scope")
+
+
+class TokenCache:
+    """
+    Cache of verified JWT claims, keyed by the SHA-256 digest of the token.
+
+    A token is verified with python-jose the first time it is seen; its claims are
+    then served from memory until the token's ``exp``. Tokens that fail
+    verification raise and are never stored. Access tokens carry neither an
+    audience nor a scope, so tokens with either are rejected.
+
+    Attributes:
+        secret_key (str): Key the tokens are signed with.
+        algorithm (str): Signing algorithm.
+        cache (TTLCache): Verified claims by token digest.
+    """
+
+    def __init__(self, secret_key: str, algorithm: str, maxsize: int = TOKEN_CACHE_MAXSIZE):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.cache = TTLCache(maxsize, ttl=0)
+
+    @property
+    def hits(self) -> int:
+        """int: Number of tokens served from the cache."""
+        return self.cache.hits
+
+    @property
+    def misses(self) -> int:
+        """int: Number of tokens that had to be verified."""
+        return self.cache.misses
+
+    def decode(self, token: str) -> Mapping:
+        """
+        Verify a token and return its claims.
+
+        Args:
+            token (str): The encoded JWT.
+
+        Returns:
+            Mapping: Read-only view of the token's claims.
+
+        Raises:
+            JWTError: If the signature, algorithm or expiry is invalid, or the token
+                is restricted to another purpose.
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(key)
+        if claims is not None:
+            return claims
+
+        claims = MappingProxyType(jwt.decode(token, self.secret_key, algorithms=[self.algorithm],
+                                             options={"verify_aud": False}))
+        if any(claim in claims for claim in RESTRICTED_CLAIMS):
+            raise JWTError("Not an access token")
+        exp = claims.get("exp")
+        # Tokens without an expiry are verified on every use rather than cached forever.
+        if isinstance(exp, (int, float)):
+            self.cache.set(key, claims, ttl=exp - time.time())
+        return claims
+
+    def clear(self) -> None:
+        """
+        Drop all cached claims and reset the counters.
+        """
+        self.cache.clear()
@@ -0,0 +1,466 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from metrics import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# Share of requests that are traced; 0 disables tracing, whatever callers send.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+# Follow the sampled flag of incoming traceparent headers. Only enable this behind
+# a gateway that sets or strips the header, or any client can force tracing.
+TRACE_TRUST_PARENT = os.getenv("TRACE_TRUST_PARENT", "false").lower() == "true"
+# Finished spans are appended to this file as JSON lines in the OTLP span layout.
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+TRACE_EXPORT_BATCH = int(os.getenv("TRACE_EXPORT_BATCH", 64))
+# The file is rotated at this size, keeping this many older files (traces.jsonl.1, ...).
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", 50 * 1024 * 1024))
+TRACE_EXPORT_BACKUPS = int(os.getenv("TRACE_EXPORT_BACKUPS", 3))
+# Batches waiting for the writer thread; further batches are dropped.
+TRACE_EXPORT_MAX_QUEUED = int(os.getenv("TRACE_EXPORT_MAX_QUEUED", 64))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "contacts-api")
+
+# W3C Trace Context: version-traceid-parentid-flags, lower-case hex.
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+
+class Span:
+    """
+    One timed operation of a sampled trace.
+
+    Attributes:
+        trace_id (str): 32 hex digits shared by all spans of the trace.
+        span_id (str): 16 hex digits identifying this span.
+        parent_id (Optional[str]): Span ID of the parent, None for a root span.
+        name (str): Operation name, e.g. "GET /contacts/{contact_id}".
+        attributes (Dict[str, Any]): Details of the operation.
+        error (Optional[str]): Description of the failure, if the operation failed.
+    """
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def traceparent(self) -> str:
+        """str: W3C ``traceparent`` value naming this span as the parent."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the span to the OTLP JSON span layout.
+
+        Returns:
+            Dict[str, Any]: The span, with the service name as a resource attribute.
+        """
+        return {
+            "resource": {"service.name": TRACE_SERVICE_NAME},
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class FileSpanExporter:
+    """
+    Appends finished spans to a JSON lines file, in batches.
+
+    Any OTLP-compatible collector can tail the file; without one it is a local
+    record that needs no outside service. Full batches are handed to a writer
+    thread, so the event loop never waits for the disk; if the writer falls
+    behind by ``max_queued`` batches, further spans are dropped and counted.
+    The file is rotated once it would grow past ``max_bytes``.
+
+    Attributes:
+        path (str): File the spans are appended to.
+        batch_size (int): Spans buffered before they are written.
+        max_bytes (int): Size at which the file is rotated; 0 never rotates.
+        backups (int): Rotated files kept.
+        dropped (int): Spans dropped because the writer fell behind.
+    """
+
+    def __init__(self, path: str = TRACE_EXPORT_FILE, batch_size: int = TRACE_EXPORT_BATCH,
+                 max_bytes: int = TRACE_EXPORT_MAX_BYTES, backups: int = TRACE_EXPORT_BACKUPS,
+                 max_queued: int = TRACE_EXPORT_MAX_QUEUED):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[List[Span]]" = queue.Queue(maxsize=max_queued)
+        self._writer: Optional[threading.Thread] = None
+
+    def export(self, span: Span) -> None:
+        """
+        Buffer a finished span, queueing the buffer for writing once it is full.
+
+        Args:
+            span (Span): The finished span.
+        """
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self.batch_size:
+                return
+            spans, self._buffer = self._buffer, []
+        self._enqueue(spans)
+
+    def flush(self) -> None:
+        """
+        Write all buffered spans and wait until the writer is done.
+        """
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        if spans:
+            self._enqueue(spans)
+        if self._writer is not None:
+            self._queue.join()
+
+    def _enqueue(self, spans: List[Span]) -> None:
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._writer.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+            logger.warning("Span writer is behind; dropping %s spans", len(spans))
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self._write(spans)
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self, incoming: int) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if self.max_bytes <= 0 or size + incoming <= self.max_bytes:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write(self, spans: List[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        try:
+            self._rotate(len(lines))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            logger.warning("Dropping %s spans: %s", len(spans), e)
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """
+    Get the active span of the current request or task.
+
+    Returns:
+        Optional[Span]: The span, or None if nothing is being traced.
+    """
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Parse a W3C ``traceparent`` header.
+
+    Args:
+        value (Optional[str]): The header value.
+
+    Returns:
+        Optional[Tuple[str, str, bool]]: Trace ID, parent span ID and the sampled
+        flag, or None if the header is missing or malformed.
+    """
+    match = _TRACEPARENT.match(value.strip().lower()) if value else None
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class _ActiveSpan:
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self.token)
+        self.tracer.end(self.span, exc)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Creates spans for sampled requests and hands finished ones to an exporter.
+
+    Sampling is decided once per request at ``sample_rate``. An incoming trace is
+    continued when the request is sampled; its sampled flag decides instead only
+    if ``trust_parent`` is set and tracing is enabled. Outside a sampled request
+    every call is a context variable lookup and nothing else.
+
+    Attributes:
+        exporter (FileSpanExporter): Receives finished spans.
+        sample_rate (float): Share of requests traced; 0 disables tracing.
+        trust_parent (bool): Whether the caller's sampled flag decides.
+    """
+
+    def __init__(self, exporter: FileSpanExporter, sample_rate: float = TRACE_SAMPLE_RATE,
+                 trust_parent: bool = TRACE_TRUST_PARENT):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.trust_parent = trust_parent
+
+    def start_root(self, name: str, traceparent: Optional[str] = None,
+                   attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """
+        Start the root span of a request, continuing the caller's trace if given.
+
+        Args:
+            name (str): Operation name.
+            traceparent (Optional[str]): The incoming ``traceparent`` header.
+            attributes (Optional[Dict[str, Any]]): Details of the operation.
+
+        Returns:
+            Optional[Span]: The span, or None if the request is not sampled.
+        """
+        if self.sample_rate <= 0:
+            return None
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id, parent_sampled = parent if parent is not None else (None, None, False)
+        if parent is not None and self.trust_parent:
+            sampled = parent_sampled
+        else:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return None
+        return Span(trace_id or f"{random.getrandbits(128):032x}", parent_id, name, attributes)
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """
+        Start a child of the active span without making it active.
+
+        Args:
+            name (str): Operation name.
+            attributes (Optional[Dict[str, Any]]): Details of the operation.
+
+        Returns:
+            Optional[Span]: The span, or None if nothing is being traced.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(parent.trace_id, parent.span_id, name, attributes)
+
+    def span(self, name: str, **attributes):
+        """
+        Trace a block as a child of the active span, and make it the active span.
+
+        Args:
+            name (str): Operation name.
+            **attributes: Details of the operation.
+
+        Returns:
+            A context manager yielding the span, or None if nothing is being traced.
+        """
+        span = self.start_span(name, attributes)
+        return _NO_SPAN if span is None else _ActiveSpan(self, span)
+
+    def activate(self, span: Span):
+        """
+        Make a started span active for a block and end it afterwards.
+
+        Args:
+            span (Span): A span from :meth:`start_root` or :meth:`start_span`.
+
+        Returns:
+            A context manager yielding the span.
+        """
+        return _ActiveSpan(self, span)
+
+    def end(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """
+        Finish a span and export it.
+
+        Args:
+            span (Span): The span.
+            error (Optional[BaseException]): The exception the operation failed with.
+        """
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.exporter.export(span)
+
+    def flush(self) -> None:
+        """
+        Write all buffered spans.
+        """
+        self.exporter.flush()
+
+
+tracer = Tracer(FileSpanExporter())
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware starting a root span per sampled HTTP request.
+
+    The incoming ``traceparent`` is continued, and the response carries a
+    ``traceresponse`` header naming the request's span, so a client can find
+    its trace.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        tracer (Tracer): Tracer of the spans.
+    """
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        traceparent = None
+        for key, value in scope["headers"]:
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        span = self.tracer.start_root(scope["method"], traceparent)
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+        span.attributes.update({"http.request.method": scope["method"], "url.path": scope["path"]})
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                span.attributes["http.response.status_code"] = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"traceresponse", span.traceparent.encode())]
+            await send(message)
+
+        with self.tracer.activate(span):
+            try:
+                await self.app(scope, receive, send_with_trace)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.attributes["http.route"] = route.path
+                    span.name = f"{scope['method']} {route.path}"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._trace_span = None
+    if _current_span.get() is not None:
+        context._trace_span = tracer.start_span("db.query", {"db.statement": normalize_sql(statement)})
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        tracer.end(span)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    span = getattr(context, "_trace_span", None) if context is not None else None
+    if span is not None:
+        tracer.end(span, exception_context.original_exception)
+
+
+def _before_commit(session):
+    span = tracer.start_span("db.commit")
+    if span is not None:
+        session.info["trace_commit_span"] = span
+
+
+def _after_transaction_end(session, transaction):
+    span = session.info.pop("trace_commit_span", None) if transaction.parent is None else None
+    if span is not None:
+        if not session.info.pop("trace_committed", False):
+            span.error = "rolled back"
+        tracer.end(span)
+
+
+def _after_commit(session):
+    if "trace_commit_span" in session.info:
+        session.info["trace_committed"] = True
+
+
+def trace_database(*engines: Engine) -> None:
+    """
+    Trace SQL statements of the given engines and commits of all sessions.
+
+    Args:
+        *engines (Engine): Sync engines, or ``AsyncEngine.sync_engine``.
+    """
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+    if not event.contains(Session, "before_commit", _before_commit):
+        event.listen(Session, "before_commit", _before_commit)
+        event.listen(Session, "after_commit", _after_commit)
+        event.listen(Session, "after_transaction_end", _after_transaction_end)
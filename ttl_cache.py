@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache whose entries expire after a time to live.
+
+    Expired entries are dropped lazily when they are read or when they reach the
+    least recently used end of the cache.
+
+    Attributes:
+        maxsize (int): Maximum number of entries.
+        ttl (float): Default time to live of an entry, in seconds.
+        hits (int): Number of lookups that found a live entry.
+        misses (int): Number of lookups that found nothing or an expired entry.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a live entry and mark it as recently used.
+
+        Args:
+            key (Hashable): The entry key.
+
+        Returns:
+            Optional[Any]: The cached value, or None if missing or expired.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store an entry, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (Hashable): The entry key.
+            value (Any): The value to cache.
+            ttl (Optional[float]): Time to live in seconds, defaults to :attr:`ttl`.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Remove an entry if present.
+
+        Args:
+            key (Hashable): The entry key.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Remove all entries and reset the hit and miss counters.
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)